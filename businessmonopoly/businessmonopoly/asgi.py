@@ -12,9 +12,12 @@ import games.routing
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            games.routing.websocket_urlpatterns
+    # по сокету идут действия игрока — чужие сайты не должны открывать его с нашими cookie
+    "websocket": games.routing.CsrfOriginValidator(
+        AuthMiddlewareStack(
+            URLRouter(
+                games.routing.websocket_urlpatterns
+            )
         )
     ),
 })
@@ -26,6 +26,9 @@ load_dotenv(os.path.join(BASE_DIR, '.env'))
 # SECURITY WARNING: keep the secret key used in production secret!
 
 SECRET_KEY = os.getenv('SECRET_KEY', get_random_secret_key())
+# без SECRET_KEY в окружении/.env ключ свой у каждого процесса: подписи (токены профилирования)
+# одного процесса не проверяются другим
+SECRET_KEY_FROM_ENV = 'SECRET_KEY' in os.environ
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -82,17 +85,33 @@ LOGIN_REDIRECT_URL = '/'
 ACCOUNT_LOGOUT_REDIRECT_URL = '/'
 
 MIDDLEWARE = [
+    'games.instrumentation.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'games.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
+# Бюджеты производительности: превышение пишется в лог warning'ом (games.instrumentation)
+PERF_BUDGETS = {
+    'view:game_detail': {'queries': 10, 'ms': 300},
+    'view:transfer_money': {'queries': 15, 'ms': 300},
+    'view:answer_question': {'queries': 15, 'ms': 300},
+    'view:ask_question': {'queries': 15, 'ms': 300},
+    'task:games.tasks.check_and_finish_elections': {'ms': 2000},
+}
+
+# Профилирование по запросу (games.profiling): отчёты cProfile + SQL, хранится PROFILE_KEEP последних
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', BASE_DIR / 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+PROFILE_TOKEN_MAX_AGE = 3600  # сек, срок жизни токена для заголовка X-Profile
+
 ROOT_URLCONF = 'businessmonopoly.urls'
 
 TEMPLATES = [
@@ -119,18 +138,82 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Кэш: CACHE_URL=redis://... — общий для всех процессов (прод), иначе locmem внутри процесса
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'bm',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'socket_connect_timeout': 0.5,
+                'socket_timeout': 0.5,
+            },
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'businessmonopoly',
+            'TIMEOUT': 300,
+        },
+    }
+
 WSGI_APPLICATION = 'businessmonopoly.wsgi.application'
 ASGI_APPLICATION = 'businessmonopoly.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# DB_ENGINE=postgres — прод (psycopg2), иначе SQLite, настроенный под параллельные
+# select_for_update из Celery и ASGI.
+#
+# Постоянные соединения (CONN_MAX_AGE > 0) под ASGI не используем: Django держит соединение
+# на поток, а запросы, команды сокетов и движок игр ходят в БД из многих потоков — соединения
+# копятся до max_connections. Поэтому CONN_MAX_AGE=0, а в проде перед PostgreSQL ставится
+# pgbouncer в режиме transaction pooling (POSTGRES_PGBOUNCER=1 — отключает server-side курсоры,
+# которые через такой пул не работают). DB_CONN_MAX_AGE > 0 имеет смысл только для Celery/WSGI.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'businessmonopoly'),
+            'USER': os.getenv('POSTGRES_USER', 'businessmonopoly'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('POSTGRES_PGBOUNCER', '0') == '1',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('POSTGRES_CONNECT_TIMEOUT', 5)),
+                'application_name': os.getenv('POSTGRES_APP_NAME', 'businessmonopoly'),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {
+                # сколько секунд ждать снятия блокировки вместо "database is locked"
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+                # пишущие транзакции сразу берут RESERVED-блокировку: без дедлоков при апгрейде чтения в запись
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)) * 1000};"
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -176,8 +259,55 @@ CELERY_BEAT_SCHEDULE = {
         "task": "games.tasks.check_and_finish_elections",
         "schedule": 5.0,  # seconds
     },
+    "expire-stale-questions": {
+        "task": "games.tasks.expire_stale_questions",
+        "schedule": 60.0,
+    },
+    "snapshot-game-states": {
+        "task": "games.tasks.snapshot_game_states",
+        "schedule": 300.0,
+    },
+    "purge-deleted-games": {
+        "task": "games.tasks.purge_deleted_games",
+        "schedule": 600.0,
+    },
+    "refresh-game-stats": {
+        "task": "games.tasks.refresh_game_stats",
+        "schedule": 30.0,
+    },
 }
 
+# Метрики (games.metrics): общий для ASGI/WSGI/Celery хэш в Redis, отдаётся на /metrics
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', 'redis://localhost:6379/2')
+METRICS_REDIS_KEY = 'bm:metrics'
+METRICS_FLUSH_INTERVAL = 1.0  # сек
+# токен для Prometheus (Authorization: Bearer ...); пусто — /metrics только для staff
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Движок игр: "orm" — каждое действие сразу в БД с блокировками строк;
+# "memory" — games.engine, состояние в памяти процесса-владельца игры и пакетная запись;
+# остальные процессы пересылают команды владельцу через CHANNEL_LAYERS
+GAME_ENGINE = os.getenv('GAME_ENGINE', 'orm').lower()
+ENGINE_FLUSH_INTERVAL = float(os.getenv('ENGINE_FLUSH_INTERVAL', 1.0))  # сек
+ENGINE_IDLE_SECONDS = 300  # движок без команд столько секунд сбрасывает состояние и останавливается
+ENGINE_COMMAND_TIMEOUT = 5.0
+ENGINE_LEASE_SECONDS = 15  # аренда игры процессом; после падения владельца игру возьмёт другой через столько
+
+# Сколько живёт заданный вопрос / ответ на ревью, после чего закрывается по таймауту
+QUESTION_TTL_SECONDS = int(os.getenv("QUESTION_TTL_SECONDS", 15 * 60))
+
+# Входы/выходы игроков рассылаются не чаще раза в столько секунд (целое), остальное — одним догоняющим снапшотом
+JOIN_BROADCAST_INTERVAL = int(os.getenv("JOIN_BROADCAST_INTERVAL", 2))
+# Наблюдатели и зрители получают снапшоты не чаще раза в столько секунд (целое; 0 — сразу, как игроки)
+OBSERVER_UPDATE_INTERVAL = int(os.getenv("OBSERVER_UPDATE_INTERVAL", 1))
+
+# Дашборд по играм (games.dashboard): сколько лучших игроков показывать
+DASHBOARD_TOP_N = 10
+
+# Рейтинг внутри игры (games.leaderboard): размер топа и как часто (сек, целое) рассылать его изменения
+LEADERBOARD_TOP_N = 10
+LEADERBOARD_UPDATE_INTERVAL = int(os.getenv("LEADERBOARD_UPDATE_INTERVAL", 3))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 STATIC_URL = '/static/'
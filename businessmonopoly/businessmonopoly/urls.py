@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from games.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -8,4 +9,5 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('accounts/', include('allauth.urls')),
     path('games/', include('games.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
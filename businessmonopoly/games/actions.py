@@ -0,0 +1,688 @@
+# games/actions.py
+# Действия игрока — общие для HTTP-view (games/views.py) и команд по WebSocket (games/ws_commands.py).
+#
+# Функция получает GameContext и уже разобранные данные (dict или request.POST), возвращает
+# тело ответа или None («отказ без тела», HTTP 204), а ошибки бросает как ActionError
+# (Http404 — как есть). Действия, которые идут через движок игры (перевод, улучшение роли),
+# разбиты на prepare_* / apply_* / finish_*: сокет ждёт engine.asubmit между ними, не занимая поток.
+import json
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from . import engine, events, metrics
+from .models import AskedQuestion, GamePlayer, PendingAnswer
+from .questions import draw_question, get_game_catalog
+from .realtime import send_game_update, send_personal_message, send_question_to_players
+from .review import MAX_BULK_GRADE, bulk_grade, invalidate_pending_count, pending_count
+from .upgrades import upgrade_role as apply_role_upgrade
+from .votes import VoteService
+
+
+class ActionError(Exception):
+    """Отказ в действии: текст для игрока и HTTP-статус ответа."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# команда движка не дождалась очереди и отменена — повтор безопасен
+ENGINE_TIMEOUT = "Игра не успела выполнить действие — попробуйте ещё раз."
+
+
+def parse_json(body) -> dict:
+    try:
+        data = json.loads(body or b"{}")
+    except (TypeError, ValueError):
+        raise ActionError("Неверные данные")
+    if not isinstance(data, dict):
+        raise ActionError("Неверные данные")
+    return data
+
+
+def notify_paused(ctx) -> bool:
+    """Игра на паузе? Тогда игрок получает предупреждение, а действие не выполняется."""
+    if not ctx.paused:
+        return False
+    send_personal_message(ctx.user.id, "Игра на паузе. Действия временно недоступны.", "warning")
+    return True
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+# --- перевод денег ---
+
+@dataclass
+class Transfer:
+    sender: GamePlayer
+    receiver: GamePlayer | None
+    receiver_kind: str  # "player" | "bank" | "gov"
+    amount: int
+    source: str | None  # "personal"/"bank" для банкира
+
+    def engine_payload(self) -> dict:
+        return {
+            "sender_id": self.sender.id,
+            "special_role": self.sender.special_role,
+            "amount": self.amount,
+            "receiver_kind": self.receiver_kind,
+            "target_id": self.receiver.id if self.receiver else None,
+            "source": self.source,
+        }
+
+
+def prepare_transfer(ctx, data) -> Transfer:
+    sender = ctx.player(active_only=True)
+    if sender.is_observer:
+        raise ActionError("Наблюдатель не может переводить деньги")
+
+    receiver_raw = str(data.get("receiver") or "")
+    source = data.get("source") or None
+
+    try:
+        amount = int(data.get("amount"))
+    except (TypeError, ValueError):
+        raise ActionError("Некорректная сумма")
+    if amount <= 0:
+        raise ActionError("Сумма должна быть положительной")
+    if not receiver_raw:
+        raise ActionError("Не указан получатель")
+
+    target_player = None
+    if receiver_raw in ("bank", "gov"):
+        receiver_kind = receiver_raw
+    elif receiver_raw.startswith("p"):
+        receiver_kind = "player"
+        try:
+            target_id = int(receiver_raw[1:])
+        except ValueError:
+            raise ActionError("Некорректный получатель")
+        target_player = get_object_or_404(
+            GamePlayer, id=target_id, game=ctx.game, is_active=True, is_observer=False,
+        )
+        if target_player.id == sender.id:
+            raise ActionError("Нельзя перевести деньги самому себе")
+    else:
+        raise ActionError("Некорректный получатель")
+
+    return Transfer(sender, target_player, receiver_kind, amount, source)
+
+
+def apply_transfer(ctx, t: Transfer) -> tuple[bool, str]:
+    """Перевод без движка игры — сразу в БД."""
+    from .money import transfer_money as core_transfer
+
+    return core_transfer(
+        game=ctx.game,
+        sender=t.sender,
+        receiver=t.receiver,
+        amount=t.amount,
+        receiver_kind=t.receiver_kind,
+        source=t.source,
+    )
+
+
+def finish_transfer(ctx, ok: bool, msg: str) -> dict:
+    if not ok:
+        raise ActionError(msg)
+    metrics.inc("bm_transfers_total")
+    send_game_update(ctx.game.id)
+    return {"status": "ok", "message": msg}
+
+
+def transfer(ctx, data) -> dict:
+    t = prepare_transfer(ctx, data)
+    if engine.enabled():
+        try:
+            ok, msg = engine.submit(ctx.game.id, "transfer", **t.engine_payload())
+        except TimeoutError:
+            raise ActionError(ENGINE_TIMEOUT, status=503)
+    else:
+        ok, msg = apply_transfer(ctx, t)
+    return finish_transfer(ctx, ok, msg)
+
+
+# --- улучшение роли ---
+
+def prepare_upgrade(ctx, data) -> tuple[GamePlayer, str | None]:
+    # pay: "money" или "influence"; без него — деньгами, если хватает, иначе влиянием
+    player = ctx.player()
+    if player.special_role != 0:
+        raise ActionError("Вы не можете улучшать специальную роль")
+    return player, data.get("pay") or None
+
+
+def apply_upgrade(ctx, player: GamePlayer, pay: str | None) -> tuple[bool, str, int]:
+    return apply_role_upgrade(ctx.game, player, pay)
+
+
+def upgrade_engine_payload(ctx, player: GamePlayer, pay: str | None) -> dict:
+    return {"player_id": player.id, "pay": pay, "prices": ctx.game.upgrade_prices}
+
+
+def finish_upgrade(ctx, player: GamePlayer, ok: bool, msg: str, role: int) -> dict | None:
+    if not ok:
+        send_personal_message(ctx.user.id, msg, "error")
+        return None
+    player.role = role
+    send_game_update(ctx.game.id)
+    send_personal_message(
+        player.user_id,
+        "Роль успешно улучшена!",
+        "success",
+        extra_data={
+            "role_id": player.role,
+            "role": player.get_role_display(),
+            "special_role": player.special_role,
+        }
+    )
+    return {"status": "ok"}
+
+
+def upgrade_role(ctx, data) -> dict | None:
+    player, pay = prepare_upgrade(ctx, data)
+    if engine.enabled():
+        try:
+            ok, msg, role = engine.submit(ctx.game.id, "upgrade_role", **upgrade_engine_payload(ctx, player, pay))
+        except TimeoutError:
+            raise ActionError(ENGINE_TIMEOUT, status=503)
+    else:
+        ok, msg, role = apply_upgrade(ctx, player, pay)
+    return finish_upgrade(ctx, player, ok, msg, role)
+
+
+# --- выборы и спец-роли ---
+
+def vote(ctx, data) -> dict:
+    ctx.player()  # голосовать могут только участники игры
+    try:
+        candidate_id = int(data.get("candidate_id"))
+    except (TypeError, ValueError):
+        raise ActionError("Неверные данные")
+
+    try:
+        VoteService.cast_vote(ctx.game, ctx.user, candidate_id)
+    except ValueError as e:
+        raise ActionError(str(e))
+    except Exception:
+        raise ActionError("Не удалось сохранить голос", status=500)
+
+    send_game_update(ctx.game.id)
+    return {"status": "ok"}
+
+
+def choose_banker(ctx, data) -> dict:
+    game = ctx.game
+    # только текущий Политик
+    if not game.is_politician(ctx.user):
+        raise ActionError("Только Политик может назначать Банкира", status=403)
+
+    try:
+        banker_gp_id = int(data.get("banker_id"))
+    except (TypeError, ValueError):
+        raise ActionError("Некорректный payload")
+
+    banker_gp = get_object_or_404(
+        GamePlayer,
+        pk=banker_gp_id, game=game,
+        is_active=True, is_observer=False,
+    )
+
+    # нельзя назначить игрока со спец-ролью (уже Политик/Банкир)
+    if banker_gp.special_role in (1, 2):
+        raise ActionError("Игрок уже имеет спец-роль")
+
+    game.set_banker(banker_gp)
+    return {"status": "ok", "banker_id": banker_gp.id}
+
+
+# --- вопросы Политика ---
+
+def grant_reward(target_gp: GamePlayer, money: int = 0, influence: int = 0, reason: str = ""):
+    if not money and not influence:
+        return
+    with transaction.atomic():
+        gp = GamePlayer.objects.select_for_update().get(pk=target_gp.pk)
+        gp.money += int(money)
+        gp.influence += int(influence)
+        gp.save(update_fields=["money", "influence"])
+        events.record(gp.game_id, "balance", d={str(gp.id): [int(money), int(influence)]}, why=reason)
+    send_game_update(gp.game_id)
+    msg = f"Награда: +{money} 💰, +{influence} ⭐"
+    if reason:
+        msg = f"{reason}. {msg}"
+    send_personal_message(gp.user_id, msg, "success")
+
+
+def ask(ctx, data) -> dict:
+    game = ctx.game
+    asker_gp = ctx.player()
+
+    if asker_gp.special_role != 2:
+        raise ActionError("Только Политик может задавать вопросы.", status=403)
+
+    try:
+        # адресаты: один target_player_id, список target_player_ids или all_players=true
+        all_players = bool(data.get("all_players"))
+        target_ids = data.get("target_player_ids")
+        if target_ids is None and not all_players:
+            target_ids = [data.get("target_player_id")]
+        target_ids = [int(x) for x in (target_ids or [])]
+        # новый параметр (опционально)
+        qid = data.get("question_id")
+        if qid is not None:
+            qid = int(qid)
+    except (TypeError, ValueError):
+        raise ActionError("Неверные данные")
+
+    candidates = GamePlayer.objects.filter(game=game, is_active=True, is_observer=False)
+    if all_players:
+        targets = list(candidates.exclude(user_id=ctx.user.id))
+    elif len(target_ids) == 1:
+        target_gp = get_object_or_404(candidates, id=target_ids[0])
+        if target_gp.user_id == ctx.user.id:
+            raise ActionError("Нельзя задавать вопрос самому себе.")
+        targets = [target_gp]
+    else:
+        targets = list(candidates.filter(id__in=target_ids).exclude(user_id=ctx.user.id))
+    if not targets:
+        raise ActionError("Нет подходящих адресатов.")
+
+    catalog = get_game_catalog(game)
+    if not len(catalog):
+        raise ActionError("Нет доступных вопросов.", status=500)
+
+    # выбрать вопрос: заданный номер или случайный
+    if qid is not None:
+        q = catalog.get(qid)
+        if not q:
+            raise ActionError(f"Вопрос #{qid} не найден.", status=404)
+    else:
+        q = draw_question(game)
+        if not q:
+            raise ActionError("Нет доступных вопросов.", status=500)
+        qid = q["id"]
+
+    # создаём записи-линки одним INSERT (token генерится на стороне Python)
+    asked_list = AskedQuestion.objects.bulk_create([
+        AskedQuestion(game=game, question_id=qid, asked_by=asker_gp, target=gp)
+        for gp in targets
+    ])
+
+    message = f"Вопрос от Политика {asker_gp.user.username}:"
+    extra = {
+        "kind": "question",
+        "question_id": qid,
+        "text": q["text"],
+        "choices": q["choices"],
+        "from_politician": asker_gp.user.username,
+        "game_id": str(game.id),
+    }
+    if len(asked_list) == 1:
+        # один адресат — личное сообщение, как раньше
+        asked = asked_list[0]
+        send_personal_message(
+            asked.target.user_id,
+            message,
+            level="info",
+            extra_data={**extra, "ask_token": str(asked.token)},
+        )
+    else:
+        # много адресатов — одно сообщение в группу игры, токены по user_id
+        send_question_to_players(
+            game.id,
+            message,
+            extra,
+            {asked.target.user_id: asked.token for asked in asked_list},
+        )
+
+    return {"status": "ok", "asked": len(asked_list)}
+
+
+def answer(ctx, data) -> dict:
+    game = ctx.game
+    gp = ctx.player(active_only=True)
+
+    try:
+        qid = int(data.get("question_id"))
+    except (TypeError, ValueError):
+        raise ActionError("Неверные данные")
+    idx = data.get("choice_index")  # может быть None
+    ask_token = data.get("ask_token")
+    free_text = str(data.get("answer_text") or "").strip()  # для ручных/свободных
+
+    # найдём карточку вопроса
+    asked: AskedQuestion | None = None
+    if ask_token:
+        asked = AskedQuestion.objects.filter(game=game, token=ask_token).first()
+    if not asked:
+        asked = (AskedQuestion.objects
+                 .filter(game=game, target=gp, question_id=qid, answered=False)
+                 .order_by('-created_at')
+                 .first())
+
+    if not asked:
+        raise ActionError("Вопрос не найден или уже закрыт.", status=404)
+    if asked.target_id != gp.id:
+        raise ActionError("Вы не адресат этого вопроса.", status=403)
+    if asked.expired:
+        raise ActionError("Время на ответ истекло.")
+    if asked.answered:
+        raise ActionError("Ответ уже принят.")
+
+    # загружаем вопрос
+    q = get_game_catalog(game).get(qid)
+    if not q:
+        raise ActionError("Вопрос не найден.", status=404)
+
+    choices = q["choices"]
+    reward_money = q["reward"]["money"]
+    reward_infl  = q["reward"]["influence"]
+
+    # --- ветка 1: ручной вопрос (correct is None) ---
+    if not q["auto"]:
+        # берём текст ответа: либо выбранный вариант (если варианты вдруг есть),
+        # либо свободный текст
+        if choices and idx is not None:
+            try:
+                idx = int(idx)
+            except (TypeError, ValueError):
+                raise ActionError("Некорректный вариант.")
+            if not (0 <= idx < len(choices)):
+                raise ActionError("Некорректный вариант.")
+            answer_text = str(choices[idx])
+        else:
+            # свободный ответ обязателен
+            if not free_text:
+                raise ActionError("Ответ пустой.")
+            answer_text = free_text
+
+        # создаём ожидающий ручного решения ответ и закрываем карточку: дальше ответ живёт
+        # как PendingAnswer (решение Политика или его собственный TTL), а карточку не
+        # должен закрыть по TTL expire_stale_questions и повторно ответить сам игрок.
+        # answer_choice/is_correct остаются пустыми — так ручной ответ отличается от авто.
+        with transaction.atomic():
+            if not AskedQuestion.objects.filter(pk=asked.pk, answered=False).update(answered=True):
+                raise ActionError("Ответ уже принят.")
+            PendingAnswer.objects.create(
+                game=game,
+                player=gp,
+                question_id=qid,
+                answer_text=answer_text,
+                status="pending",
+            )
+        invalidate_pending_count(game.id)
+
+        # игроку — квитанция
+        send_personal_message(
+            gp.user_id,
+            "Ответ отправлен. Ожидайте решения Политика.",
+            level="info",
+            extra_data={
+                "kind": "question_result",
+                "question_id": qid,
+                "your_choice": None,
+                "correct": None,
+            },
+        )
+
+        # политикам — напоминание о ревью
+        for pol in GamePlayer.objects.filter(game=game, special_role=2, is_active=True):
+            send_personal_message(
+                pol.user_id,
+                f"Новый ответ по вопросу №{qid} от {gp.user.username}.",
+                level="info",
+                extra_data={
+                    "kind": "question_review",
+                    "question_id": qid,
+                    "player_username": gp.user.username,
+                    "answer_text": answer_text,
+                    "ask_token": str(asked.token),
+                    "pending_count": pending_count(game.id),
+                }
+            )
+
+        return {"status": "ok", "pending": True}
+
+    # --- ветка 2: авто-вопрос (есть correct) ---
+    if not choices:
+        raise ActionError("У вопроса нет вариантов.")
+    try:
+        idx = int(idx)
+    except (TypeError, ValueError):
+        raise ActionError("Некорректный вариант.")
+    if not (0 <= idx < len(choices)):
+        raise ActionError("Некорректный вариант.")
+
+    # correct (индекс или значение) уже сведён к индексу при загрузке каталога
+    is_correct = (idx == q["correct_index"])
+    # для отчёта отдадим исходное значение
+    correct_for_report = q["correct"]
+
+    # закрываем карточку (для авто-вопроса)
+    asked.answered = True
+    asked.answer_choice = idx
+    asked.is_correct = is_correct
+    asked.save(update_fields=["answered", "answer_choice", "is_correct"])
+
+    # игроку — локальный фидбэк
+    if is_correct:
+        grant_reward(gp, money=reward_money, influence=reward_infl, reason=f"Правильный ответ #{qid}")
+        send_game_update(game.id)
+        send_personal_message(
+            gp.user_id,
+            "Верно! 🎉",
+            level="success",
+            extra_data={"kind": "question_result", "question_id": qid, "your_choice": idx, "correct": correct_for_report},
+        )
+    else:
+        send_personal_message(
+            gp.user_id,
+            "Неверно.",
+            level="warning",
+            extra_data={"kind": "question_result", "question_id": qid, "your_choice": idx, "correct": correct_for_report},
+        )
+
+    # Отчёт Политику, который задавал этот конкретный вопрос
+    polis_user_id = asked.asked_by.user_id
+    send_personal_message(
+        polis_user_id,
+        f"{gp.user.username} ответил на ваш вопрос №{qid}: {'верно' if is_correct else 'неверно'}.",
+        level="success" if is_correct else "warning",
+        extra_data={
+            "kind": "question_report",
+            "player": gp.user.username,
+            "question_id": qid,
+            "choice": idx,
+            "correct": correct_for_report,
+            "ask_token": str(asked.token),
+        },
+    )
+
+    return {"status": "ok", "correct": bool(is_correct)}
+
+
+def grade_answer(ctx, data) -> dict:
+    game = ctx.game
+    reviewer_gp = ctx.player()
+
+    # Разрешим только Политику
+    if reviewer_gp.special_role != 2:
+        raise ActionError("Только Политик может принимать решения.", status=403)
+
+    approved = _as_bool(data.get("approved"))
+    ask_token = data.get("ask_token")
+    qid_raw = data.get("question_id")
+    pid_raw = data.get("player_id")  # опционально
+
+    # question_id (опц.)
+    qid = None
+    if qid_raw is not None:
+        try:
+            qid = int(qid_raw)
+        except (TypeError, ValueError):
+            raise ActionError("Некорректный question_id")
+
+    # 1) Основной путь — ищем по ask_token
+    if ask_token:
+        asked = AskedQuestion.objects.filter(game=game, token=ask_token).first()
+        if not asked:
+            raise ActionError("Карточка вопроса не найдена по токену.", status=404)
+        # извлекаем адресата
+        target_gp = asked.target
+        if qid is None:
+            qid = asked.question_id
+    else:
+        # 2) Фолбэк — по player_id + question_id (если прислали)
+        if pid_raw is None or qid is None:
+            raise ActionError("Нужен ask_token или (player_id и question_id).")
+        try:
+            player_id = int(pid_raw)
+        except (TypeError, ValueError):
+            raise ActionError("Некорректный player_id")
+
+        target_gp = get_object_or_404(GamePlayer, id=player_id, game=game, is_active=True)
+        asked = (AskedQuestion.objects
+                 .filter(game=game, target=target_gp, question_id=qid)
+                 .order_by('-created_at').first())
+        if not asked:
+            raise ActionError("Карточка вопроса не найдена.", status=404)
+
+    # Находим «ожидающий» ответ, если это ручной вопрос (correct == null)
+    pending = (PendingAnswer.objects
+               .filter(game=game, player=target_gp, question_id=qid, status="pending")
+               .order_by('-created_at')
+               .first())
+    if not pending:
+        # Может быть уже обработан, или вопрос авто-проверяемый
+        raise ActionError("Нет ожидающего решения ответа.", status=404)
+
+    # Применяем решение
+    pending.status = "approved" if approved else "rejected"
+    pending.decided_at = timezone.now()
+    pending.decided_by = ctx.user
+    pending.save(update_fields=["status", "decided_at", "decided_by"])
+    invalidate_pending_count(game.id)
+
+    # Выдаём награду только при approved
+    if approved:
+        # Возьмём награду из каталога вопросов (если есть), иначе дефолт
+        spec = get_game_catalog(game).get(qid)
+        money = spec["reward"]["money"] if spec else 0
+        infl  = spec["reward"]["influence"] if spec else 0
+
+        if money or infl:
+            # фиксируем баланс под транзакцию на всякий случай
+            with transaction.atomic():
+                tgt_locked = GamePlayer.objects.select_for_update().get(pk=target_gp.pk)
+                tgt_locked.money += money
+                tgt_locked.influence += infl
+                tgt_locked.save(update_fields=["money", "influence"])
+                events.record(game.id, "balance", d={str(tgt_locked.id): [money, infl]}, why=f"answer:{pending.id}")
+            # пушим игроку уведомление
+            parts = []
+            if money: parts.append(f"+{money} ₽")
+            if infl:  parts.append(f"+{infl} ⭐")
+            send_personal_message(
+                target_gp.user_id,
+                f"Ваш ответ принят. Награда: {' и '.join(parts)}",
+                level="success",
+            )
+        else:
+            # награда не задана — просто уведомим
+            send_personal_message(
+                target_gp.user_id,
+                "Ваш ответ принят.",
+                level="success",
+            )
+    else:
+        send_personal_message(
+            target_gp.user_id,
+            "Ваш ответ отклонён.",
+            level="warning",
+        )
+
+    # Автору вопроса (Политику) — подтверждение
+    send_personal_message(
+        asked.asked_by.user_id,
+        f"Решение по ответу игрока {target_gp.user.username} на вопрос №{qid}: "
+        + ("одобрено" if approved else "отклонено"),
+        level=("success" if approved else "warning"),
+        extra_data={
+            "kind": "question_review_result",
+            "question_id": qid,
+            "player": target_gp.user.username,
+            "approved": approved,
+            "ask_token": str(asked.token),
+        },
+    )
+
+    # Обновим общий стейт на клиенте (балансы и т.п.)
+    send_game_update(game.id)
+
+    return {"status": "ok", "approved": approved}
+
+
+def grade_answers(ctx, data) -> dict:
+    """
+    Массовое решение по ответам одной транзакцией.
+    data: {"decisions": [{"id": 1, "approved": true}, ...]} или {"ids": [...], "approved": bool}
+    """
+    game = ctx.game
+    reviewer_gp = ctx.player()
+    if reviewer_gp.special_role != 2:
+        raise ActionError("Только Политик может принимать решения.", status=403)
+
+    try:
+        if "decisions" in data:
+            decisions = {int(d["id"]): _as_bool(d.get("approved")) for d in data["decisions"]}
+        else:
+            approved = _as_bool(data.get("approved"))
+            decisions = {int(pid): approved for pid in data.get("ids") or []}
+    except (TypeError, ValueError, KeyError, AttributeError):
+        raise ActionError("Неверные данные")
+
+    if not decisions:
+        raise ActionError("Нет ответов для решения.")
+    if len(decisions) > MAX_BULK_GRADE:
+        raise ActionError(f"Не больше {MAX_BULK_GRADE} ответов за раз.")
+
+    rows, rewards = bulk_grade(game, ctx.user, decisions)
+    if not rows:
+        raise ActionError("Нет ожидающих решения ответов.", status=404)
+
+    # одно уведомление на игрока, а не на каждый ответ
+    per_player = {}
+    for r in rows:
+        stats = per_player.setdefault(r.player_id, {"user_id": r.player.user_id, "approved": 0, "rejected": 0})
+        stats[r.status] += 1
+    for player_id, stats in per_player.items():
+        money, infl = rewards.get(player_id, (0, 0))
+        parts = []
+        if money: parts.append(f"+{money} ₽")
+        if infl:  parts.append(f"+{infl} ⭐")
+        text = f"Ваши ответы проверены: принято {stats['approved']}, отклонено {stats['rejected']}."
+        if parts:
+            text += f" Награда: {' и '.join(parts)}"
+        send_personal_message(
+            stats["user_id"],
+            text,
+            level="success" if stats["approved"] else "warning",
+        )
+
+    if rewards:
+        send_game_update(game.id)
+
+    return {
+        "status": "ok",
+        "approved": [r.pk for r in rows if r.status == "approved"],
+        "rejected": [r.pk for r in rows if r.status == "rejected"],
+        "skipped": [pid for pid in decisions if pid not in {r.pk for r in rows}],
+    }
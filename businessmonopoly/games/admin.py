@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import Game
+from .models import Game, QuestionPack
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'creator', 'is_active', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'creator__username')
+
+
+@admin.register(QuestionPack)
+class QuestionPackAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'slug', 'locale', 'version', 'is_active', 'created_at')
+    list_filter = ('is_active', 'locale')
+    search_fields = ('name', 'slug')
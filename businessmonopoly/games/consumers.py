@@ -1,7 +1,15 @@
 import json
+import logging
+
 from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .realtime import get_game_update_data, send_game_update
+from . import metrics, ws_commands
+from .models import GamePlayer
+from .realtime import get_game_update_data, send_game_update, players_group, observers_group
+
+logger = logging.getLogger(__name__)
+
 
 class GameConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -16,7 +24,12 @@ class GameConsumer(AsyncWebsocketConsumer):
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        # игроки получают снапшоты сразу, наблюдатели и зрители без места в игре — реже
+        self.tier_group_name = None
+        await self.set_tier(await self.is_viewer())
         await self.accept()
+        self.counted = True
+        metrics.inc("bm_ws_connections", 1, game=self.game_id)
 
         data = await sync_to_async(get_game_update_data)(self.game_id)
         await self.channel_layer.send(self.channel_name, {
@@ -25,8 +38,29 @@ class GameConsumer(AsyncWebsocketConsumer):
         })
 
     async def disconnect(self, close_code):
+        if getattr(self, "counted", False):
+            metrics.inc("bm_ws_connections", -1, game=self.game_id)
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        if getattr(self, "tier_group_name", None):
+            await self.channel_layer.group_discard(self.tier_group_name, self.channel_name)
+
+    @database_sync_to_async
+    def is_viewer(self) -> bool:
+        is_observer = (GamePlayer.objects
+                       .filter(game_id=self.game_id, user=self.scope["user"], is_active=True)
+                       .values_list("is_observer", flat=True)
+                       .first())
+        return is_observer is None or is_observer
+
+    async def set_tier(self, is_observer: bool):
+        group = observers_group(self.game_id) if is_observer else players_group(self.game_id)
+        if group == self.tier_group_name:
+            return
+        if self.tier_group_name:
+            await self.channel_layer.group_discard(self.tier_group_name, self.channel_name)
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.tier_group_name = group
 
     async def receive(self, text_data):
         try:
@@ -49,6 +83,10 @@ class GameConsumer(AsyncWebsocketConsumer):
                     }
                 )
 
+        # Действия игрока (см. games/ws_commands.py)
+        elif msg_type == "cmd":
+            await self.handle_action(data)
+
         # Обработка команд (расширяемый механизм)
         elif msg_type == "command":
             command = data.get("command", "unknown")
@@ -63,6 +101,21 @@ class GameConsumer(AsyncWebsocketConsumer):
                     }
                 )
 
+    async def handle_action(self, data):
+        request_id = data.get("id")
+        try:
+            status, result = await ws_commands.dispatch(
+                self.scope["user"], self.game_id, data.get("action"), data.get("payload") or {}
+            )
+        except ws_commands.CommandError as e:
+            reply = {"type": "error", "id": request_id, "status": e.status, "error": str(e)}
+        except Exception:
+            logger.exception("[WS] action %r failed game=%s", data.get("action"), self.game_id)
+            reply = {"type": "error", "id": request_id, "status": 500, "error": "Внутренняя ошибка"}
+        else:
+            reply = {"type": "ack", "id": request_id, "status": status, "data": result}
+        await self.send(text_data=json.dumps(reply))
+
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
             'type': 'chat',
@@ -76,6 +129,22 @@ class GameConsumer(AsyncWebsocketConsumer):
             'data': event['data'],
         }))
 
+    async def timer_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'timer',
+            'data': event['data'],
+        }))
+
+    async def viewer_tier(self, event):
+        if self.scope["user"].id in event["user_ids"]:
+            await self.set_tier(event["is_observer"])
+
+    async def leaderboard_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'leaderboard',
+            'data': event['data'],
+        }))
+
     async def voting_started(self, event):
         await self.send(text_data=json.dumps({
             'type': 'voting_started'
@@ -93,6 +162,41 @@ class GameConsumer(AsyncWebsocketConsumer):
             "level": event.get("level", "info"),
         }))
 
+    async def question_broadcast(self, event):
+        token = event.get("tokens", {}).get(str(self.scope["user"].id))
+        if not token:
+            return  # вопрос не этому игроку
+        await self.send(text_data=json.dumps({
+            "type": "personal",
+            "message": {
+                "type": "personal",
+                "message": event["message"],
+                "level": "info",
+                "data": {**event["data"], "ask_token": token},
+            },
+        }))
+
+    async def questions_expired(self, event):
+        uid = str(self.scope["user"].id)
+        tokens = event.get("tokens", {}).get(uid) or []
+        pending = event.get("pending", {}).get(uid) or 0
+        if not tokens and not pending:
+            return
+        parts = []
+        if tokens:
+            parts.append(f"Время на ответ истекло (вопросов: {len(tokens)}).")
+        if pending:
+            parts.append(f"Ответы не были проверены вовремя: {pending}.")
+        await self.send(text_data=json.dumps({
+            "type": "personal",
+            "message": {
+                "type": "personal",
+                "message": " ".join(parts),
+                "level": "warning",
+                "data": {"kind": "question_expired", "ask_tokens": tokens, "pending": pending},
+            },
+        }))
+
     async def game_deleted(self, event):
         await self.send(text_data=json.dumps({
             "type": "game_deleted",
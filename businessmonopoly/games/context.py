@@ -0,0 +1,70 @@
+# games/context.py
+from django.http import Http404
+
+from . import state_cache
+from .models import Game, GamePlayer
+
+
+class GameContext:
+    """
+    Игра и игрок пользователя в рамках одного запроса (HTTP или команды по сокету).
+    Грузятся один раз (игрок вместе с игрой и user — одним запросом) и переиспользуются
+    декоратором pause_protected и самим view. Получать через get_game_context().
+    """
+
+    def __init__(self, user, game_id):
+        self.user = user
+        self.game_id = game_id
+        self._game = None
+        self._player = None
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        if self.user.is_authenticated:
+            self._player = (GamePlayer.objects
+                            .select_related("game", "user")
+                            .filter(game_id=self.game_id, user=self.user)
+                            .first())
+        if self._player is not None:
+            self._game = self._player.game
+        else:
+            self._game = Game.objects.filter(id=self.game_id).first()
+        self._loaded = True
+        if self._game is None or self._game.deleted_at is not None:
+            raise Http404("Игра не найдена")
+
+    @property
+    def game(self) -> Game:
+        self._load()
+        return self._game
+
+    @property
+    def paused(self) -> bool:
+        """Флаг паузы из state_cache — без загрузки игры."""
+        return state_cache.paused(self.game_id)
+
+    def player(self, active_only: bool = False, lock: bool = False) -> GamePlayer:
+        """
+        Игрок текущего пользователя в этой игре (404, если его нет).
+        lock=True — перечитать строку с SELECT ... FOR UPDATE (вызывать внутри transaction.atomic).
+        """
+        self._load()
+        if self._player is None or (active_only and not self._player.is_active):
+            raise Http404("Игрок не найден")
+        if lock:
+            self._player = (GamePlayer.objects
+                            .select_for_update(of=("self",))
+                            .select_related("user")
+                            .get(pk=self._player.pk))
+            self._player.game = self._game
+        return self._player
+
+
+def get_game_context(request, game_id) -> GameContext:
+    ctx = getattr(request, "_game_context", None)
+    if ctx is None or str(ctx.game_id) != str(game_id):
+        ctx = GameContext(request.user, game_id)
+        request._game_context = ctx
+    return ctx
@@ -0,0 +1,123 @@
+# games/dashboard.py
+# Общий дашборд по нескольким параллельным играм (турнир).
+#
+# Агрегаты по GamePlayer/VoteSession на каждый показ дороги, поэтому они лежат в GameStats
+# и пересчитываются задачей refresh_game_stats только для игр, где с прошлого раза были
+# события в журнале (GameEvent). Дашборд читает одну таблицу GameStats.
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Game, GamePlayer, GameStats, GameEvent, VoteSession
+
+STATS_FIELDS = (
+    "name", "players", "total_money", "total_influence", "bank_balance", "state_balance",
+    "roles", "elections", "top_players", "last_event_id", "refreshed_at",
+)
+
+
+def stale_game_ids() -> list:
+    """Активные игры, у которых журнал новее сводки (или сводки ещё нет)."""
+    return list(
+        Game.objects
+        .filter(is_active=True, deleted_at__isnull=True)
+        .annotate(last_event=Max("events__id"))
+        .filter(last_event__isnull=False)
+        .filter(Q(stats__isnull=True) | Q(last_event__gt=F("stats__last_event_id")))
+        .values_list("id", flat=True)
+    )
+
+
+def refresh_game_stats(game_ids=None) -> int:
+    """Пересчитать GameStats для game_ids (по умолчанию — устаревших). Возвращает число игр."""
+    # выбывшие игры из дашборда убираем
+    GameStats.objects.filter(Q(game__is_active=False) | Q(game__deleted_at__isnull=False)).delete()
+
+    game_ids = list(stale_game_ids() if game_ids is None else game_ids)
+    if not game_ids:
+        return 0
+
+    # id последнего события читаем до агрегатов: что придёт позже — попадёт в следующий пересчёт
+    last_events = dict(
+        GameEvent.objects.filter(game_id__in=game_ids)
+        .values("game_id").annotate(m=Max("id")).values_list("game_id", "m")
+    )
+    games = {g["id"]: g for g in Game.objects.filter(id__in=game_ids, deleted_at__isnull=True)
+             .values("id", "name", "bank_balance", "state_balance")}
+
+    in_play = GamePlayer.objects.filter(game_id__in=games, is_active=True, is_observer=False)
+    totals = {row["game_id"]: row for row in in_play.values("game_id").annotate(
+        players=Count("id"), money=Sum("money"), influence=Sum("influence"))}
+    roles = defaultdict(dict)
+    for game_id, role, count in in_play.values("game_id", "role").annotate(n=Count("id")).values_list(
+            "game_id", "role", "n"):
+        roles[game_id][str(role)] = count
+    elections = dict(
+        VoteSession.objects.filter(game_id__in=games, kind=VoteSession.KIND_ELECTION)
+        .values("game_id").annotate(n=Count("id")).values_list("game_id", "n")
+    )
+
+    now = timezone.now()
+    rows = []
+    for game_id, game in games.items():
+        top = list(in_play.filter(game_id=game_id)
+                   .order_by("-money", "id")
+                   .values("user__username", "money", "influence")[:settings.DASHBOARD_TOP_N])
+        total = totals.get(game_id, {})
+        rows.append(GameStats(
+            game_id=game_id,
+            name=game["name"],
+            players=total.get("players", 0),
+            total_money=total.get("money") or 0,
+            total_influence=total.get("influence") or 0,
+            bank_balance=game["bank_balance"],
+            state_balance=game["state_balance"],
+            roles=roles.get(game_id, {}),
+            elections=elections.get(game_id, 0),
+            top_players=[{"username": p["user__username"], "money": p["money"], "influence": p["influence"]}
+                         for p in top],
+            last_event_id=last_events.get(game_id, 0),
+            refreshed_at=now,
+        ))
+    GameStats.objects.bulk_create(rows, update_conflicts=True, unique_fields=["game"], update_fields=STATS_FIELDS)
+    return len(rows)
+
+
+def dashboard(game_ids=None) -> dict:
+    """Сводка по играм game_ids (по умолчанию — по всем, что есть в GameStats)."""
+    qs = GameStats.objects.order_by("name")
+    if game_ids:
+        qs = qs.filter(game_id__in=game_ids)
+
+    roles_names = dict(GamePlayer.ROLE_CHOICES)
+    games, roles, top = [], Counter(), []
+    for s in qs:
+        games.append({
+            "id": str(s.game_id),
+            "name": s.name,
+            "players": s.players,
+            "total_money": s.total_money,
+            "total_influence": s.total_influence,
+            "bank_balance": s.bank_balance,
+            "state_balance": s.state_balance,
+            "elections": s.elections,
+            "refreshed_at": s.refreshed_at.isoformat(),
+        })
+        roles.update({int(r): n for r, n in s.roles.items()})
+        top.extend({**p, "game": s.name} for p in s.top_players)
+
+    top.sort(key=lambda p: p["money"], reverse=True)
+    return {
+        "games": games,
+        "totals": {
+            "games": len(games),
+            "players": sum(g["players"] for g in games),
+            "money": sum(g["total_money"] for g in games),
+            "influence": sum(g["total_influence"] for g in games),
+            "elections": sum(g["elections"] for g in games),
+        },
+        "roles": {roles_names.get(r, str(r)): n for r, n in sorted(roles.items())},
+        "top_players": top[:settings.DASHBOARD_TOP_N],
+    }
@@ -0,0 +1,623 @@
+# games/engine.py
+# Необязательный режим GAME_ENGINE="memory": у каждой активной игры одна asyncio-задача,
+# которая держит деньги/влияние/роли в памяти и выполняет команды строго по очереди —
+# без select_for_update. Изменения пишутся в БД пачками (write-behind) раз в
+# ENGINE_FLUSH_INTERVAL: деньги и влияние — приращениями (money = money + d), поэтому
+# ORM-код, начисляющий награды мимо движка, не затирается. После падения процесса
+# состояние поднимается из БД, т.е. с последнего сброса.
+#
+# Движок живёт в отдельном потоке со своим event loop (один на процесс), так что
+# его можно звать и из sync-view, и из консьюмеров. У игры один владелец на все процессы
+# (ASGI-воркеры, WSGI, Celery, soak_bots): аренда EngineLease в БД. Процесс-владелец держит
+# движок, остальные пересылают ему команды через channel layer (EngineNode) — иначе два
+# движка одобрили бы списание одних и тех же денег. Без CHANNEL_LAYERS пересылать некуда,
+# и движок, как раньше, работает только в пределах процесса.
+#
+# К БД движок ходит через свой однопоточный пул, а не через sync_to_async: общий поток
+# asgiref занят, пока sync-view или database_sync_to_async ждёт ответа движка, и такой
+# вызов упал бы с «would deadlock».
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from . import events, leaderboard, upgrades
+
+logger = logging.getLogger(__name__)
+
+# один поток — обращения движков к БД идут строго по очереди (загрузка после сброса и т.п.).
+# Свой поток, а не ThreadPoolExecutor: пул закрывается раньше atexit, а финальный сброс
+# (_flush_all) тоже пишет в БД.
+_db_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+
+def _db_worker():
+    while True:
+        fn, args, cf = _db_queue.get()
+        if not cf.set_running_or_notify_cancel():
+            continue
+        try:
+            close_old_connections()
+            cf.set_result(fn(*args))
+        except BaseException as e:
+            cf.set_exception(e)
+
+
+async def _db(fn, *args):
+    """Выполнить синхронную функцию с ORM в потоке БД движка."""
+    cf = concurrent.futures.Future()
+    _db_queue.put((fn, args, cf))
+    return await asyncio.wrap_future(cf)
+
+
+def enabled() -> bool:
+    return getattr(settings, "GAME_ENGINE", "orm") == "memory"
+
+
+class PlayerState:
+    """Игрок в памяти движка. d_* — приращения, ещё не записанные в БД."""
+
+    __slots__ = ("id", "user_id", "role", "money", "influence", "d_money", "d_influence", "role_dirty")
+
+    def __init__(self, id, user_id, role, money, influence):
+        self.id = id
+        self.user_id = user_id
+        self.role = role
+        self.money = money
+        self.influence = influence
+        self.d_money = 0
+        self.d_influence = 0
+        self.role_dirty = False
+
+    def add(self, money: int = 0, influence: int = 0):
+        self.money += money
+        self.influence += influence
+        self.d_money += money
+        self.d_influence += influence
+
+
+class QueuedCommand:
+    """Команда в очереди движка. started — уже выполняется, отменять поздно."""
+
+    __slots__ = ("action", "payload", "future", "started")
+
+    def __init__(self, action: str, payload: dict, future: asyncio.Future):
+        self.action = action
+        self.payload = payload
+        self.future = future
+        self.started = False
+
+
+class GameEngine:
+    def __init__(self, game_id, node: "EngineNode"):
+        self.game_id = game_id
+        self.node = node
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.players: dict[int, PlayerState] = {}
+        self.bank_balance = 0
+        self.state_balance = 0
+        self.d_bank = 0
+        self.d_state = 0
+        self.dirty = False
+        self.events: list[tuple[str, dict]] = []  # пишутся в GameEvent вместе со сбросом
+        self.last_command = time.monotonic()
+        self.task = None
+
+    # --- загрузка / сброс (в потоке БД) ---
+
+    def _load_sync(self):
+        from .models import Game, GamePlayer
+        game = Game.objects.only("bank_balance", "state_balance").get(id=self.game_id)
+        self.bank_balance, self.state_balance = game.bank_balance, game.state_balance
+        rows = (GamePlayer.objects
+                .filter(game_id=self.game_id)
+                .values_list("id", "user_id", "role", "money", "influence"))
+        self.players = {r[0]: PlayerState(*r) for r in rows}
+
+    def _load_player_sync(self, player_id) -> PlayerState | None:
+        from .models import GamePlayer
+        row = (GamePlayer.objects
+               .filter(game_id=self.game_id, pk=player_id)
+               .values_list("id", "user_id", "role", "money", "influence")
+               .first())
+        return PlayerState(*row) if row else None
+
+    def _flush_sync(self, dirty: list[PlayerState], d_bank: int, d_state: int, roles_changed: bool,
+                    pending_events: list[tuple[str, dict]]):
+        from .models import Game, GamePlayer
+        from . import state_cache
+        with transaction.atomic():
+            deltas = [p for p in dirty if p.d_money or p.d_influence]
+            if deltas:
+                GamePlayer.objects.filter(pk__in=[p.id for p in deltas]).update(
+                    money=F("money") + Case(
+                        *[When(pk=p.id, then=Value(p.d_money)) for p in deltas], default=Value(0)
+                    ),
+                    influence=F("influence") + Case(
+                        *[When(pk=p.id, then=Value(p.d_influence)) for p in deltas], default=Value(0)
+                    ),
+                )
+            roles = [p for p in dirty if p.role_dirty]
+            if roles:
+                GamePlayer.objects.filter(pk__in=[p.id for p in roles]).update(
+                    role=Case(*[When(pk=p.id, then=Value(p.role)) for p in roles], default=F("role"))
+                )
+            if d_bank or d_state:
+                Game.objects.filter(id=self.game_id).update(
+                    bank_balance=F("bank_balance") + d_bank,
+                    state_balance=F("state_balance") + d_state,
+                )
+            events.record_many(self.game_id, pending_events)
+            if roles_changed:
+                state_cache.bump(self.game_id)
+
+            # перечитываем балансы: в БД могли начислить что-то мимо движка
+            fresh = dict(
+                (pid, (money, influence)) for pid, money, influence in
+                GamePlayer.objects.filter(game_id=self.game_id).values_list("id", "money", "influence")
+            )
+            game = Game.objects.only("bank_balance", "state_balance").get(id=self.game_id)
+        return fresh, game.bank_balance, game.state_balance
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        dirty = [p for p in self.players.values() if p.d_money or p.d_influence or p.role_dirty]
+        d_bank, d_state = self.d_bank, self.d_state
+        roles_changed = any(p.role_dirty for p in dirty)
+        fresh, self.bank_balance, self.state_balance = await _db(
+            self._flush_sync, dirty, d_bank, d_state, roles_changed, list(self.events)
+        )
+        self.events.clear()
+        # команды не выполняются во время сброса (один писатель), так что просто обнуляем
+        for p in self.players.values():
+            p.d_money = p.d_influence = 0
+            p.role_dirty = False
+            if p.id in fresh:
+                p.money, p.influence = fresh[p.id]
+        self.d_bank = self.d_state = 0
+        self.dirty = False
+        # рейтинг читается из БД — после сброса проверяем, не сменился ли топ
+        try:
+            await _db(leaderboard.publish_throttled, self.game_id)
+        except Exception:
+            logger.exception("[ENGINE] leaderboard publish failed game=%s", self.game_id)
+
+    # --- цикл ---
+
+    async def run(self):
+        interval = getattr(settings, "ENGINE_FLUSH_INTERVAL", 1.0)
+        idle_limit = getattr(settings, "ENGINE_IDLE_SECONDS", 300)
+        engines = self.node.engines
+        next_flush = time.monotonic() + interval
+        next_renew = time.monotonic() + _lease_seconds() / 3
+        try:
+            await _db(self._load_sync)
+            while True:
+                timeout = max(next_flush - time.monotonic(), 0)
+                try:
+                    command = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    # отменённую (вызывающий не дождался) не выполняем: иначе повтор применит её дважды
+                    if not command.future.done():
+                        await self.execute(command)
+
+                if time.monotonic() >= next_flush:
+                    next_flush = time.monotonic() + interval
+                    if self.queue.empty() and time.monotonic() - self.last_command > idle_limit:
+                        # новые команды пойдут уже в новый движок; он загрузится после нашего
+                        # сброса — _db выполняет обращения к БД в одном потоке по очереди
+                        engines.pop(self.game_id, None)
+                    elif self.node.channel and time.monotonic() >= next_renew:
+                        next_renew = time.monotonic() + _lease_seconds() / 3
+                        if not await _db(_claim_lease, self.game_id, self.node.channel):
+                            # аренду забрал другой процесс (мы подвисли дольше её срока) —
+                            # сбрасываем своё и уступаем
+                            logger.warning("[ENGINE] lease lost game=%s", self.game_id)
+                            engines.pop(self.game_id, None)
+                    try:
+                        await self.flush()
+                    except Exception:
+                        # приращения не потеряны — попробуем на следующем интервале
+                        logger.exception("[ENGINE] flush failed game=%s", self.game_id)
+                        engines.setdefault(self.game_id, self)
+                        continue
+                    if engines.get(self.game_id) is not self:
+                        return
+        except Exception:
+            logger.exception("[ENGINE] game=%s stopped", self.game_id)
+        finally:
+            if engines.get(self.game_id) is self:
+                engines.pop(self.game_id)
+            while not self.queue.empty():
+                command = self.queue.get_nowait()
+                if not command.future.done():
+                    command.future.set_exception(RuntimeError("Движок игры остановлен"))
+            if self.node.channel and self.game_id not in engines:
+                try:
+                    await _db(_release_lease, self.game_id, self.node.channel)
+                except Exception:
+                    logger.exception("[ENGINE] lease release failed game=%s", self.game_id)
+
+    async def execute(self, command: QueuedCommand):
+        command.started = True
+        self.last_command = time.monotonic()
+        try:
+            result = await self.handle(command.action, command.payload)
+        except Exception as e:
+            logger.exception("[ENGINE] game=%s %s failed", self.game_id, command.action)
+            if not command.future.done():
+                command.future.set_exception(e)
+        else:
+            if not command.future.done():
+                command.future.set_result(result)
+
+    async def handle(self, action: str, payload: dict):
+        handler = getattr(self, f"cmd_{action}", None)
+        if handler is None:
+            raise ValueError(f"Неизвестная команда: {action}")
+        return await handler(**payload)
+
+    async def _player(self, player_id) -> PlayerState | None:
+        p = self.players.get(player_id)
+        if p is None:  # игрок присоединился после загрузки движка
+            p = await _db(self._load_player_sync, player_id)
+            if p is not None:
+                self.players[p.id] = p
+        return p
+
+    # --- команды (выполняются строго по одной) ---
+
+    async def cmd_transfer(self, sender_id, special_role, amount, receiver_kind, target_id=None, source=None):
+        """Та же семантика, что у переводов через ORM: Политик платит с гос. счёта, Банкир — с банка по запросу."""
+        sender = await self._player(sender_id)
+        if sender is None:
+            return False, "Игрок не найден."
+        if amount <= 0:
+            return False, "Сумма должна быть положительной."
+
+        src = events.transfer_source(special_role, source, sender.id)
+        balance = {"state": self.state_balance, "bank": self.bank_balance}.get(src, sender.money)
+        if balance < amount:
+            return False, "Недостаточно средств на выбранном счёте."
+
+        target = None
+        if receiver_kind == "player":
+            target = await self._player(target_id)
+            if target is None:
+                return False, "Получатель не найден."
+            if target.id == sender.id:
+                return False, "Нельзя переводить самому себе."
+
+        if src == "state":
+            self.state_balance -= amount
+            self.d_state -= amount
+        elif src == "bank":
+            self.bank_balance -= amount
+            self.d_bank -= amount
+        else:
+            sender.add(money=-amount)
+
+        if receiver_kind == "player":
+            target.add(money=amount)
+        elif receiver_kind == "bank":
+            self.bank_balance += amount
+            self.d_bank += amount
+        else:  # gov
+            self.state_balance += amount
+            self.d_state += amount
+
+        self.events.append(("transfer", {
+            "from": src, "to": events.account(receiver_kind, target.id if target else None), "amt": amount,
+        }))
+        self.dirty = True
+        return True, "Перевод выполнен."
+
+    async def cmd_upgrade_role(self, player_id, prices, pay=None):
+        """prices — Game.upgrade_prices. Возвращает (ok, сообщение, роль после команды)."""
+        player = await self._player(player_id)
+        if player is None:
+            return False, "Игрок не найден.", None
+        price = (prices or {}).get(str(player.role))
+        if price is None or player.role >= upgrades.MAX_ROLE:
+            return False, "Нельзя улучшить эту роль.", player.role
+        if pay is not None and pay not in upgrades.PAY_METHODS:
+            return False, "Неизвестный способ оплаты.", player.role
+        method = upgrades.choose_payment(price, pay, player.money, player.influence)
+        if method is None or getattr(player, method) < price[method]:
+            return False, "Недостаточно средств для улучшения.", player.role
+        money = price["money"] if method == upgrades.PAY_MONEY else 0
+        influence = price["influence"] if method == upgrades.PAY_INFLUENCE else 0
+        new_role = player.role + 1
+        player.add(money=-money, influence=-influence)
+        player.role = new_role
+        player.role_dirty = True
+        self.events.append(("upgrade", {"p": player.id, "r": new_role, "m": money, "i": influence}))
+        self.dirty = True
+        return True, "Роль успешно улучшена!", new_role
+
+    async def cmd_snapshot(self):
+        # ключи — строки: снапшот может уйти другому процессу через channel layer (msgpack)
+        return {
+            "players": {str(p.id): (p.money, p.influence, p.role) for p in self.players.values()},
+            "bank_balance": self.bank_balance,
+            "state_balance": self.state_balance,
+        }
+
+    async def cmd_flush(self):
+        await self.flush()
+        return True
+
+
+
+
+# --- аренда игры (в потоке БД) ---
+
+def _lease_seconds() -> float:
+    return getattr(settings, "ENGINE_LEASE_SECONDS", 15)
+
+
+def _claim_lease(game_id, owner: str) -> bool:
+    """Взять или продлить аренду: свободна, истекла или уже наша. Один условный UPDATE."""
+    from .models import EngineLease, Game
+    if not Game.objects.filter(id=game_id).exists():
+        return False
+    now = timezone.now()
+    EngineLease.objects.get_or_create(game_id=game_id, defaults={"owner": "", "expires_at": now})
+    return bool(
+        EngineLease.objects
+        .filter(Q(owner="") | Q(owner=owner) | Q(expires_at__lt=now), game_id=game_id)
+        .update(owner=owner, expires_at=now + timedelta(seconds=_lease_seconds()))
+    )
+
+
+def _lease_owner(game_id) -> str | None:
+    from .models import EngineLease
+    owner, expires_at = (EngineLease.objects.filter(game_id=game_id)
+                         .values_list("owner", "expires_at").first() or ("", None))
+    return owner if owner and expires_at > timezone.now() else None
+
+
+def _release_lease(game_id, owner: str):
+    from .models import EngineLease
+    EngineLease.objects.filter(game_id=game_id, owner=owner).update(owner="")
+
+
+# --- движки процесса и пересылка команд владельцу ---
+
+class EngineMoved(Exception):
+    """Игра сменила владельца, пока команда шла к нему."""
+
+
+class EngineNode:
+    """
+    Движки игр одного процесса. Команда по игре, которой владеет другой процесс, уходит
+    ему в канал channel layer ({"type": "engine.command"}), ответ приходит в наш канал.
+    """
+
+    OWNER_CACHE_SECONDS = 2.0
+    REPLY_GRACE = 2.0  # сверх таймаута команды: владелец сам отвечает «не успел»
+
+    def __init__(self):
+        self.engines: dict[str, GameEngine] = {}
+        self.layer = None
+        self.channel: str | None = None
+        self.replies: dict[str, asyncio.Future] = {}
+        self.owners: dict[str, tuple[str | None, float]] = {}
+        self.serving: set[asyncio.Task] = set()
+        self._started = None
+
+    async def start(self):
+        if self._started is None:
+            self._started = asyncio.get_running_loop().create_task(self._start())
+        await self._started
+
+    async def _start(self):
+        self.layer = get_channel_layer()
+        if self.layer is None:
+            logger.warning("[ENGINE] CHANNEL_LAYERS не настроен — движки без владельцев между процессами")
+            return
+        self.channel = await self.layer.new_channel("engine.")
+        asyncio.get_running_loop().create_task(self.listen())
+
+    async def listen(self):
+        failing = False
+        while True:
+            try:
+                message = await self.layer.receive(self.channel)
+            except Exception:
+                if not failing:
+                    logger.warning("[ENGINE] channel layer unavailable", exc_info=True)
+                failing = True
+                await asyncio.sleep(1)
+                continue
+            failing = False
+            if message.get("type") == "engine.reply":
+                future = self.replies.get(message.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(message)
+            elif message.get("type") == "engine.command":
+                task = asyncio.get_running_loop().create_task(self.serve(message))
+                self.serving.add(task)
+                task.add_done_callback(self.serving.discard)
+
+    async def serve(self, message: dict):
+        """Команда от другого процесса: выполнить у себя и ответить в его канал."""
+        reply = {"type": "engine.reply", "id": message["id"]}
+        try:
+            reply["result"] = await self.run_local(
+                message["game"], message["action"], message["payload"], message["timeout"],
+                message.get("create", True),
+            )
+        except EngineMoved:
+            reply["error"] = "moved"
+        except asyncio.TimeoutError:
+            reply["error"] = "timeout"
+        except Exception as e:
+            reply["error"] = str(e) or type(e).__name__
+        try:
+            await self.layer.send(message["reply"], reply)
+        except Exception:
+            logger.exception("[ENGINE] reply failed game=%s", message["game"])
+
+    async def submit(self, game_id, action: str, payload: dict, timeout: float, create: bool = True):
+        """
+        Выполнить команду у владельца игры. create=False — только если движок уже где-то
+        запущен (иначе None): снапшот не должен поднимать движок.
+        """
+        await self.start()
+        key = str(game_id)
+        for _ in range(3):
+            owner = None if key in self.engines else await self._owner(key, create)
+            if owner is None or owner == self.channel:
+                return await self.run_local(key, action, payload, timeout, create)
+            try:
+                return await self._forward(owner, key, action, payload, timeout, create)
+            except EngineMoved:
+                self.owners.pop(key, None)
+        raise RuntimeError("Не удалось найти владельца игры")
+
+    async def _owner(self, key: str, create: bool) -> str | None:
+        """Канал владельца игры; create=True — стать владельцем, если его нет."""
+        if self.channel is None:
+            return None
+        cached = self.owners.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        owner = await _db(_lease_owner, key)
+        if owner is None and create and await _db(_claim_lease, key, self.channel):
+            owner = self.channel
+        self.owners[key] = (owner, time.monotonic() + self.OWNER_CACHE_SECONDS)
+        return owner
+
+    async def run_local(self, key: str, action: str, payload: dict, timeout: float, create: bool = True):
+        engine = self.engines.get(key)
+        if engine is None:
+            if not create:
+                return None
+            # движка нет — берём (или подтверждаем) аренду, прежде чем грузить состояние
+            if self.channel and not await _db(_claim_lease, key, self.channel):
+                raise EngineMoved()
+            engine = self.engines.get(key)
+            if engine is None:
+                engine = self.engines[key] = GameEngine(key, self)
+                engine.task = asyncio.get_running_loop().create_task(engine.run())
+        command = QueuedCommand(action, payload, asyncio.get_running_loop().create_future())
+        await engine.queue.put(command)
+        try:
+            return await asyncio.wait_for(asyncio.shield(command.future), timeout)
+        except asyncio.TimeoutError:
+            if command.started:
+                # уже выполняется — дожидаемся: отменить поздно, а повтор применил бы её дважды
+                return await command.future
+            command.future.cancel()  # run() её пропустит
+            raise
+        except asyncio.CancelledError:
+            if not command.started:
+                command.future.cancel()
+            raise
+
+    async def _forward(self, owner: str, key: str, action: str, payload: dict, timeout: float, create: bool):
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self.replies[request_id] = future
+        try:
+            await self.layer.send(owner, {
+                "type": "engine.command", "id": request_id, "reply": self.channel,
+                "game": key, "action": action, "payload": payload, "timeout": timeout, "create": create,
+            })
+            reply = await asyncio.wait_for(future, timeout + self.REPLY_GRACE)
+        finally:
+            self.replies.pop(request_id, None)
+        error = reply.get("error")
+        if error == "moved":
+            raise EngineMoved()
+        if error == "timeout":
+            raise asyncio.TimeoutError()
+        if error:
+            raise RuntimeError(error)
+        return reply.get("result")
+
+
+# --- поток с event loop ---
+
+_node = EngineNode()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="game-engine", daemon=True).start()
+            threading.Thread(target=_db_worker, name="game-engine-db", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def _timeout(timeout: float | None) -> float:
+    return timeout or getattr(settings, "ENGINE_COMMAND_TIMEOUT", 5.0)
+
+
+def submit(game_id, action: str, timeout: float | None = None, **payload):
+    """
+    Выполнить команду в движке игры и дождаться результата (из любого потока, кроме потока движка).
+    Не дождались за timeout — TimeoutError, а ещё не начатая команда отменяется.
+    """
+    timeout = _timeout(timeout)
+    cf = asyncio.run_coroutine_threadsafe(_node.submit(game_id, action, payload, timeout), _get_loop())
+    try:
+        return cf.result(timeout + EngineNode.REPLY_GRACE * 2)
+    except concurrent.futures.TimeoutError:
+        cf.cancel()
+        raise
+
+
+async def asubmit(game_id, action: str, timeout: float | None = None, **payload):
+    """То же для async-кода (консьюмеры)."""
+    cf = asyncio.run_coroutine_threadsafe(_node.submit(game_id, action, payload, _timeout(timeout)), _get_loop())
+    return await asyncio.wrap_future(cf)
+
+
+def snapshot(game_id) -> dict | None:
+    """Состояние из памяти движка игры — у этого процесса или у владельца; None, если движок не запущен."""
+    if not enabled():
+        return None
+    timeout = _timeout(None)
+    cf = asyncio.run_coroutine_threadsafe(
+        _node.submit(game_id, "snapshot", {}, timeout, create=False), _get_loop()
+    )
+    try:
+        return cf.result(timeout + EngineNode.REPLY_GRACE * 2)
+    except Exception:
+        cf.cancel()
+        logger.warning("[ENGINE] snapshot failed game=%s", game_id, exc_info=True)
+        return None
+
+
+@atexit.register
+def _flush_all():
+    if _loop is None:
+        return
+    for game_id in list(_node.engines):
+        try:
+            submit(game_id, "flush", timeout=5.0)
+            if _node.channel:
+                _release_lease(game_id, _node.channel)  # не ждать истечения — игру сразу возьмёт другой процесс
+        except Exception:
+            logger.exception("[ENGINE] final flush failed game=%s", game_id)
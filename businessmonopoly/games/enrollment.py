@@ -0,0 +1,70 @@
+# games/enrollment.py
+import random
+
+from django.db import transaction
+
+from . import events, state_cache
+from .models import GamePlayer
+from .realtime import send_viewer_tiers
+
+INITIAL_MONEY = 300
+INITIAL_INFLUENCE = 0
+MAX_ENROLL = 1000
+
+
+def roll_initial_role(game, rng=random) -> int:
+    """Стартовая роль: Предприниматель с шансом game.entrepreneur_chance, иначе Безработный."""
+    return 3 if rng.random() < game.entrepreneur_chance else 1
+
+
+@transaction.atomic
+def enroll_players(game, users) -> tuple[list[GamePlayer], int]:
+    """
+    Записать в игру сразу многих пользователей: новые — одним bulk_create со стартовыми
+    ролью и деньгами (как assign_initial_role_and_resources), уже бывшие в игре — одним
+    UPDATE is_active. Снапшот игры не рассылается — это делает вызывающий, один раз;
+    открытые сокеты записанных игроков переводятся из группы зрителей в группу игроков.
+    Возвращает (созданные игроки, сколько вернулось).
+    """
+    users = {u.pk: u for u in users}
+    existing = dict(
+        GamePlayer.objects.filter(game=game, user_id__in=list(users)).values_list("user_id", "id")
+    )
+
+    rows = list(
+        GamePlayer.objects
+        .filter(pk__in=list(existing.values()), is_active=False)
+        .values_list("pk", "user_id", "is_observer")
+    )
+    reactivated = [pk for pk, _, _ in rows]
+    if reactivated:
+        GamePlayer.objects.filter(pk__in=reactivated).update(is_active=True)
+
+    created = GamePlayer.objects.bulk_create([
+        GamePlayer(
+            game=game,
+            user=user,
+            role=roll_initial_role(game),
+            money=INITIAL_MONEY,
+            influence=INITIAL_INFLUENCE,
+        )
+        for uid, user in users.items() if uid not in existing
+    ])
+    if any(p.pk is None for p in created):
+        # бэкенд не вернул id из bulk_create (MySQL и т.п.) — дочитываем
+        ids = dict(GamePlayer.objects.filter(game=game, user_id__in=[p.user_id for p in created])
+                   .values_list("user_id", "id"))
+        for p in created:
+            p.pk = ids[p.user_id]
+
+    events.record_many(game.id, [
+        *[("joined", {"p": p.pk, "u": p.user_id, "r": p.role, "m": p.money, "i": p.influence, "o": False})
+          for p in created],
+        *[("active", {"p": pk, "a": True}) for pk in reactivated],
+    ])
+    if created or reactivated:
+        state_cache.bump(game.id)
+    # вернувшиеся наблюдатели остаются наблюдателями — их сокеты и так в группе зрителей
+    players = [p.user_id for p in created] + [uid for _, uid, is_observer in rows if not is_observer]
+    transaction.on_commit(lambda: send_viewer_tiers(players, game.id, False))
+    return created, len(reactivated)
@@ -0,0 +1,228 @@
+# games/events.py
+# Журнал событий игры (GameEvent) и сборка состояния из него.
+#
+# Виды событий и их data (ключи короткие — журнал большой):
+#   baseline   {state}                          — полное состояние, снятое с живых таблиц
+#   created    {bank, state}
+#   joined     {p, u, r, m, i, o}               — игрок, пользователь, роль, деньги, влияние, наблюдатель
+#   active     {p, a}                           — вышел/вернулся
+#   observer   {p, o}
+#   balance    {d: {p: [деньги, влияние]}, why} — приращения
+#   transfer   {from, to, amt}                  — счета "p:<id>" / "bank" / "state"
+#   upgrade    {p, r, m, i}                     — новая роль и списание
+#   special    {p, s}                           — p получает спец-роль s (1 Банкир, 2 Политик), у прежнего она снимается
+#   session    {id, a}                          — сессия голосования открыта (a=True) / закрыта
+#   ballot     {s, v, c}                        — в сессии s пользователь v голосует за игрока c (повтор — смена голоса)
+#   paused / resumed / election_started         {}
+import logging
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEEP = 3
+REPLAY_CHUNK = 2000
+
+# игры, про которые этот процесс уже знает, что журнал у них начат (только чтобы не спрашивать БД;
+# единственность baseline держит ограничение gameevent_one_baseline)
+_started: set[str] = set()
+
+
+def account(kind: str, player_id=None) -> str:
+    """Обозначение счёта в событиях transfer."""
+    if kind in ("bank", "state"):
+        return kind
+    if kind == "gov":
+        return "state"
+    return f"p:{player_id}"
+
+
+def transfer_source(special_role: int, source: str | None, player_id) -> str:
+    """С какого счёта платит игрок: Политик — с гос. счёта, Банкир — с банка, если попросил."""
+    if special_role == 2:
+        return "state"
+    if special_role == 1 and source == "bank":
+        return "bank"
+    return account("personal", player_id)
+
+
+# --- запись ---
+
+def record(game_id, kind: str, **data):
+    record_many(game_id, [(kind, data)])
+
+
+def record_baseline(game_id):
+    """Начать журнал со снимка живых таблиц (игра собрана не через события, например восстановлена из файла)."""
+    from .models import GameEvent
+    GameEvent.objects.create(game_id=game_id, kind="baseline", data={"state": live_state(game_id)})
+    transaction.on_commit(lambda: _started.add(str(game_id)))
+
+
+def record_many(game_id, items: list[tuple[str, dict]]):
+    """
+    Дописать события. Первое событие игры сопровождается baseline со снимком живых таблиц,
+    чтобы игры, начатые до журнала, тоже можно было воспроизвести.
+    """
+    from .models import GameEvent
+    if not items:
+        return
+    key = str(game_id)
+    with transaction.atomic():
+        created = GameEvent.objects.bulk_create([GameEvent(game_id=game_id, kind=k, data=d) for k, d in items])
+        if key not in _started:
+            # снимок берётся после наших событий: состояние уже включает их изменения
+            baseline, made = GameEvent.objects.get_or_create(
+                game_id=game_id, kind="baseline",
+                defaults={"data": lambda: {"state": live_state(game_id)}},
+            )
+            if not made and baseline.id > created[0].id:
+                # baseline снят параллельной транзакцией, пока наша не закоммичена, — наших
+                # изменений в нём нет; повторяем события после него, иначе replay их пропустит
+                GameEvent.objects.bulk_create([GameEvent(game_id=game_id, kind=k, data=d) for k, d in items])
+            transaction.on_commit(lambda: _started.add(key))
+
+
+# --- состояние ---
+
+def empty_state() -> dict:
+    return {"bank": 0, "state": 0, "paused": False, "voting": False, "players": {}, "votes": {}}
+
+
+def live_state(game_id) -> dict:
+    """Состояние по живым таблицам Game/GamePlayer — в том же формате, что собирает apply()."""
+    from .models import Game, GamePlayer, VoteBallot, VoteSession
+    game = Game.objects.only("bank_balance", "state_balance", "paused_at", "is_voting").get(id=game_id)
+    players = GamePlayer.objects.filter(game_id=game_id).values_list(
+        "id", "user_id", "role", "special_role", "money", "influence", "is_active", "is_observer"
+    )
+    votes = {str(sid): {} for sid in VoteSession.objects.filter(game_id=game_id, is_active=True)
+             .values_list("id", flat=True)}
+    for sid, voter, candidate in (VoteBallot.objects
+                                  .filter(session__game_id=game_id, session__is_active=True)
+                                  .values_list("session_id", "voter_id", "option__object_id")):
+        votes[str(sid)][str(voter)] = candidate
+    return {
+        "bank": game.bank_balance,
+        "state": game.state_balance,
+        "paused": game.paused_at is not None,
+        "voting": game.is_voting,
+        "players": {
+            str(pid): {"u": uid, "r": role, "s": special, "m": money, "i": infl, "a": active, "o": observer}
+            for pid, uid, role, special, money, infl, active, observer in players
+        },
+        "votes": votes,
+    }
+
+
+def _move(state: dict, acc: str, amount: int):
+    if acc in ("bank", "state"):
+        state[acc] += amount
+    else:
+        player = state["players"].get(acc[2:])
+        if player is not None:
+            player["m"] += amount
+
+
+def apply(state: dict, kind: str, data: dict) -> dict:
+    """Применить одно событие к состоянию (на месте). Неизвестные события пропускаются."""
+    players = state["players"]
+    if kind == "baseline":
+        return data["state"]
+    if kind == "created":
+        state["bank"], state["state"] = data["bank"], data["state"]
+    elif kind == "joined":
+        players[str(data["p"])] = {
+            "u": data["u"], "r": data["r"], "s": 0, "m": data["m"], "i": data["i"], "a": True, "o": data["o"],
+        }
+    elif kind == "active":
+        if str(data["p"]) in players:
+            players[str(data["p"])]["a"] = data["a"]
+    elif kind == "observer":
+        if str(data["p"]) in players:
+            players[str(data["p"])].update(o=data["o"], a=True)
+    elif kind == "balance":
+        for pid, (money, influence) in data["d"].items():
+            if pid in players:
+                players[pid]["m"] += money
+                players[pid]["i"] += influence
+    elif kind == "transfer":
+        _move(state, data["from"], -data["amt"])
+        _move(state, data["to"], data["amt"])
+    elif kind == "upgrade":
+        player = players.get(str(data["p"]))
+        if player is not None:
+            player["r"] = data["r"]
+            player["m"] -= data["m"]
+            player["i"] -= data["i"]
+    elif kind == "special":
+        if data["s"]:
+            for player in players.values():
+                if player["s"] == data["s"]:
+                    player["s"] = 0
+        if str(data["p"]) in players:
+            players[str(data["p"])]["s"] = data["s"]
+    elif kind == "session":
+        votes = state.setdefault("votes", {})
+        if data["a"]:
+            votes[str(data["id"])] = {}
+        else:
+            votes.pop(str(data["id"]), None)
+    elif kind == "ballot":
+        session = state.setdefault("votes", {}).get(str(data["s"]))
+        if session is not None:
+            session[str(data["v"])] = data["c"]
+    elif kind == "paused":
+        state["paused"] = True
+    elif kind == "resumed":
+        state["paused"] = False
+    elif kind == "election_started":
+        state["voting"] = True
+    elif kind == "election_finished":
+        state["voting"] = False
+    else:
+        logger.debug("[EVENTS] unknown kind %s", kind)
+    return state
+
+
+def rebuild(game_id, upto: int | None = None) -> tuple[dict, int]:
+    """
+    Собрать состояние из последнего снапшота и событий после него (только журнал,
+    живые таблицы не читаются). upto — id последнего учитываемого события.
+    Возвращает (состояние, id последнего применённого события).
+    """
+    from .models import GameEvent, GameSnapshot
+    snapshots = GameSnapshot.objects.filter(game_id=game_id)
+    events = GameEvent.objects.filter(game_id=game_id)
+    if upto is not None:
+        snapshots = snapshots.filter(last_event_id__lte=upto)
+        events = events.filter(id__lte=upto)
+
+    snap = snapshots.order_by("-last_event_id").values_list("last_event_id", "state").first()
+    last_id, state = snap if snap else (0, empty_state())
+
+    for event_id, kind, data in (events
+                                 .filter(id__gt=last_id)
+                                 .order_by("id")
+                                 .values_list("id", "kind", "data")
+                                 .iterator(chunk_size=REPLAY_CHUNK)):
+        state = apply(state, kind, data)
+        last_id = event_id
+    state.setdefault("votes", {})  # журналы и снапшоты до событий голосования
+    return state, last_id
+
+
+def take_snapshot(game_id):
+    """Сохранить снапшот, если с прошлого были события. Старые снапшоты сверх SNAPSHOT_KEEP удаляются."""
+    from .models import GameSnapshot
+    state, last_id = rebuild(game_id)
+    latest = (GameSnapshot.objects.filter(game_id=game_id)
+              .order_by("-last_event_id").values_list("last_event_id", flat=True).first())
+    if not last_id or latest == last_id:
+        return None
+    snapshot = GameSnapshot.objects.create(game_id=game_id, last_event_id=last_id, state=state)
+    stale = list(GameSnapshot.objects.filter(game_id=game_id)
+                 .order_by("-last_event_id").values_list("id", flat=True)[SNAPSHOT_KEEP:])
+    if stale:
+        GameSnapshot.objects.filter(id__in=stale).delete()
+    return snapshot
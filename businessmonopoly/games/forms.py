@@ -1,5 +1,5 @@
 from django import forms
-from .models import Game
+from .models import Game, QuestionPack, default_upgrade_prices
 from datetime import timedelta
 
 
@@ -30,6 +30,38 @@ class GameSettingsForm(forms.ModelForm):
         help_text='Формат: чч:мм:сс',
     )
 
+    question_pack = forms.ModelChoiceField(
+        label='Пакет вопросов',
+        queryset=QuestionPack.objects.filter(is_active=True),
+        required=False,
+        empty_label='Стандартные вопросы',
+    )
+
+    # таблица цен улучшения роли (Game.upgrade_prices): поле формы -> (текущая роль, способ оплаты)
+    UPGRADE_PRICE_FIELDS = {
+        'upgrade_worker_money': ('1', 'money'),
+        'upgrade_worker_influence': ('1', 'influence'),
+        'upgrade_entrepreneur_money': ('2', 'money'),
+        'upgrade_entrepreneur_influence': ('2', 'influence'),
+    }
+    upgrade_worker_money = forms.IntegerField(label='Улучшение до Работника: деньги', min_value=0)
+    upgrade_worker_influence = forms.IntegerField(label='Улучшение до Работника: влияние', min_value=0)
+    upgrade_entrepreneur_money = forms.IntegerField(label='Улучшение до Предпринимателя: деньги', min_value=0)
+    upgrade_entrepreneur_influence = forms.IntegerField(label='Улучшение до Предпринимателя: влияние', min_value=0)
+
     class Meta:
         model = Game
-        fields = ['entrepreneur_chance', 'election_interval', 'election_duration']
+        fields = ['entrepreneur_chance', 'election_interval', 'election_duration', 'question_pack']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        prices = self.instance.upgrade_prices or default_upgrade_prices()
+        for name, (role, method) in self.UPGRADE_PRICE_FIELDS.items():
+            self.fields[name].initial = prices.get(role, {}).get(method, 0)
+
+    def save(self, commit=True):
+        prices = {}
+        for name, (role, method) in self.UPGRADE_PRICE_FIELDS.items():
+            prices.setdefault(role, {})[method] = self.cleaned_data[name]
+        self.instance.upgrade_prices = prices
+        return super().save(commit)
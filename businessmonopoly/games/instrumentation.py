@@ -0,0 +1,152 @@
+# games/instrumentation.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Простая гистограмма с фиксированными границами (последний бакет — +Inf)."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        return {
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+            "count": self.count,
+            "sum": round(self.sum, 3),
+        }
+
+
+_lock = threading.Lock()
+_stats: dict[str, dict[str, Histogram]] = {}
+
+
+def record(name: str, queries: int, db_seconds: float, total_seconds: float):
+    """Записать один вызов view/таски в гистограммы и сверить с бюджетом PERF_BUDGETS."""
+    db_ms = db_seconds * 1000
+    total_ms = total_seconds * 1000
+    with _lock:
+        hists = _stats.get(name)
+        if hists is None:
+            hists = _stats[name] = {
+                "queries": Histogram(QUERY_BUCKETS),
+                "db_ms": Histogram(MS_BUCKETS),
+                "total_ms": Histogram(MS_BUCKETS),
+            }
+        hists["queries"].observe(queries)
+        hists["db_ms"].observe(db_ms)
+        hists["total_ms"].observe(total_ms)
+
+    budget = getattr(settings, "PERF_BUDGETS", {}).get(name)
+    if budget:
+        if queries > budget.get("queries", float("inf")) or total_ms > budget.get("ms", float("inf")):
+            logger.warning(
+                "[PERF] budget exceeded %s: queries=%d (max %s) total=%.1fms (max %s) db=%.1fms",
+                name, queries, budget.get("queries", "-"), total_ms, budget.get("ms", "-"), db_ms,
+            )
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {name: {k: h.as_dict() for k, h in hists.items()} for name, hists in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+class QueryStats:
+    """execute_wrapper: считает запросы и время в БД на текущем соединении."""
+
+    __slots__ = ("count", "db_time")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.db_time += time.perf_counter() - start
+
+
+@contextmanager
+def track_queries():
+    stats = QueryStats()
+    with connection.execute_wrapper(stats):
+        yield stats
+
+
+class PerfMiddleware:
+    """Число запросов, время в БД и общее время на каждый view; в DEBUG — ещё и в заголовках ответа."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with track_queries() as stats:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            record(f"view:{match.view_name}", stats.count, stats.db_time, total)
+
+        if settings.DEBUG:
+            response["X-DB-Queries"] = str(stats.count)
+            response["Server-Timing"] = f"db;dur={stats.db_time * 1000:.1f}, total;dur={total * 1000:.1f}"
+        return response
+
+
+# --- то же самое для Celery-тасок ---
+_task_trackers = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    stats = QueryStats()
+    wrapper = connection.execute_wrapper(stats)
+    wrapper.__enter__()
+    _task_trackers[task_id] = (time.perf_counter(), stats, wrapper)
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, **kwargs):
+    tracked = _task_trackers.pop(task_id, None)
+    if tracked is None:
+        return
+    start, stats, wrapper = tracked
+    wrapper.__exit__(None, None, None)
+    duration = time.perf_counter() - start
+    record(f"task:{task.name}", stats.count, stats.db_time, duration)
+
+    from . import metrics
+    metrics.observe("bm_celery_task_seconds", duration, task=task.name)
+    metrics.flush()  # воркер может завершиться в любой момент — не держим приращения
@@ -0,0 +1,86 @@
+# games/leaderboard.py
+# Рейтинг игроков игры по деньгам и влиянию.
+#
+# Топ и место игрока считаются запросами по индексам (game, money) / (game, influence),
+# без сортировки всего состава. Место — COUNT по диапазону индекса, т.е. O(игроков впереди),
+# а не O(log n), как у sorted set; при сотнях игроков в игре это доли миллисекунды.
+#
+# В сокет топ уходит при любом изменении (состав, порядок или значения), но не чаще
+# LEADERBOARD_UPDATE_INTERVAL. Флаг members_changed говорит клиентам, что сменился состав
+# топа — только тогда они перезапрашивают своё место.
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import GamePlayer
+
+METRICS = ("money", "influence")
+
+_PUBLISHED_TTL = 24 * 60 * 60
+
+
+def _published_key(game_id) -> str:
+    return f"games:leaderboard:{game_id}:published"
+
+
+def _ranked(game_id):
+    return GamePlayer.objects.filter(game_id=game_id, is_active=True, is_observer=False)
+
+
+def _check_metric(metric: str):
+    if metric not in METRICS:
+        raise ValueError(f"Неизвестный показатель: {metric}")
+
+
+def top(game_id, metric: str = "money", limit: int | None = None) -> list[dict]:
+    """Первые limit игроков по metric (при равенстве — кто раньше вошёл в игру)."""
+    _check_metric(metric)
+    limit = limit or settings.LEADERBOARD_TOP_N
+    rows = (_ranked(game_id)
+            .order_by(f"-{metric}", "id")
+            .values("id", "user__username", metric)[:limit])
+    return [
+        {"rank": n, "id": r["id"], "username": r["user__username"], "value": r[metric]}
+        for n, r in enumerate(rows, start=1)
+    ]
+
+
+def rank(player: GamePlayer, metric: str = "money") -> int:
+    """Место игрока: сколько игроков впереди него (по индексу) + 1."""
+    _check_metric(metric)
+    value = getattr(player, metric)
+    ahead = _ranked(player.game_id).filter(
+        Q(**{f"{metric}__gt": value}) | Q(**{metric: value, "id__lt": player.id})
+    ).count()
+    return ahead + 1
+
+
+def board(game_id, limit: int | None = None) -> dict:
+    return {metric: top(game_id, metric, limit) for metric in METRICS}
+
+
+def publish_if_changed(game_id) -> bool:
+    """Разослать топ в группу игры, если он изменился с прошлой рассылки. True — если разослали."""
+    data = board(game_id)
+    published = {metric: [(p["id"], p["value"]) for p in rows] for metric, rows in data.items()}
+    key = _published_key(game_id)
+    previous = cache.get(key)
+    if previous == published:
+        return False
+    cache.set(key, published, _PUBLISHED_TTL)
+
+    members = {metric: sorted(pid for pid, _ in rows) for metric, rows in published.items()}
+    data["members_changed"] = previous is None or members != {
+        metric: sorted(pid for pid, _ in rows) for metric, rows in previous.items()
+    }
+    from .realtime import _group_send
+    _group_send(f"game_{game_id}", {"type": "leaderboard_update", "data": data})
+    return True
+
+
+def publish_throttled(game_id):
+    """publish_if_changed не чаще раза в LEADERBOARD_UPDATE_INTERVAL; последнее изменение — догоняющей рассылкой."""
+    from .realtime import _throttled
+    from .tasks import publish_throttled_leaderboard
+    _throttled("leaderboard", game_id, settings.LEADERBOARD_UPDATE_INTERVAL,
+               publish_if_changed, publish_throttled_leaderboard)
@@ -0,0 +1,73 @@
+# games/lobby.py
+import base64
+import uuid
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Game
+
+FIRST_PAGE_TTL = 5  # сек; список опрашивают постоянно, а меняется он редко
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 100
+
+_FIRST_PAGE_KEY = "games:lobby:first"
+
+_FIELDS = ("id", "name", "creator__username", "created_at")
+
+
+def encode_cursor(created_at: datetime, game_id) -> str:
+    raw = f"{created_at.isoformat()}|{game_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Курсор -> (created_at, id). Битый курсор — ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, game_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(game_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def _fetch_page(after: str | None, query: str, limit: int) -> tuple[list[dict], str | None]:
+    qs = Game.objects.filter(is_active=True)
+    if query:
+        qs = qs.filter(name_key__startswith=query.casefold())
+    if after:
+        created_at, game_id = decode_cursor(after)
+        # keyset по (created_at, id) — без OFFSET, стабильно при добавлении новых игр
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=game_id))
+
+    rows = list(qs.order_by("-created_at", "-id").values(*_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None
+    return rows, next_cursor
+
+
+def list_games(after: str | None = None, query: str = "", limit: int = DEFAULT_PAGE_SIZE) -> tuple[list[dict], str | None]:
+    """
+    Страница активных игр, новые сверху. query — префикс названия (без учёта регистра).
+    Первая страница без поиска (обычного размера) отдаётся из кэша на FIRST_PAGE_TTL секунд.
+    Возвращает (игры, курсор следующей страницы или None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (query or "").strip()[:MAX_QUERY_LENGTH]
+    if after or query or limit != DEFAULT_PAGE_SIZE:
+        return _fetch_page(after, query, limit)
+
+    page = cache.get(_FIRST_PAGE_KEY)
+    if page is None:
+        page = _fetch_page(None, "", limit)
+        cache.set(_FIRST_PAGE_KEY, page, FIRST_PAGE_TTL)
+    return page
+
+
+def invalidate_game_list():
+    """Сбросить кэш первой страницы (игра создана, активирована или удалена)."""
+    transaction.on_commit(lambda: cache.delete(_FIRST_PAGE_KEY))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = "Показать активный профиль БД (DB_ENGINE) и фактические настройки соединения."
+
+    def handle(self, *args, **opts):
+        db = settings.DATABASES["default"]
+        self.stdout.write(f"Профиль:      {settings.DB_ENGINE}")
+        self.stdout.write(f"Движок:       {db['ENGINE']}")
+        self.stdout.write(f"База:         {db['NAME']}")
+        self.stdout.write(f"CONN_MAX_AGE: {db.get('CONN_MAX_AGE', 0)}")
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                    cursor.execute(f"PRAGMA {pragma}")
+                    self.stdout.write(f"{pragma + ':':<14}{cursor.fetchone()[0]}")
+                cursor.execute("PRAGMA journal_mode")
+                if str(cursor.fetchone()[0]).lower() != "wal":
+                    self.stdout.write(self.style.WARNING("WAL не включён — возможны блокировки при конкурентной записи."))
+            elif connection.vendor == "postgresql":
+                for param in ("server_version", "max_connections", "default_transaction_isolation"):
+                    cursor.execute(f"SHOW {param}")
+                    self.stdout.write(f"{param + ':':<14}{cursor.fetchone()[0]}")
+                if db.get("CONN_MAX_AGE"):
+                    self.stdout.write(self.style.WARNING(
+                        "CONN_MAX_AGE>0 под ASGI — соединения копятся по потокам; держите 0 и pgbouncer."
+                    ))
+                elif not db.get("DISABLE_SERVER_SIDE_CURSORS"):
+                    self.stdout.write("CONN_MAX_AGE=0 без pgbouncer — новое соединение на каждый запрос.")
+
+        self.stdout.write(self.style.SUCCESS(f"Соединение OK ({connection.vendor})."))
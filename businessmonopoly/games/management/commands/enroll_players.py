@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from games import events
+from games.enrollment import enroll_players
+from games.lobby import invalidate_game_list
+from games.models import Game
+from games.realtime import send_game_update
+
+
+class Command(BaseCommand):
+    help = "Массово записать игроков в игру (или сначала создать игру под турнир)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("game_id", nargs="?", help="игра; не нужен вместе с --create-game")
+        parser.add_argument("--usernames", nargs="*", default=[], help="логины игроков")
+        parser.add_argument("--file", help="файл с логинами, по одному в строке")
+        parser.add_argument("--create-game", metavar="NAME", help="создать новую игру с таким названием")
+        parser.add_argument("--creator", help="логин создателя новой игры")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+
+        usernames = list(opts["usernames"])
+        if opts["file"]:
+            with open(opts["file"], encoding="utf-8") as fh:
+                usernames += [line.strip() for line in fh if line.strip()]
+        usernames = list(dict.fromkeys(usernames))
+
+        if opts["create_game"]:
+            if not opts["creator"]:
+                raise CommandError("Для --create-game нужен --creator")
+            creator = User.objects.filter(username=opts["creator"]).first()
+            if creator is None:
+                raise CommandError(f"Пользователь {opts['creator']} не найден")
+            game = Game.objects.create(name=opts["create_game"], creator=creator, is_active=True)
+            events.record(game.id, "created", bank=game.bank_balance, state=game.state_balance)
+            invalidate_game_list()
+            self.stdout.write(f"Создана игра {game.id}")
+        elif opts["game_id"]:
+            game = Game.objects.filter(id=opts["game_id"], deleted_at__isnull=True).first()
+            if game is None:
+                raise CommandError(f"Игра {opts['game_id']} не найдена")
+        else:
+            raise CommandError("Укажите game_id или --create-game")
+
+        users = list(User.objects.filter(username__in=usernames))
+        missing = sorted(set(usernames) - {u.username for u in users})
+        if missing:
+            self.stdout.write(self.style.WARNING("Не найдены: " + ", ".join(missing)))
+
+        created, reactivated = enroll_players(game, users)
+        if created or reactivated:
+            try:
+                send_game_update(game.id)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Снапшот не разослан: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Записано новых: {len(created)}, вернулось: {reactivated}"
+        ))
@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from games.lobby import invalidate_game_list
+from games.models import Game
+from games.savefile import dump_game, load_game, SaveFileError
+
+
+class Command(BaseCommand):
+    help = "Сохранить игру в бинарный файл или восстановить игру из него."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        export = sub.add_parser("export", help="сохранить игру в файл")
+        export.add_argument("game_id")
+        export.add_argument("path")
+
+        restore = sub.add_parser("import", help="восстановить игру из файла как новую")
+        restore.add_argument("path")
+        restore.add_argument("--creator", help="логин нового создателя (по умолчанию — из файла)")
+        restore.add_argument("--create-users", action="store_true",
+                             help="создать недостающих пользователей (без пароля)")
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        if opts["action"] == "export":
+            game = Game.objects.filter(id=opts["game_id"], deleted_at__isnull=True).first()
+            if game is None:
+                raise CommandError(f"Игра {opts['game_id']} не найдена")
+            with open(opts["path"], "wb") as fh:
+                size = dump_game(game, fh)
+            self.stdout.write(self.style.SUCCESS(
+                f"Сохранено {size} байт за {time.perf_counter() - start:.3f} с"
+            ))
+            return
+
+        creator = None
+        if opts["creator"]:
+            creator = get_user_model().objects.filter(username=opts["creator"]).first()
+            if creator is None:
+                raise CommandError(f"Пользователь {opts['creator']} не найден")
+        try:
+            with open(opts["path"], "rb") as fh:
+                game = load_game(fh, creator=creator, create_users=opts["create_users"])
+        except SaveFileError as e:
+            raise CommandError(str(e))
+        invalidate_game_list()
+        self.stdout.write(self.style.SUCCESS(
+            f"Восстановлена игра {game.id} за {time.perf_counter() - start:.3f} с"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from games.models import QuestionPack
+from games.questions import import_pack
+
+
+class Command(BaseCommand):
+    help = "Импорт вопросов из JSON-файла (массив вопросов) в пакет QuestionPack."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON-файл с массивом вопросов")
+        parser.add_argument("--pack", required=True, help="slug пакета (создаётся, если нет)")
+        parser.add_argument("--name", help="название пакета (по умолчанию = slug)")
+        parser.add_argument("--locale", default="ru")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--replace", action="store_true", help="удалить старые вопросы пакета перед импортом")
+
+    def handle(self, *args, **opts):
+        if opts["chunk_size"] <= 0:
+            raise CommandError("--chunk-size должен быть положительным")
+
+        pack, created = QuestionPack.objects.get_or_create(
+            slug=opts["pack"],
+            defaults={"name": opts["name"] or opts["pack"], "locale": opts["locale"]},
+        )
+        if not created and opts["name"] and pack.name != opts["name"]:
+            pack.name = opts["name"]
+            pack.save(update_fields=["name"])
+
+        try:
+            with open(opts["path"], encoding="utf-8") as fp:
+                total = import_pack(fp, pack, chunk_size=opts["chunk_size"], replace=opts["replace"])
+        except FileNotFoundError:
+            raise CommandError(f"Файл не найден: {opts['path']}")
+        except ValueError as e:
+            raise CommandError(f"Ошибка разбора JSON: {e}")
+
+        pack.refresh_from_db(fields=["version"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Пакет «{pack.name}»: импортировано {total} вопросов, версия {pack.version}."
+        ))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from games.profiling import PROFILE_HEADER, make_profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Выпустить подписанный токен для профилирования запросов (заголовок X-Profile). "
+        "Токен подписан SECRET_KEY — он должен быть задан в окружении или .env и совпадать с сервером."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--label", default="manual", help="метка (кто/зачем профилирует)")
+
+    def handle(self, *args, **opts):
+        if not settings.SECRET_KEY_FROM_ENV:
+            raise CommandError(
+                "SECRET_KEY не задан в окружении: ключ случайный для каждого процесса, "
+                "и сервер не примет такой токен. Задайте SECRET_KEY (как у сервера) и повторите."
+            )
+        self.stdout.write(f"{PROFILE_HEADER}: {make_profile_token(opts['label'])}")
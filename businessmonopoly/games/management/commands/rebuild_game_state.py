@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from games.events import live_state, rebuild, take_snapshot
+from games.models import Game
+
+
+class Command(BaseCommand):
+    help = "Собрать состояние игры из журнала событий (снапшот + события после него)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("game_id")
+        parser.add_argument("--upto", type=int, default=None, help="id последнего учитываемого события")
+        parser.add_argument("--snapshot", action="store_true", help="сохранить снапшот по текущему журналу")
+        parser.add_argument("--compare", action="store_true", help="сравнить с живыми таблицами")
+
+    def handle(self, *args, **opts):
+        game_id = opts["game_id"]
+        if not Game.objects.filter(id=game_id).exists():
+            raise CommandError(f"Игра {game_id} не найдена")
+
+        if opts["snapshot"]:
+            snapshot = take_snapshot(game_id)
+            self.stdout.write(f"Снапшот: {snapshot or 'новых событий нет'}")
+
+        state, last_id = rebuild(game_id, upto=opts["upto"])
+        self.stdout.write(f"Событий применено до #{last_id}")
+        self.stdout.write(json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True))
+
+        if opts["compare"]:
+            live = live_state(game_id)
+            diffs = []
+            for key in ("bank", "state", "paused", "voting", "votes"):
+                if state.get(key) != live[key]:
+                    diffs.append(f"{key}: журнал={state.get(key)!r} таблицы={live[key]!r}")
+            for pid in sorted(set(state["players"]) | set(live["players"]), key=int):
+                a, b = state["players"].get(pid), live["players"].get(pid)
+                if a != b:
+                    diffs.append(f"player {pid}: журнал={a!r} таблицы={b!r}")
+            if diffs:
+                self.stdout.write(self.style.WARNING("Расхождения:\n" + "\n".join(diffs)))
+            else:
+                self.stdout.write(self.style.SUCCESS("Совпадает с живыми таблицами."))
@@ -0,0 +1,279 @@
+import heapq
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from games import upgrades, ws_commands
+from games.enrollment import enroll_players
+from games.instrumentation import Histogram, MS_BUCKETS
+from games.models import (
+    Game, GamePlayer, GameEvent, VoteSession, VoteBallot, AskedQuestion, PendingAnswer,
+)
+from games.questions import get_game_catalog
+
+DEFAULT_WEIGHTS = "transfer=5,upgrade_role=1,vote=3,answer=3,ask=1,choose_banker=1"
+ERROR_SAMPLES = 5
+
+
+class Stats:
+    """Задержки и исходы действий ботов (общие для всех потоков)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.actions = {}
+        self.late = 0  # тики, пропущенные из-за того, что все слоты заняты
+
+    def record(self, action: str, outcome: str, ms: float, error: str | None = None):
+        with self.lock:
+            s = self.actions.get(action)
+            if s is None:
+                s = self.actions[action] = {
+                    "hist": Histogram(MS_BUCKETS), "max": 0.0, "errors": Counter(),
+                    "ok": 0, "rejected": 0, "failed": 0,
+                }
+            s[outcome] += 1
+            s["hist"].observe(ms)
+            s["max"] = max(s["max"], ms)
+            if error and (error in s["errors"] or len(s["errors"]) < ERROR_SAMPLES):
+                s["errors"][error] += 1
+
+    def skip(self):
+        with self.lock:
+            self.late += 1
+
+    def total(self) -> int:
+        with self.lock:
+            return sum(s["hist"].count for s in self.actions.values())
+
+
+def _quantile(hist: Histogram, q: float) -> str:
+    """Верхняя граница бакета, в который попадает квантиль q."""
+    target = q * hist.count
+    seen = 0
+    for bound, count in zip([*hist.bounds, None], hist.counts):
+        seen += count
+        if seen >= target:
+            return f"{bound}ms" if bound is not None else f">{hist.bounds[-1]}ms"
+    return "-"
+
+
+def _parse_weights(raw: str) -> dict:
+    weights = {}
+    for part in raw.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in ws_commands.ACTIONS:
+            raise CommandError(f"Неизвестное действие: {name}")
+        weights[name] = float(value or 1)
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочные боты: входят в игру и с заданной частотой голосуют, переводят деньги, "
+        "отвечают на вопросы и улучшают роли теми же командами, что игроки шлют по сокету. "
+        "Печатает задержки, ошибки и рост таблиц игры."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("game_id")
+        parser.add_argument("--bots", type=int, default=10, help="сколько ботов")
+        parser.add_argument("--rate", type=float, default=0.2, help="действий в секунду на бота")
+        parser.add_argument("--duration", type=float, default=600, help="секунд работы; 0 — до Ctrl+C")
+        parser.add_argument("--report-every", type=float, default=60, help="период отчёта, сек")
+        parser.add_argument("--workers", type=int, default=8, help="параллельных потоков")
+        parser.add_argument("--max-inflight", type=int, default=None,
+                            help="действий в работе одновременно (по умолчанию = --workers); "
+                                 "тик сверх лимита пропускается и считается как late")
+        parser.add_argument("--prefix", default="soakbot", help="префикс логинов ботов")
+        parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="веса действий: имя=вес,...")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        if opts["bots"] <= 0 or opts["rate"] <= 0:
+            raise CommandError("--bots и --rate должны быть положительными")
+        if opts["max_inflight"] is not None and opts["max_inflight"] <= 0:
+            raise CommandError("--max-inflight должен быть положительным")
+        self.game_id = opts["game_id"]
+        if not Game.objects.filter(id=self.game_id, deleted_at__isnull=True).exists():
+            raise CommandError(f"Игра {self.game_id} не найдена")
+        self.weights = _parse_weights(opts["weights"])
+        self.rng = random.Random(opts["seed"])
+        self.stats = Stats()
+
+        bots = self.create_bots(opts["prefix"], opts["bots"])
+        self.join(bots)
+        self.stdout.write(f"Ботов в игре: {len(bots)}")
+
+        baseline = self.table_sizes()
+        started = time.monotonic()
+        deadline = started + opts["duration"] if opts["duration"] else None
+        next_report = started + opts["report_every"]
+        queue = [(started + self.rng.expovariate(opts["rate"]), i) for i in range(len(bots))]
+        heapq.heapify(queue)
+
+        pool = ThreadPoolExecutor(max_workers=opts["workers"], thread_name_prefix="soak")
+        # очередь пула не растёт: боты не успевают — тики пропускаются, а не копятся
+        slots = threading.BoundedSemaphore(opts["max_inflight"] or opts["workers"])
+        interrupted = False
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                due, i = heapq.heappop(queue)
+                now = time.monotonic()
+                if due > now:
+                    time.sleep(min(due - now, max(next_report - now, 0)))
+                if time.monotonic() >= next_report:
+                    self.report(started, baseline)
+                    next_report += opts["report_every"]
+                if time.monotonic() < due:
+                    heapq.heappush(queue, (due, i))
+                    continue
+                if slots.acquire(blocking=False):
+                    pool.submit(self.act, bots[i], due).add_done_callback(lambda _: slots.release())
+                else:
+                    self.stats.skip()
+                heapq.heappush(queue, (due + self.rng.expovariate(opts["rate"]), i))
+        except KeyboardInterrupt:
+            interrupted = True
+            self.stdout.write("Остановка…")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=interrupted)
+            close_old_connections()
+        self.report(started, baseline, final=True)
+
+    # --- боты ---
+
+    def create_bots(self, prefix: str, count: int) -> list:
+        User = get_user_model()
+        names = [f"{prefix}{n}" for n in range(count)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        new = []
+        for name in names:
+            if name not in existing:
+                user = User(username=name)
+                user.set_unusable_password()
+                new.append(user)
+        User.objects.bulk_create(new)
+        return list(User.objects.filter(username__in=names).order_by("username"))
+
+    def join(self, users):
+        """Записать ботов в игру одной пачкой (как «Записать игроков»); время — в статистику."""
+        game = Game.objects.get(id=self.game_id)
+        start = time.perf_counter()
+        enroll_players(game, users)
+        self.stats.record("join", "ok", (time.perf_counter() - start) * 1000)
+
+    def act(self, user, due: float):
+        """Выполнить действие бота; задержка — от запланированного момента due (time.monotonic)."""
+        try:
+            plan = self.plan(user)
+            if plan is None:
+                return
+            action, payload = plan
+            try:
+                status, data = async_to_sync(ws_commands.dispatch)(user, self.game_id, action, payload)
+            except ws_commands.CommandError as e:
+                outcome = "failed" if e.status >= 500 else "rejected"
+                self.stats.record(action, outcome, (time.monotonic() - due) * 1000, str(e)[:120])
+            except Exception as e:
+                self.stats.record(action, "failed", (time.monotonic() - due) * 1000,
+                                  f"{type(e).__name__}: {e}"[:120])
+            else:
+                # часть действий отвечает на отказ 204 без тела (upgrade_role), успех — {"status": "ok"}
+                ms = (time.monotonic() - due) * 1000
+                if status == 204 or (data or {}).get("status") != "ok":
+                    self.stats.record(action, "rejected", ms, f"HTTP {status} без status=ok")
+                else:
+                    self.stats.record(action, "ok", ms)
+        finally:
+            close_old_connections()
+
+    def plan(self, user) -> tuple[str, dict] | None:
+        """Выбрать действие по весам среди возможных сейчас; None — делать нечего."""
+        me = (GamePlayer.objects.filter(game_id=self.game_id, user=user, is_active=True)
+              .select_related("game").first())
+        if me is None or me.is_observer:
+            return None
+        game = me.game
+        others = list(GamePlayer.objects
+                      .filter(game_id=self.game_id, is_active=True, is_observer=False)
+                      .exclude(pk=me.pk).values_list("id", "special_role"))
+
+        options = {}
+        if others and me.money > 0:
+            options["transfer"] = lambda: {
+                "receiver": f"p{self.rng.choice(others)[0]}",
+                "amount": self.rng.randint(1, min(me.money, 50)),
+            }
+        price = game.upgrade_price(me.role) if me.special_role == 0 and me.role < upgrades.MAX_ROLE else None
+        if price:
+            affordable = [pay for pay in upgrades.PAY_METHODS if getattr(me, pay) >= price[pay]]
+            if affordable:
+                options["upgrade_role"] = lambda: {"pay": self.rng.choice(affordable)}
+        if game.is_voting and others and not VoteBallot.objects.filter(
+                session__game_id=self.game_id, session__is_active=True, voter=user).exists():
+            options["vote"] = lambda: {"candidate_id": self.rng.choice(others)[0]}
+        asked = (AskedQuestion.objects
+                 .filter(game_id=self.game_id, target=me, answered=False, expired=False)
+                 .values_list("question_id", "token").first())
+        if asked:
+            options["answer"] = lambda: self.answer_payload(game, *asked)
+        if me.special_role == 2 and others:
+            options["ask"] = lambda: {"target_player_id": self.rng.choice(others)[0]}
+            if not any(special == 1 for _, special in others):
+                options["choose_banker"] = lambda: {"banker_id": self.rng.choice(others)[0]}
+
+        options = {name: build for name, build in options.items() if self.weights.get(name)}
+        if not options:
+            return None
+        names = list(options)
+        action = self.rng.choices(names, weights=[self.weights[n] for n in names])[0]
+        return action, options[action]()
+
+    def answer_payload(self, game, question_id, token) -> dict:
+        payload = {"question_id": question_id, "ask_token": str(token)}
+        q = get_game_catalog(game).get(question_id)
+        if q and q["choices"]:
+            payload["choice_index"] = self.rng.randrange(len(q["choices"]))
+        else:
+            payload["answer_text"] = "ответ бота"
+        return payload
+
+    # --- отчёт ---
+
+    def table_sizes(self) -> dict:
+        return {
+            "events": GameEvent.objects.filter(game_id=self.game_id).count(),
+            "sessions": VoteSession.objects.filter(game_id=self.game_id).count(),
+            "ballots": VoteBallot.objects.filter(session__game_id=self.game_id).count(),
+            "asked": AskedQuestion.objects.filter(game_id=self.game_id).count(),
+            "pending": PendingAnswer.objects.filter(game_id=self.game_id).count(),
+        }
+
+    def report(self, started: float, baseline: dict, final: bool = False):
+        elapsed = time.monotonic() - started
+        total = self.stats.total()
+        title = "Итог" if final else "Отчёт"
+        self.stdout.write(f"--- {title}: {elapsed:.0f} с, действий {total} ({total / max(elapsed, 1e-9):.1f}/с), "
+                          f"пропущено тиков (late) {self.stats.late}")
+        with self.stats.lock:
+            for name, s in sorted(self.stats.actions.items()):
+                h = s["hist"]
+                self.stdout.write(
+                    f"{name:<14} ok={s['ok']:<6} отказ={s['rejected']:<5} ошибок={s['failed']:<5} "
+                    f"p50≤{_quantile(h, 0.5)} p95≤{_quantile(h, 0.95)} max={s['max']:.0f}ms"
+                )
+                for error, count in s["errors"].most_common(ERROR_SAMPLES):
+                    line = f"    {count}× {error}"
+                    self.stdout.write(self.style.WARNING(line) if s["failed"] else line)
+        sizes = self.table_sizes()
+        self.stdout.write("Рост таблиц игры: " + ", ".join(
+            f"{k} +{sizes[k] - baseline[k]}" for k in sizes
+        ))
@@ -0,0 +1,187 @@
+# games/metrics.py
+# Метрики в формате Prometheus без внешних сервисов, кроме уже используемого Redis.
+# ASGI, WSGI и Celery копят приращения у себя, а фоновый поток процесса раз в
+# METRICS_FLUSH_INTERVAL сбрасывает их в общий хэш Redis — запросы в Redis не ходят.
+# /metrics читает хэш целиком. Поле gauge, дошедшее до нуля, удаляется из хэша —
+# у bm_ws_connections{game=...} в выдаче остаются только игры с открытыми сокетами.
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "bm_ws_connections": ("gauge", "Открытые WebSocket-соединения по играм"),
+    "bm_group_send_seconds": ("histogram", "Длительность group_send в channel layer"),
+    "bm_snapshot_build_seconds": ("histogram", "Время сборки снапшота игры (get_game_update_data)"),
+    "bm_election_tick_seconds": ("histogram", "Длительность тика check_and_finish_elections"),
+    "bm_election_lag_seconds": ("histogram", "Опоздание старта/завершения выборов относительно срока"),
+    "bm_celery_task_seconds": ("histogram", "Длительность Celery-тасок"),
+    "bm_transfers_total": ("counter", "Выполненные переводы денег"),
+    "bm_votes_total": ("counter", "Поданные голоса"),
+}
+
+_lock = threading.Lock()
+_pending: dict[str, float] = {}
+_backoff_until = 0.0
+_failing = False
+_flusher_pid = None
+_redis = None
+_incr_gauge = None
+
+# HINCRBYFLOAT, а на нуле — HDEL, атомарно: между ними другой процесс не вклинится
+INCR_GAUGE_LUA = """
+local value = redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1], ARGV[2])
+if tonumber(value) == 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return value
+"""
+
+# если Redis недоступен — пробуем не чаще раза в FAILURE_BACKOFF, копя приращения у себя
+FAILURE_BACKOFF = 30.0
+
+
+def _client():
+    global _redis, _incr_gauge
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(
+            settings.METRICS_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        _incr_gauge = _redis.register_script(INCR_GAUGE_LUA)
+    return _redis
+
+
+def _is_gauge(field: str) -> bool:
+    return METRICS.get(field.partition("{")[0], ("",))[0] == "gauge"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def _ensure_flusher():
+    # поток заводится в каждом процессе отдельно: после fork (воркеры Celery) его нет
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _add(field: str, value: float):
+    _ensure_flusher()
+    with _lock:
+        _pending[field] = _pending.get(field, 0.0) + value
+
+
+def flush():
+    """Сбросить накопленные приращения процесса в Redis (одним pipeline)."""
+    global _pending, _backoff_until, _failing
+    with _lock:
+        if time.monotonic() < _backoff_until:
+            return
+        batch, _pending = _pending, {}
+    if not batch:
+        return
+    try:
+        # MULTI/EXEC: пачка применяется целиком или никак — возврат в буфер не задвоит её часть
+        pipe = _client().pipeline(transaction=True)
+        for field, value in batch.items():
+            if _is_gauge(field):
+                _incr_gauge(keys=[settings.METRICS_REDIS_KEY], args=[field, value], client=pipe)
+            else:
+                pipe.hincrbyfloat(settings.METRICS_REDIS_KEY, field, value)
+        pipe.execute()
+    except Exception as e:
+        # метрики не должны ломать игру: пачку возвращаем в буфер (иначе gauge навсегда
+        # разойдётся с числом сокетов), пишем в лог один раз на весь сбой
+        with _lock:
+            for field, value in batch.items():
+                _pending[field] = _pending.get(field, 0.0) + value
+            _backoff_until = time.monotonic() + FAILURE_BACKOFF
+        if not _failing:
+            _failing = True
+            logger.warning("[METRICS] Redis недоступен, приращения копятся в процессе: %s", e)
+        return
+    if _failing:
+        _failing = False
+        logger.info("[METRICS] Redis снова доступен, отложенные приращения записаны")
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Счётчик или gauge (для gauge — приращение, можно отрицательное)."""
+    _add(name + _labels(labels), value)
+
+
+def observe(name: str, value: float, **labels):
+    """Наблюдение в гистограмму (бакеты SECONDS_BUCKETS, кумулятивно)."""
+    for bound in SECONDS_BUCKETS:
+        if value <= bound:
+            _add(name + "_bucket" + _labels({**labels, "le": bound}), 1)
+    _add(name + "_bucket" + _labels({**labels, "le": "+Inf"}), 1)
+    _add(name + "_sum" + _labels(labels), value)
+    _add(name + "_count" + _labels(labels), 1)
+
+
+@contextmanager
+def timed(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+_LE_RE = re.compile(r',?le="([^"]+)"')
+
+
+def _sort_key(field: str):
+    m = _LE_RE.search(field)
+    if not m:
+        return field, 0.0
+    le = float("inf") if m.group(1) == "+Inf" else float(m.group(1))
+    return _LE_RE.sub("", field), le
+
+
+def render() -> str:
+    """Текст в формате Prometheus exposition (text/plain; version=0.0.4)."""
+    flush()
+    raw = _client().hgetall(settings.METRICS_REDIS_KEY)
+    samples = {k.decode(): float(v) for k, v in raw.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        fields = [f for f in samples if re.match(rf"{name}(_bucket|_sum|_count)?(\{{|$)", f)]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for field in sorted(fields, key=_sort_key):
+            value = samples[field]
+            if kind == "gauge" and not value:
+                continue  # поле успело обнулиться до HDEL (или записано до него)
+            lines.append(f"{field} {int(value) if value.is_integer() else value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_pendinganswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionPack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=64, unique=True)),
+                ('locale', models.CharField(default='ru', max_length=8)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='bank_balance',
+            field=models.IntegerField(default=10000),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='state_balance',
+            field=models.IntegerField(default=1000),
+        ),
+        migrations.AlterField(
+            model_name='gameplayer',
+            name='money',
+            field=models.IntegerField(default=300),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='question_pack',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='games', to='games.questionpack'),
+        ),
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('text', models.TextField()),
+                ('choices', models.JSONField(blank=True, default=list)),
+                ('correct', models.JSONField(blank=True, null=True)),
+                ('reward_money', models.IntegerField(default=0)),
+                ('reward_influence', models.IntegerField(default=0)),
+                ('pack', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='games.questionpack')),
+            ],
+            options={
+                'unique_together': {('pack', 'number')},
+            },
+        ),
+    ]
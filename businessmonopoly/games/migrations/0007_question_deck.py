@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0006_question_packs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionDeck',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='question_deck', serialize=False, to='games.game')),
+                ('source', models.CharField(blank=True, max_length=32)),
+                ('order', models.BinaryField(default=bytes)),
+                ('cursor', models.PositiveIntegerField(default=0)),
+                ('shuffled_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0007_question_deck'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='askedquestion',
+            name='expired',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='pendinganswer',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает решения'), ('approved', 'Одобрен'), ('rejected', 'Отклонён'), ('expired', 'Истёк')], default='pending', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='askedquestion',
+            index=models.Index(fields=['answered', 'created_at'], name='games_asked_answere_5f1bbb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendinganswer',
+            index=models.Index(fields=['status', 'created_at'], name='games_pendi_status_d1752e_idx'),
+        ),
+    ]
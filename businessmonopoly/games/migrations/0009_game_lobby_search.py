@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_name_key(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    games = list(Game.objects.only('id', 'name'))
+    for g in games:
+        g.name_key = (g.name or '').casefold()[:100]
+    Game.objects.bulk_update(games, ['name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0008_question_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_name_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_active', 'created_at'], name='games_game_is_acti_e29242_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['name_key'], name='game_name_key_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
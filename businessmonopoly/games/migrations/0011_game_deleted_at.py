@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0010_game_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
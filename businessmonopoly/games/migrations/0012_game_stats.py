@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0011_game_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameStats',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='games.game')),
+                ('name', models.CharField(max_length=100)),
+                ('players', models.IntegerField(default=0)),
+                ('total_money', models.BigIntegerField(default=0)),
+                ('total_influence', models.BigIntegerField(default=0)),
+                ('bank_balance', models.BigIntegerField(default=0)),
+                ('state_balance', models.BigIntegerField(default=0)),
+                ('roles', models.JSONField(default=dict)),
+                ('elections', models.IntegerField(default=0)),
+                ('top_players', models.JSONField(default=list)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0012_game_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gameplayer',
+            index=models.Index(fields=['game', 'money'], name='gameplayer_game_money_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gameplayer',
+            index=models.Index(fields=['game', 'influence'], name='gameplayer_game_infl_idx'),
+        ),
+    ]
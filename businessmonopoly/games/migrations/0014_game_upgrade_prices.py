@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:34
+
+import games.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0013_gameplayer_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='upgrade_prices',
+            field=models.JSONField(default=games.models.default_upgrade_prices),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:40
+
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def close_answered(apps, schema_editor):
+    # карточки ручных вопросов, на которые уже есть ответ на ревью, раньше оставались открытыми
+    AskedQuestion = apps.get_model('games', 'AskedQuestion')
+    PendingAnswer = apps.get_model('games', 'PendingAnswer')
+    answers = PendingAnswer.objects.filter(
+        game_id=OuterRef('game_id'),
+        player_id=OuterRef('target_id'),
+        question_id=OuterRef('question_id'),
+        created_at__gte=OuterRef('created_at'),
+    )
+    AskedQuestion.objects.filter(answered=False).filter(Exists(answers)).update(answered=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0014_game_upgrade_prices'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_answered, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0015_close_manually_answered_questions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngineLease',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='engine_lease', serialize=False, to='games.game')),
+                ('owner', models.CharField(blank=True, max_length=100)),
+                ('expires_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:25
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_extra_baselines(apps, schema_editor):
+    # гонка первого события могла записать игре несколько baseline; replay и так
+    # начинает с последнего из них — остальные удаляем
+    GameEvent = apps.get_model('games', 'GameEvent')
+    latest = (GameEvent.objects.filter(kind='baseline').values('game_id')
+              .annotate(last=Max('id')).values_list('last', flat=True))
+    GameEvent.objects.filter(kind='baseline').exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0016_engine_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_extra_baselines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='gameevent',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'baseline')), fields=('game',), name='gameevent_one_baseline'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+import random
+import struct
 from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
@@ -7,17 +9,34 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinValueValidator
 
+from . import events, state_cache
+
 import logging
 logger = logging.getLogger(__name__)
 
+# Цены улучшения роли: {"<текущая роль>": {"money": ..., "influence": ...}}, платится одно из двух
+DEFAULT_UPGRADE_PRICES = {
+    "1": {"money": 500, "influence": 3},   # Безработный -> Работник
+    "2": {"money": 1000, "influence": 6},  # Работник -> Предприниматель
+}
+
+
+def default_upgrade_prices():
+    return {role: dict(price) for role, price in DEFAULT_UPGRADE_PRICES.items()}
+
+
 class Game(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
+    # name.casefold() — для поиска по префиксу в лобби (индекс, без учёта регистра и для кириллицы)
+    name_key = models.CharField(max_length=100, default='', editable=False)
     start_time = models.DateTimeField(default=timezone.now)
     creator = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='created_games', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=False)
     is_voting = models.BooleanField(default=False)
+    # игра удалена: скрыта отовсюду, строки удаляет games.tasks.purge_deleted_game
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     # Настройки игры
     entrepreneur_chance = models.FloatField(default=0.3)
@@ -29,14 +48,44 @@ class Game(models.Model):
     voting_total_paused_seconds = models.IntegerField(default=0)
     state_balance = models.IntegerField(default=1000)
     bank_balance = models.IntegerField(default=10000)
+    question_pack = models.ForeignKey(
+        'QuestionPack', null=True, blank=True, on_delete=models.SET_NULL, related_name='games'
+    )
+    upgrade_prices = models.JSONField(default=default_upgrade_prices)
 
     # Пауза
     paused_at = models.DateTimeField(null=True, blank=True)
     total_paused_seconds = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'created_at']),
+            # varchar_pattern_ops — чтобы LIKE 'abc%' шёл по индексу в PostgreSQL; на SQLite игнорируется
+            models.Index(fields=['name_key'], name='game_name_key_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_key = (self.name or '').casefold()[:100]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
     def is_paused(self):
         return self.paused_at is not None
 
+    def upgrade_price(self, role: int) -> dict | None:
+        """Цена улучшения с роли role ({"money", "influence"}) или None, если улучшать некуда."""
+        return (self.upgrade_prices or {}).get(str(role))
+
+    def mark_deleted(self):
+        """Пометить игру удалённой (мгновенно); сами строки удалит фоновая таска."""
+        self.is_active = False
+        self.is_voting = False
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['is_active', 'is_voting', 'deleted_at'])
+        state_cache.bump(self.id)
+
     def pause(self):
         if not self.is_paused():
             self.paused_at = timezone.now()
@@ -44,6 +93,9 @@ class Game(models.Model):
             if self.is_voting and not self.voting_paused_at:
                 self.voting_paused_at = self.paused_at
             self.save(update_fields=['paused_at', 'voting_paused_at'])
+            events.record(self.id, "paused")
+            state_cache.bump(self.id)
+            self.publish_timer()
 
     def resume(self):
         if self.is_paused():
@@ -55,6 +107,9 @@ class Game(models.Model):
             self.total_paused_seconds += int(delta.total_seconds())
             self.paused_at = None
             self.save(update_fields=['paused_at', 'total_paused_seconds', 'voting_paused_at', 'voting_total_paused_seconds'])
+            events.record(self.id, "resumed")
+            state_cache.bump(self.id)
+            self.publish_timer()
 
     def start_election(self):
         if self.is_voting:
@@ -64,6 +119,8 @@ class Game(models.Model):
         self.voting_paused_at = None
         self.voting_total_paused_seconds = 0
         self.save(update_fields=["is_voting", "voting_started_at", "voting_paused_at", "voting_total_paused_seconds"])
+        events.record(self.id, "election_started")
+        self.publish_timer()
         from .votes import VoteService
         VoteService.start_election_for_game(self, started_at=self.voting_started_at)
         logger.info("[ELECTION] START game=%s at=%s", self.id, self.voting_started_at)
@@ -92,6 +149,8 @@ class Game(models.Model):
             self.voting_total_paused_seconds = 0
             self.save(
                 update_fields=["is_voting", "last_election_time", "voting_paused_at", "voting_total_paused_seconds"])
+            events.record(self.id, "election_finished")
+            self.publish_timer()
 
             broadcast_personal_to_game(
                 self.id,
@@ -124,6 +183,8 @@ class Game(models.Model):
         self.voting_paused_at = None
         self.voting_total_paused_seconds = 0
         self.save(update_fields=["is_voting", "last_election_time", "voting_paused_at", "voting_total_paused_seconds"])
+        events.record(self.id, "election_finished")
+        self.publish_timer()
 
         # === КРИТИЧЕСКОЕ: проверка «все ли проголосовали» ДО назначения победителя ===
         expected = GamePlayer.objects.filter(game=self, is_active=True, is_observer=False).count()
@@ -166,6 +227,8 @@ class Game(models.Model):
             if winner_gp.special_role != 2:
                 winner_gp.special_role = 2
                 winner_gp.save(update_fields=["special_role"])
+            events.record(self.id, "special", p=winner_gp.id, s=2)
+            state_cache.bump(self.id)
 
             broadcast_personal_to_game(
                 self.id,
@@ -211,6 +274,8 @@ class Game(models.Model):
         # назначить нового
         banker_gp.special_role = 1  # 1 = Банкир
         banker_gp.save(update_fields=["special_role"])
+        events.record(self.id, "special", p=banker_gp.id, s=1)
+        state_cache.bump(self.id)
 
         # оповещения/обновление UI
         try:
@@ -228,10 +293,10 @@ class Game(models.Model):
 
     def is_politician(self, user) -> bool:
         """Пользователь — текущий Политик этой игры? (special_role=2)"""
-        from .models import GamePlayer
         if not user or not user.is_authenticated:
             return False
-        return GamePlayer.objects.filter(game=self, user=user, special_role=2).exists()
+        politician = state_cache.officials(self.id)["politician"]
+        return politician is not None and politician["user_id"] == user.id
 
     def start_banker_selection(self, politician_gp):
         """
@@ -278,6 +343,34 @@ class Game(models.Model):
     def election_remaining_seconds(self) -> int:
         return max(int(self.election_duration.total_seconds()) - self.election_elapsed_seconds(), 0)
 
+    def timer_state(self) -> dict:
+        """
+        Таймеры игры абсолютными отметками (мс эпохи) — клиент считает время сам (static/js/timer.js):
+        прошло = (paused_at или сейчас) - game_anchor;
+        осталось до конца выборов = election_deadline - (election_paused_at или сейчас).
+        server_time — для поправки на часы клиента и порядка событий.
+        """
+        def ms(value):
+            return int(value.timestamp() * 1000) if value else None
+
+        deadline = None
+        if self.is_voting and self.voting_started_at:
+            deadline = ms(self.voting_started_at + self.election_duration
+                          + timedelta(seconds=self.voting_total_paused_seconds))
+        return {
+            "server_time": ms(timezone.now()),
+            "game_anchor": ms(self.start_time + timedelta(seconds=self.total_paused_seconds)),
+            "paused_at": ms(self.paused_at),
+            "election_deadline": deadline,
+            # выборы заморожены, только если пауза застала их идущими (как в election_elapsed_seconds)
+            "election_paused_at": ms(self.voting_paused_at) if deadline and self.paused_at else None,
+        }
+
+    def publish_timer(self):
+        """Разослать timer_state() всем в игре после коммита — отдельно от полного снапшота."""
+        from .realtime import send_timer_update
+        transaction.on_commit(lambda: send_timer_update(self.id, self.timer_state()))
+
     def elapsed_seconds(self):
         base = self.paused_at if self.is_paused() else timezone.now()
         elapsed = int((base - self.start_time).total_seconds()) - self.total_paused_seconds
@@ -308,8 +401,22 @@ class GamePlayer(models.Model):
     is_active = models.BooleanField(default=True)
     is_observer = models.BooleanField(default=False)
 
+    # поля, входящие в state_cache (состав игры, Политик/Банкир)
+    CACHED_FIELDS = frozenset({'role', 'special_role', 'is_active', 'is_observer'})
+
     class Meta:
         unique_together = ('game', 'user')
+        indexes = [
+            # рейтинг: топ и место игрока (games/leaderboard.py)
+            models.Index(fields=['game', 'money'], name='gameplayer_game_money_idx'),
+            models.Index(fields=['game', 'influence'], name='gameplayer_game_infl_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.CACHED_FIELDS.intersection(update_fields):
+            state_cache.bump(self.game_id)
 
     def __str__(self):
         return f"{self.user.username} in {self.game.name}"
@@ -356,6 +463,7 @@ class VoteSession(models.Model):
         self.is_active = False
         self.ends_at = timezone.now()
         self.save(update_fields=['is_active', 'ends_at'])
+        events.record(self.game_id, "session", id=self.id, a=False)
 
 
 class VoteOption(models.Model):
@@ -399,6 +507,7 @@ class AskedQuestion(models.Model):
     answered = models.BooleanField(default=False)
     answer_choice = models.IntegerField(null=True, blank=True)
     is_correct = models.BooleanField(null=True, blank=True)
+    expired = models.BooleanField(default=False)  # закрыт по TTL без ответа/решения
     token = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True)
 
     class Meta:
@@ -406,6 +515,7 @@ class AskedQuestion(models.Model):
             models.Index(fields=['game', 'answered']),
             models.Index(fields=['target', 'answered']),
             models.Index(fields=['asked_by', 'created_at']),
+            models.Index(fields=['answered', 'created_at']),
         ]
 
     def __str__(self):
@@ -417,6 +527,7 @@ class PendingAnswer(models.Model):
         ("pending", "Ожидает решения"),
         ("approved", "Одобрен"),
         ("rejected", "Отклонён"),
+        ("expired", "Истёк"),
     ]
     game = models.ForeignKey("games.Game", on_delete=models.CASCADE, related_name="pending_answers")
     player = models.ForeignKey("games.GamePlayer", on_delete=models.CASCADE, related_name="pending_answers")
@@ -432,7 +543,140 @@ class PendingAnswer(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["game", "status"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Q{self.question_id} by {self.player.user.username} [{self.status}]"
+
+
+class QuestionPack(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=64, unique=True)
+    locale = models.CharField(max_length=8, default="ru")
+    # растёт при каждом импорте — по ней процессы сбрасывают свой кэш пака
+    version = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.slug} v{self.version})"
+
+
+class Question(models.Model):
+    pack = models.ForeignKey(QuestionPack, on_delete=models.CASCADE, related_name="questions")
+    number = models.IntegerField()  # номер вопроса внутри пака (= question_id в AskedQuestion)
+    text = models.TextField()
+    choices = models.JSONField(default=list, blank=True)
+    correct = models.JSONField(null=True, blank=True)  # None — ручная проверка
+    reward_money = models.IntegerField(default=0)
+    reward_influence = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("pack", "number")
+
+    def __str__(self):
+        return f"Q#{self.number} [{self.pack.slug}]"
+
+
+class QuestionDeck(models.Model):
+    """Перетасованная колода вопросов игры: порядок (int32 little-endian подряд) + курсор."""
+    game = models.OneToOneField(Game, primary_key=True, on_delete=models.CASCADE, related_name="question_deck")
+    source = models.CharField(max_length=32, blank=True)  # откуда колода: "file:ru" / "pack:<id>"
+    order = models.BinaryField(default=bytes)
+    cursor = models.PositiveIntegerField(default=0)
+    shuffled_at = models.DateTimeField(default=timezone.now)
+
+    CARD = struct.Struct("<i")
+
+    @property
+    def size(self) -> int:
+        return len(self.order) // self.CARD.size
+
+    def card_at(self, index: int) -> int:
+        return self.CARD.unpack_from(self.order, index * self.CARD.size)[0]
+
+    def shuffle(self, ids, source: str):
+        ids = list(ids)
+        random.shuffle(ids)
+        self.order = struct.pack(f"<{len(ids)}i", *ids)
+        self.cursor = 0
+        self.source = source
+        self.shuffled_at = timezone.now()
+        self.save(update_fields=["order", "cursor", "source", "shuffled_at"])
+
+    def __str__(self):
+        return f"Deck {self.game_id} {self.cursor}/{self.size} [{self.source}]"
+
+
+class GameEvent(models.Model):
+    """
+    Журнал изменений игры (только добавление). Порядок — по id.
+    data — короткий JSON, формат по видам событий см. games/events.py.
+    """
+    id = models.BigAutoField(primary_key=True)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="events")
+    kind = models.CharField(max_length=32)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["game", "id"])]
+        constraints = [
+            # журнал игры начинается с одного baseline (games/events.py record_many)
+            models.UniqueConstraint(fields=["game"], condition=models.Q(kind="baseline"),
+                                    name="gameevent_one_baseline"),
         ]
 
     def __str__(self):
-        return f"Q{self.question_id} by {self.player.user.username} [{self.status}]"
\ No newline at end of file
+        return f"#{self.id} {self.kind} ({self.game_id})"
+
+
+class GameSnapshot(models.Model):
+    """Состояние игры, собранное из журнала до события last_event_id включительно."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="snapshots")
+    last_event_id = models.BigIntegerField()
+    state = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["game", "last_event_id"])]
+
+    def __str__(self):
+        return f"Snapshot {self.game_id} @{self.last_event_id}"
+
+
+class GameStats(models.Model):
+    """
+    Сводка по игре для общего дашборда (games/dashboard.py). Пересчитывается периодически
+    для игр, у которых журнал ушёл дальше last_event_id; дашборд читает только эту таблицу.
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    name = models.CharField(max_length=100)
+    players = models.IntegerField(default=0)
+    total_money = models.BigIntegerField(default=0)
+    total_influence = models.BigIntegerField(default=0)
+    bank_balance = models.BigIntegerField(default=0)
+    state_balance = models.BigIntegerField(default=0)
+    roles = models.JSONField(default=dict)        # {"<role id>": кол-во}
+    elections = models.IntegerField(default=0)
+    top_players = models.JSONField(default=list)  # [{"username", "money", "influence"}, ...] по убыванию денег
+    last_event_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Stats {self.name} @{self.last_event_id}"
+
+
+class EngineLease(models.Model):
+    """
+    Владелец движка игры в режиме GAME_ENGINE="memory" (games/engine.py): owner — канал
+    процесса в channel layer, держащего состояние игры в памяти, до expires_at.
+    Остальные процессы не поднимают свой движок, а пересылают команды владельцу.
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name="engine_lease")
+    owner = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Engine {self.game_id} → {self.owner or '-'} до {self.expires_at:%H:%M:%S}"
@@ -3,7 +3,10 @@ from dataclasses import dataclass
 from typing import Literal
 
 from django.db import transaction
-from models import Game, GamePlayer
+from django.db.models import F
+
+from . import events
+from .models import Game, GamePlayer
 
 AccountType = Literal["personal", "state", "bank"]
 
@@ -24,18 +27,40 @@ class AccountRef:
             return self.game.bank_balance
         raise ValueError("Unknown account kind")
 
-    def set_balance(self, value: int):
+    def _row(self):
         if self.kind == "personal":
-            self.player.money = value
-            self.player.save(update_fields=["money"])
-        elif self.kind == "state":
-            self.game.state_balance = value
-            self.game.save(update_fields=["state_balance"])
-        elif self.kind == "bank":
-            self.game.bank_balance = value
-            self.game.save(update_fields=["bank_balance"])
-        else:
-            raise ValueError("Unknown account kind")
+            return GamePlayer.objects.filter(pk=self.player.pk), "money"
+        if self.kind in ("state", "bank"):
+            return Game.objects.filter(pk=self.game.pk), f"{self.kind}_balance"
+        raise ValueError("Unknown account kind")
+
+    def _sync(self, field: str, delta: int):
+        obj = self.player if self.kind == "personal" else self.game
+        setattr(obj, field, getattr(obj, field) + delta)
+
+    def debit(self, amount: int) -> bool:
+        """Списать условным UPDATE (только если хватает); False — средств уже нет."""
+        qs, field = self._row()
+        if not qs.filter(**{f"{field}__gte": amount}).update(**{field: F(field) - amount}):
+            return False
+        self._sync(field, -amount)
+        return True
+
+    def credit(self, amount: int):
+        qs, field = self._row()
+        qs.update(**{field: F(field) + amount})
+        self._sync(field, amount)
+
+
+def receiver_account(game: Game, receiver: GamePlayer | None, receiver_kind: str) -> AccountRef:
+    """Куда зачислять: игроку — на личный счёт, "bank" — в банк, "gov" — на гос. счёт."""
+    if receiver_kind == "player":
+        return AccountRef(game=game, player=receiver, kind="personal")
+    if receiver_kind == "bank":
+        return AccountRef(game=game, player=None, kind="bank")
+    if receiver_kind == "gov":
+        return AccountRef(game=game, player=None, kind="state")
+    raise ValueError("Unknown receiver kind")
 
 
 def resolve_actor_account(game: Game, actor: GamePlayer, source: AccountType | None = None) -> AccountRef:
@@ -62,38 +87,43 @@ def resolve_actor_account(game: Game, actor: GamePlayer, source: AccountType | N
 @transaction.atomic
 def transfer_money(
     game: Game,
-    actor: GamePlayer,
-    target: GamePlayer,
+    sender: GamePlayer,
+    receiver: GamePlayer | None,
     amount: int,
+    receiver_kind: str = "player",
     source: AccountType | None = None,
 ) -> tuple[bool, str]:
     """
     Универсальный перевод внутри игры.
-    actor -> target, amount > 0.
+    sender -> receiver (receiver_kind="player") или в банк/гос. казну ("bank"/"gov"), amount > 0.
     source:
       None     => авто: Политик -> гос. счёт, Банкир -> личный, остальные -> личный
       "bank"   => Банкир с банковского счёта
-      "state"  => жёсткая работа с гос. счётом (на будущее)
       "personal" => личный
+    Балансы меняются условными UPDATE — параллельные переводы не затирают друг друга.
     """
     if amount <= 0:
         return False, "Сумма должна быть положительной."
 
-    # нельзя переводить самому себе
-    if actor.id == target.id:
-        return False, "Нельзя переводить самому себе."
-
-    # источник
-    src = resolve_actor_account(game, actor, source)
-
-    if src.balance < amount:
+    if receiver_kind == "player":
+        if receiver is None:
+            return False, "Получатель не найден."
+        # нельзя переводить самому себе
+        if sender.id == receiver.id:
+            return False, "Нельзя переводить самому себе."
+    elif receiver_kind not in ("bank", "gov"):
+        return False, "Некорректный получатель."
+
+    src = resolve_actor_account(game, sender, source)
+    if not src.debit(amount):
         return False, "Недостаточно средств на выбранном счёте."
-
-    # списываем
-    src.set_balance(src.balance - amount)
-
-    # зачисляем всегда на ЛИЧНЫЙ счёт получателя
-    target.money += amount
-    target.save(update_fields=["money"])
+    receiver_account(game, receiver, receiver_kind).credit(amount)
+    # в той же транзакции, что и балансы: журнал не расходится с таблицами
+    events.record(
+        game.id, "transfer",
+        amt=amount,
+        **{"from": events.account(src.kind, src.player.id if src.player else None),
+           "to": events.account(receiver_kind, receiver.id if receiver else None)},
+    )
 
     return True, "Перевод выполнен."
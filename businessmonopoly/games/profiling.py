@@ -0,0 +1,172 @@
+# games/profiling.py
+import cProfile
+import io
+import logging
+import pstats
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"    # подписанный токен, см. make_profile_token()
+PROFILE_PARAM = "__profile"     # ?__profile=1 — только для staff
+SIGNING_SALT = "games.profiling"
+
+# не разворачиваем ветки графа вызовов, где меньше 10 мкс
+MIN_BRANCH_SECONDS = 1e-5
+MAX_STACK_DEPTH = 64
+
+
+def make_profile_token(label: str = "manual") -> str:
+    """Токен для заголовка X-Profile. Проверится только процессом с тем же SECRET_KEY."""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(label)
+
+
+def _wants_profile(request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+                token, max_age=getattr(settings, "PROFILE_TOKEN_MAX_AGE", 3600)
+            )
+            return True
+        except signing.BadSignature:  # в т.ч. SignatureExpired
+            logger.warning("[PROFILE] bad or expired token from %s", request.META.get("REMOTE_ADDR"))
+            return False
+    if PROFILE_PARAM in request.GET:
+        user = getattr(request, "user", None)
+        return bool(user and user.is_authenticated and user.is_staff)
+    return False
+
+
+def _func_label(func) -> str:
+    filename, line, name = func
+    if filename == "~":  # встроенные функции
+        return name
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> list[str]:
+    """
+    Свернуть граф вызовов cProfile в формат "a;b;c <мкс>" для flamegraph.pl / speedscope.
+    cProfile хранит только пары вызывающий→вызываемый, поэтому собственное время функции
+    делится между путями пропорционально числу вызовов по каждому ребру (приближение).
+    """
+    raw = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+
+    weights = defaultdict(float)
+
+    def walk(func, path, visiting, share):
+        _, _, tt, ct, _ = raw[func]
+        path = path + (_func_label(func),)
+        if tt * share > 0:
+            weights[";".join(path)] += tt * share
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        visiting.add(func)
+        for child, edge_ct in children.get(func, ()):
+            if child in visiting:
+                continue
+            child_ct = raw[child][3]
+            child_share = share * (edge_ct / child_ct) if child_ct else 0
+            if child_ct * child_share < MIN_BRANCH_SECONDS:
+                continue
+            walk(child, path, visiting, child_share)
+        visiting.discard(func)
+
+    # корни — функции, вызванные снаружи профилируемого участка: такой вызов не попадает
+    # ни в одно ребро (или его вызывающего нет в статистике)
+    for func, (cc, nc, _, _, callers) in raw.items():
+        recorded = sum(edge[0] for caller, edge in callers.items() if caller in raw)
+        outside = nc - recorded
+        if outside > 0 and cc:
+            walk(func, (), set(), min(outside / cc, 1.0))
+
+    return [f"{stack} {int(w * 1_000_000)}" for stack, w in weights.items() if int(w * 1_000_000) > 0]
+
+
+def _rotate(out_dir: Path):
+    keep = max(getattr(settings, "PROFILE_KEEP", 50), 1)
+    reports = sorted(out_dir.glob("*.pstats"))
+    for old in reports[:-keep]:
+        for path in out_dir.glob(old.stem + ".*"):
+            path.unlink(missing_ok=True)
+
+
+def write_report(name: str, profiler: cProfile.Profile, queries: list, total_seconds: float) -> Path:
+    """pstats + collapsed-стеки + текстовая сводка с SQL. Возвращает базовый путь отчёта."""
+    out_dir = Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+    base = out_dir / f"{stamp}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}"
+
+    profiler.dump_stats(f"{base}.pstats")
+    stats = pstats.Stats(profiler)
+    Path(f"{base}.collapsed").write_text("\n".join(collapsed_stacks(stats)) + "\n", encoding="utf-8")
+
+    summary = io.StringIO()
+    db_total = sum(d for d, _ in queries)
+    summary.write(f"{name}\ntotal: {total_seconds * 1000:.1f} ms\n")
+    summary.write(f"sql: {len(queries)} queries, {db_total * 1000:.1f} ms\n\n")
+    for duration, sql in queries:
+        summary.write(f"[{duration * 1000:8.2f} ms] {sql}\n")
+    summary.write("\n")
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+    Path(f"{base}.txt").write_text(summary.getvalue(), encoding="utf-8")
+
+    _rotate(out_dir)
+    return base
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование по запросу: cProfile вокруг view + все SQL запроса, отчёт в PROFILE_DIR.
+    Включается подписанным заголовком X-Profile или ?__profile=1 у staff-пользователя.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _wants_profile(request):
+            return self.get_response(request)
+
+        queries = []
+
+        def capture_sql(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((time.perf_counter() - start, sql))
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with connection.execute_wrapper(capture_sql):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        total = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        name = match.view_name if match else request.path
+        try:
+            base = write_report(name, profiler, queries, total)
+            response["X-Profile-Report"] = base.name
+            logger.info("[PROFILE] %s -> %s", name, base)
+        except Exception:
+            logger.exception("[PROFILE] failed to write report for %s", name)
+        return response
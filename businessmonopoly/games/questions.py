@@ -1,44 +1,356 @@
 # games/questions.py
 import json
-from functools import lru_cache
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_LOCALE = "ru"
+
 CANDIDATE_NAMES = [
     "questions.ru.json", "questions.json",
     "quiz_questions.ru.json", "quiz_questions.json",
 ]
 
-def _candidate_paths():
-    here = Path(__file__).resolve().parent / "data"
-    for name in CANDIDATE_NAMES:
-        yield here / name
-
-@lru_cache
-def load_questions(locale: str = "ru") -> list[dict]:
-    for p in _candidate_paths():
-        if p.exists():
-            return json.loads(p.read_text(encoding="utf-8"))
-    try:
-        from importlib.resources import files
-        base = files("games").joinpath("data")
-        for name in CANDIDATE_NAMES:
-            fp = base.joinpath(name)
+# Как часто (сек) проверять mtime файла / версию пака с вопросами
+RELOAD_CHECK_INTERVAL = 2.0
+
+# Сколько паков держим в памяти процесса одновременно (LRU)
+PACK_CACHE_SIZE = 8
+
+
+def _candidate_paths(locale: str = DEFAULT_LOCALE):
+    if locale == DEFAULT_LOCALE:
+        names = CANDIDATE_NAMES
+    else:
+        names = [f"questions.{locale}.json", f"quiz_questions.{locale}.json"]
+    for name in names:
+        yield DATA_DIR / name
+
+
+def _normalize(raw: dict) -> dict:
+    """Приводим вопрос к единому виду один раз — при загрузке каталога."""
+    r = raw.get("reward") or {}
+    choices = list(raw.get("choices") or raw.get("options") or [])
+    correct = raw.get("correct")
+
+    # correct может быть индексом или значением варианта
+    correct_index = None
+    if isinstance(correct, int) and not isinstance(correct, bool):
+        if 0 <= correct < len(choices):
+            correct_index = correct
+    elif correct is not None:
+        texts = [str(c) for c in choices]
+        if str(correct) in texts:
+            correct_index = texts.index(str(correct))
+
+    return {
+        "id": int(raw.get("id", 0)),
+        "text": raw.get("text") or "",
+        "choices": choices,
+        "correct": correct,
+        "correct_index": correct_index,
+        "auto": correct is not None,
+        "reward": {
+            "money": int(r.get("money") or 0),
+            "influence": int(r.get("influence") or 0),
+        },
+    }
+
+
+class QuestionCatalog:
+    """
+    Каталог вопросов одной локали: id -> вопрос, авто/ручные отдельно.
+    Файл перечитывается сам, если поменялся на диске (проверка не чаще RELOAD_CHECK_INTERVAL).
+    """
+
+    def __init__(self, locale: str = DEFAULT_LOCALE):
+        self.locale = locale
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._source = None  # метка загруженного источника, см. _locate()
+        # (by_id, auto_ids, manual_ids) — подменяется целиком, читатели без блокировок
+        self._state = ({}, (), ())
+
+    def _locate(self):
+        """Метка текущего источника (None — источника нет). Сменилась метка — перечитываем."""
+        for p in _candidate_paths(self.locale):
             try:
-                return json.loads(fp.read_text(encoding="utf-8"))
+                return p, p.stat().st_mtime_ns
             except FileNotFoundError:
                 continue
-    except Exception:
-        pass
-    return []
-
-def _with_defaults(q: dict) -> dict:
-    q = dict(q)
-    r = q.get("reward") or {}
-    q["reward"] = {"money": int(r.get("money", 0)), "influence": int(r.get("influence", 0))}
-    return q
-
-def get_question_by_id(qid: int) -> dict | None:
-    for q in load_questions():
-        if int(q.get("id", 0)) == int(qid):
-            return _with_defaults(q)
+        return None
+
+    def _read(self, source):
+        path, _ = source
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+                return
+            self._checked_at = now
+
+            source = self._locate()
+            if source == self._source:
+                return
+            if source is None:
+                self._state = ({}, (), ())
+                self._source = None
+                return
+
+            try:
+                items = [_normalize(q) for q in self._read(source)]
+            except Exception:
+                # источник мог быть записан не до конца — оставляем старый каталог, попробуем позже
+                logger.exception("[QUESTIONS] failed to load %r", source)
+                return
+
+            by_id = {q["id"]: q for q in items}
+            auto_ids = tuple(qid for qid, q in by_id.items() if q["auto"])
+            manual_ids = tuple(qid for qid, q in by_id.items() if not q["auto"])
+            self._state = (by_id, auto_ids, manual_ids)
+            self._source = source
+            logger.info("[QUESTIONS] loaded %d questions from %r", len(by_id), source)
+
+    def invalidate(self):
+        """Проверить источник при следующем обращении, не дожидаясь интервала."""
+        self._checked_at = None
+
+    def get(self, qid) -> dict | None:
+        self._refresh()
+        try:
+            return self._state[0].get(int(qid))
+        except (TypeError, ValueError):
+            return None
+
+    def ids(self, auto: bool | None = None) -> tuple:
+        self._refresh()
+        by_id, auto_ids, manual_ids = self._state
+        if auto is None:
+            return tuple(by_id)
+        return auto_ids if auto else manual_ids
+
+    def all(self) -> list[dict]:
+        self._refresh()
+        return list(self._state[0].values())
+
+    def random(self, auto: bool | None = None) -> dict | None:
+        ids = self.ids(auto)
+        if not ids:
+            return None
+        return self._state[0].get(random.choice(ids))
+
+    def __len__(self):
+        self._refresh()
+        return len(self._state[0])
+
+    def __contains__(self, qid):
+        return self.get(qid) is not None
+
+
+_catalogs: dict[str, QuestionCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(locale: str = DEFAULT_LOCALE) -> QuestionCatalog:
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.setdefault(locale, QuestionCatalog(locale))
+    return catalog
+
+
+class PackCatalog(QuestionCatalog):
+    """Каталог вопросов из БД (QuestionPack). Перечитывается при смене QuestionPack.version."""
+
+    def __init__(self, pack_id: int):
+        super().__init__(locale=None)
+        self.pack_id = pack_id
+
+    def _locate(self):
+        from .models import QuestionPack
+        return (QuestionPack.objects
+                .filter(pk=self.pack_id)
+                .values_list("version", flat=True)
+                .first())
+
+    def _read(self, source):
+        from .models import Question
+        rows = (Question.objects
+                .filter(pack_id=self.pack_id)
+                .values("number", "text", "choices", "correct", "reward_money", "reward_influence")
+                .iterator(chunk_size=2000))
+        for r in rows:
+            yield {
+                "id": r["number"],
+                "text": r["text"],
+                "choices": r["choices"],
+                "correct": r["correct"],
+                "reward": {"money": r["reward_money"], "influence": r["reward_influence"]},
+            }
+
+
+_pack_catalogs: "OrderedDict[int, PackCatalog]" = OrderedDict()
+
+
+def get_pack_catalog(pack_id: int) -> PackCatalog:
+    with _catalogs_lock:
+        catalog = _pack_catalogs.pop(pack_id, None) or PackCatalog(pack_id)
+        _pack_catalogs[pack_id] = catalog
+        while len(_pack_catalogs) > PACK_CACHE_SIZE:
+            _pack_catalogs.popitem(last=False)
+    return catalog
+
+
+def invalidate_pack(pack_id: int):
+    catalog = _pack_catalogs.get(pack_id)
+    if catalog is not None:
+        catalog.invalidate()
+
+
+def get_game_catalog(game) -> QuestionCatalog:
+    """Каталог, из которого игра берёт вопросы: выбранный пак или файл по умолчанию."""
+    if getattr(game, "question_pack_id", None):
+        return get_pack_catalog(game.question_pack_id)
+    return get_catalog(DEFAULT_LOCALE)
+
+
+def _deck_source(game) -> str:
+    if getattr(game, "question_pack_id", None):
+        return f"pack:{game.question_pack_id}"
+    return f"file:{DEFAULT_LOCALE}"
+
+
+def draw_question(game) -> dict | None:
+    """
+    Следующий вопрос из колоды игры: без повторов, пока колода не кончится,
+    потом — новая перетасовка. Сменился источник вопросов — тоже перетасовка.
+    """
+    from django.db import transaction
+    from .models import QuestionDeck
+
+    catalog = get_game_catalog(game)
+    source = _deck_source(game)
+
+    with transaction.atomic():
+        deck, _ = QuestionDeck.objects.select_for_update().get_or_create(game=game)
+        if deck.source != source:
+            deck.shuffle(catalog.ids(), source)
+
+        for _ in range(2):  # не больше одной перетасовки за вызов
+            while deck.cursor < deck.size:
+                q = catalog.get(deck.card_at(deck.cursor))
+                deck.cursor += 1
+                if q:  # вопрос могли удалить из каталога — такие пропускаем
+                    deck.save(update_fields=["cursor"])
+                    return q
+            ids = catalog.ids()
+            if not ids:
+                break
+            deck.shuffle(ids, source)
+
     return None
+
+
+def iter_json_array(fp, read_size: int = 64 * 1024):
+    """Потоково отдаёт элементы JSON-массива верхнего уровня, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buf, started, eof = "", False, False
+    while True:
+        buf = buf.lstrip()
+        if buf and not started:
+            if buf[0] != "[":
+                raise ValueError("Ожидался JSON-массив")
+            buf, started = buf[1:], True
+            continue
+        if buf and started:
+            if buf[0] == "]":
+                return
+            if buf[0] == ",":
+                buf = buf[1:]
+                continue
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                buf = buf[end:]
+                continue
+        if eof:
+            raise ValueError("Неожиданный конец JSON")
+        chunk = fp.read(read_size)
+        if not chunk:
+            eof = True
+        buf += chunk
+
+
+def import_pack(fp, pack, chunk_size: int = 1000, replace: bool = False) -> int:
+    """
+    Залить вопросы из JSON-массива в пак пачками по chunk_size.
+    Вопросы с уже существующим номером перезаписываются; replace=True — сначала очистить пак.
+    """
+    from django.db import transaction
+    from django.db.models import F
+    from .models import Question, QuestionPack
+
+    fields = ["text", "choices", "correct", "reward_money", "reward_influence"]
+
+    def flush(batch):
+        Question.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["pack", "number"],
+            update_fields=fields,
+        )
+
+    total = 0
+    with transaction.atomic():
+        if replace:
+            Question.objects.filter(pack=pack).delete()
+
+        batch = []
+        for raw in iter_json_array(fp):
+            if not isinstance(raw, dict):
+                raise ValueError(f"Ожидался объект вопроса, получено: {raw!r}")
+            q = _normalize(raw)
+            batch.append(Question(
+                pack=pack,
+                number=q["id"],
+                text=q["text"],
+                choices=q["choices"],
+                correct=q["correct"],
+                reward_money=q["reward"]["money"],
+                reward_influence=q["reward"]["influence"],
+            ))
+            if len(batch) >= chunk_size:
+                flush(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            total += len(batch)
+
+        # новая версия — остальные процессы перечитают пак при следующей проверке
+        QuestionPack.objects.filter(pk=pack.pk).update(version=F("version") + 1)
+
+    invalidate_pack(pack.pk)
+    return total
+
+
+def load_questions(locale: str = DEFAULT_LOCALE) -> list[dict]:
+    return get_catalog(locale).all()
+
+
+def get_question_by_id(qid: int, locale: str = DEFAULT_LOCALE) -> dict | None:
+    return get_catalog(locale).get(qid)
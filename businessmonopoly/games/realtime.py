@@ -1,46 +1,160 @@
 # games/realtime.py
+import logging
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from . import engine, leaderboard, metrics, state_cache
 from .models import Game, GamePlayer
 
+logger = logging.getLogger(__name__)
+
+
+def _group_send(group: str, message: dict):
+    channel_layer = get_channel_layer()
+    with metrics.timed("bm_group_send_seconds"):
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
 def get_game_update_data(game_id):
+    with metrics.timed("bm_snapshot_build_seconds"):
+        return _build_game_update_data(game_id)
+
+
+def _build_game_update_data(game_id):
     game = Game.objects.get(id=game_id)
-    players = (GamePlayer.objects
-               .filter(game=game, is_active=True)
-               .select_related("user"))
+    # состав и роли — из state_cache, из БД только балансы
+    roster = state_cache.roster(game_id)
+    balances = {
+        pk: (money, influence)
+        for pk, money, influence in (GamePlayer.objects
+                                     .filter(game_id=game_id, is_active=True)
+                                     .values_list("id", "money", "influence"))
+    }
+
+    # в режиме движка свежие балансы и роли — в его памяти, а не в БД
+    snap = engine.snapshot(game_id)
+    if snap:
+        game.bank_balance = snap["bank_balance"]
+        game.state_balance = snap["state_balance"]
+
+    players = []
+    for p in roster:
+        money, influence = balances.get(p["id"], (0, 0))
+        role = p["role"]
+        if snap and str(p["id"]) in snap["players"]:
+            money, influence, role = snap["players"][str(p["id"])]
+        gp = GamePlayer(role=role, special_role=p["special_role"])
+        players.append({
+            "id": p["id"],
+            "username": p["username"],
+            "money": money,
+            "influence": influence,
+            "role": gp.get_role_display(),
+            "role_id": role,
+            "special_role": p["special_role"],
+            "is_observer": p["is_observer"],
+            "is_active": True,
+        })
 
     return {
-        "players": [
-            {
-                "id": p.id,
-                "username": p.user.username,
-                "money": p.money,
-                "influence": p.influence,
-                "role": p.get_role_display(),
-                "role_id": p.role,
-                "special_role": p.special_role,
-                "is_observer": p.is_observer,
-                "is_active": p.is_active,
-            }
-            for p in players
-        ],
+        "players": players,
         "bank_balance": game.bank_balance,
         "is_voting": game.is_voting,
         "paused": game.is_paused(),
-        "election_remaining": game.election_remaining_seconds() if game.is_voting else 0,
+        "timer": game.timer_state(),
+        "upgrade_prices": game.upgrade_prices,
     }
 
+# Группы игры: game_<id> — все подключённые (редкие события: выборы, удаление, чат, рейтинг);
+# снапшоты game_update — игрокам сразу, наблюдателям и зрителям — не чаще OBSERVER_UPDATE_INTERVAL.
+def players_group(game_id) -> str:
+    return f"game_{game_id}_players"
+
+
+def observers_group(game_id) -> str:
+    return f"game_{game_id}_observers"
+
+
 def send_game_update(game_id):
-    channel_layer = get_channel_layer()
     data = get_game_update_data(game_id)
-    async_to_sync(channel_layer.group_send)(
-        f"game_{game_id}",
-        {"type": "game_update", "data": data}
+    _group_send(players_group(game_id), {"type": "game_update", "data": data})
+    send_observer_update_throttled(game_id, data)
+    leaderboard.publish_throttled(game_id)
+
+
+def send_observer_update(game_id, data=None):
+    if data is None:
+        data = get_game_update_data(game_id)
+    _group_send(observers_group(game_id), {"type": "game_update", "data": data})
+
+
+def trailing_key(kind: str, game_id) -> str:
+    return f"games:{kind}:{game_id}:trailing"
+
+
+def _throttled(kind: str, game_id, interval: int, send, task):
+    """
+    Вызвать send(game_id) не чаще раза в interval секунд: первый вызов в окне — сразу,
+    остальные сливаются в один догоняющий вызов в конце окна (task через Celery).
+    """
+    if interval <= 0 or cache.add(f"games:{kind}:{game_id}:window", 1, interval):
+        send(game_id)
+        return
+
+    key = trailing_key(kind, game_id)
+    if not cache.add(key, 1, interval * 2):
+        return  # догоняющий вызов уже запланирован
+    try:
+        task.apply_async(args=[str(game_id)], countdown=interval)
+    except Exception:
+        logger.warning("[REALTIME] broker unavailable, sending game %s %s directly", game_id, kind)
+        cache.delete(key)
+        send(game_id)
+
+
+def send_game_update_throttled(game_id):
+    """send_game_update не чаще раза в JOIN_BROADCAST_INTERVAL (входы/выходы при наплыве игроков)."""
+    from .tasks import send_throttled_game_update
+    _throttled("bcast", game_id, settings.JOIN_BROADCAST_INTERVAL, send_game_update, send_throttled_game_update)
+
+
+def send_observer_update_throttled(game_id, data=None):
+    """Снапшот наблюдателям не чаще раза в OBSERVER_UPDATE_INTERVAL; data — уже собранный снапшот."""
+    from .tasks import send_throttled_observer_update
+    _throttled(
+        "observers", game_id, settings.OBSERVER_UPDATE_INTERVAL,
+        lambda gid: send_observer_update(gid, data), send_throttled_observer_update,
     )
 
+
+def send_viewer_tiers(user_ids, game_id, is_observer: bool):
+    """
+    Переключить сокеты этих пользователей в игре между группами игроков и наблюдателей.
+    Одно сообщение в группу игры со списком id — каждый сокет сам проверяет, есть ли он в нём.
+    Сбой рассылки не ломает вызывающего.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    try:
+        _group_send(f"game_{game_id}", {"type": "viewer_tier", "user_ids": user_ids, "is_observer": is_observer})
+    except Exception:
+        # сокеты получат правильную группу при переподключении
+        logger.warning("[REALTIME] viewer tier failed game=%s users=%d", game_id, len(user_ids))
+
+
+def send_timer_update(game_id, state: dict):
+    try:
+        _group_send(f"game_{game_id}", {"type": "timer_update", "data": state})
+    except Exception:
+        # таймер у клиентов досчитается по следующему снапшоту
+        logger.warning("[REALTIME] timer update failed game=%s", game_id)
+
+
 def notify_group(group_type: str, game_id):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(f"game_{game_id}", {"type": group_type})
+    _group_send(f"game_{game_id}", {"type": group_type})
 
 
 def send_personal_message(user_id, message: str, level: str = "info", extra_data=None):
@@ -61,11 +175,7 @@ def send_personal_message(user_id, message: str, level: str = "info", extra_data
         payload["message"]["data"] = extra_data
 
     try:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{user_id}",
-            payload
-        )
+        _group_send(f"user_{user_id}", payload)
     except Exception as e:
         print(f"[WebSocket] Ошибка отправки личного сообщения: {e}")
 
@@ -88,3 +198,30 @@ def broadcast_personal_to_game(
     for uid in user_ids:
         send_personal_message(uid, message, level=level, extra_data=extra_data)
 
+
+def send_question_to_players(game_id, message: str, extra_data: dict, tokens_by_user: dict):
+    """
+    Один вопрос многим игрокам: один group_send в группу игры вместо N личных.
+    Консьюмер сам отдаёт вопрос только адресатам (по user_id) с их ask_token.
+    """
+    _group_send(
+        f"game_{game_id}",
+        {
+            "type": "question_broadcast",
+            "message": message,
+            "data": extra_data,
+            "tokens": {str(uid): str(token) for uid, token in tokens_by_user.items()},
+        }
+    )
+
+
+def send_questions_expired(game_id, tokens_by_user: dict, pending_by_user: dict):
+    """Пачка истёкших вопросов/ответов игры — одним group_send; консьюмер фильтрует по user_id."""
+    _group_send(
+        f"game_{game_id}",
+        {
+            "type": "questions_expired",
+            "tokens": {str(uid): list(tokens) for uid, tokens in tokens_by_user.items()},
+            "pending": {str(uid): int(n) for uid, n in pending_by_user.items()},
+        }
+    )
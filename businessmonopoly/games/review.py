@@ -0,0 +1,116 @@
+# games/review.py
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import events
+from .models import GamePlayer, PendingAnswer
+from .questions import get_game_catalog
+
+PENDING_COUNT_TTL = 30  # сек
+MAX_PAGE_SIZE = 100
+MAX_BULK_GRADE = 200
+
+
+def _pending_count_key(game_id) -> str:
+    return f"games:pending_count:{game_id}"
+
+
+def pending_count(game_id) -> int:
+    """Сколько ответов ждут решения (кэшируется, сбрасывается при создании/решении ответа)."""
+    key = _pending_count_key(game_id)
+    count = cache.get(key)
+    if count is None:
+        count = PendingAnswer.objects.filter(game_id=game_id, status="pending").count()
+        cache.set(key, count, PENDING_COUNT_TTL)
+    return count
+
+
+def invalidate_pending_count(game_id):
+    cache.delete(_pending_count_key(game_id))
+
+
+def review_page(game, after: int = 0, limit: int = 20) -> tuple[list[dict], int | None]:
+    """
+    Страница очереди ревью: keyset-пагинация по id (WHERE id > after), без OFFSET.
+    Возвращает (элементы, курсор следующей страницы или None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = list(
+        PendingAnswer.objects
+        .filter(game=game, status="pending", pk__gt=after)
+        .order_by("pk")
+        .values("id", "player_id", "player__user__username", "question_id", "answer_text", "created_at")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    catalog = get_game_catalog(game)
+    items = []
+    for r in rows:
+        q = catalog.get(r["question_id"])
+        items.append({
+            "id": r["id"],
+            "player_id": r["player_id"],
+            "player_username": r["player__user__username"],
+            "question_id": r["question_id"],
+            "question_text": q["text"] if q else "",
+            "answer_text": r["answer_text"],
+            "created_at": r["created_at"].isoformat(),
+        })
+    return items, (rows[-1]["id"] if has_more else None)
+
+
+@transaction.atomic
+def bulk_grade(game, reviewer, decisions: dict[int, bool]) -> tuple[list[PendingAnswer], dict[int, list[int]]]:
+    """
+    Решение по многим ответам сразу: по UPDATE на статус и один UPDATE наград.
+    decisions: {pending_answer_id: approved}. Уже решённые/чужие id молча пропускаются.
+    Возвращает (обработанные ответы, {player_id: [money, influence]} начисленных наград).
+    """
+    rows = list(
+        PendingAnswer.objects
+        .select_for_update()
+        .filter(game=game, status="pending", pk__in=list(decisions))
+        .select_related("player")
+    )
+    if not rows:
+        return [], {}
+
+    now = timezone.now()
+    for status, approved in (("approved", True), ("rejected", False)):
+        ids = [r.pk for r in rows if decisions[r.pk] is approved]
+        if ids:
+            PendingAnswer.objects.filter(pk__in=ids).update(status=status, decided_at=now, decided_by=reviewer)
+        for r in rows:
+            if r.pk in ids:
+                r.status, r.decided_at, r.decided_by = status, now, reviewer
+
+    # награды суммируем по игрокам и начисляем одним UPDATE ... CASE
+    catalog = get_game_catalog(game)
+    rewards: dict[int, list[int]] = {}
+    for r in rows:
+        if r.status != "approved":
+            continue
+        q = catalog.get(r.question_id)
+        if not q:
+            continue
+        total = rewards.setdefault(r.player_id, [0, 0])
+        total[0] += q["reward"]["money"]
+        total[1] += q["reward"]["influence"]
+    rewards = {pid: t for pid, t in rewards.items() if t[0] or t[1]}
+
+    if rewards:
+        GamePlayer.objects.filter(pk__in=list(rewards)).update(
+            money=F("money") + Case(
+                *[When(pk=pid, then=Value(m)) for pid, (m, _) in rewards.items()], default=Value(0)
+            ),
+            influence=F("influence") + Case(
+                *[When(pk=pid, then=Value(i)) for pid, (_, i) in rewards.items()], default=Value(0)
+            ),
+        )
+        events.record(game.id, "balance", d={str(pid): t for pid, t in rewards.items()}, why="bulk_grade")
+
+    transaction.on_commit(lambda: invalidate_pending_count(game.id))
+    return rows, rewards
@@ -1,6 +1,51 @@
+from urllib.parse import urlparse
+
+from channels.security.websocket import WebsocketDenier
+from django.conf import settings
+from django.http.request import is_same_domain, split_domain_port, validate_host
+from django.middleware.csrf import CsrfViewMiddleware
 from django.urls import re_path
+
 from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/game/(?P<game_id>[0-9a-f\-]+)/$', consumers.GameConsumer.as_asgi()),
-]
\ No newline at end of file
+]
+
+
+def origin_allowed(scope) -> bool:
+    """
+    Origin сокета — по тем же правилам, что CSRF-проверка Django для POST: свой же хост
+    (Host из ALLOWED_HOSTS, та же схема) или CSRF_TRUSTED_ORIGINS. Одного ALLOWED_HOSTS мало:
+    '.trycloudflare.com' в нём пропустил бы сокет с любого чужого туннеля.
+    """
+    headers = dict(scope.get("headers") or [])
+    origin = headers.get(b"origin", b"").decode("latin1")
+    if not origin or origin == "null":
+        return False
+    host = headers.get(b"host", b"").decode("latin1")
+    scheme = "https" if scope.get("scheme") in ("wss", "https") else "http"
+    if host and validate_host(split_domain_port(host)[0], settings.ALLOWED_HOSTS) \
+            and origin == f"{scheme}://{host}":
+        return True
+
+    csrf = CsrfViewMiddleware(lambda request: None)
+    if origin in csrf.allowed_origins_exact:
+        return True
+    parsed = urlparse(origin)
+    return any(
+        is_same_domain(parsed.netloc, domain)
+        for domain in csrf.allowed_origin_subdomains.get(parsed.scheme, ())
+    )
+
+
+class CsrfOriginValidator:
+    """ASGI-обёртка: сокеты с чужим Origin отклоняются до рукопожатия."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if origin_allowed(scope):
+            return await self.application(scope, receive, send)
+        return await WebsocketDenier()(scope, receive, send)
@@ -0,0 +1,330 @@
+# games/savefile.py
+# Сохранение игры в компактный бинарный файл и восстановление (в т.ч. на другом сервере).
+#
+# Формат: MAGIC + байт версии, дальше zlib-поток записей msgpack:
+#   {"game": {...}, "creator": username, "exported_at": datetime}   — заголовок
+#   ["p", id, username, role, special_role, money, influence, is_active, is_observer]
+#   ["s", id, kind, question, started_at, ends_at, is_active, meta] — открытые голосования
+#   ["o", session_id, player_id, label, weight]
+#   ["b", session_id, voter_username, player_id]                    — голос за вариант с этим игроком
+#   ["q", question_id, asked_by_id, target_id, created_at]          — вопросы без ответа
+#   ["a", player_id, question_id, answer_text, created_at]          — ответы на ревью
+#   ["end", {вид: количество}]
+# id в файле — исходные, при восстановлении всё создаётся заново и перешивается.
+import zlib
+from datetime import timedelta
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from . import events, state_cache
+from .models import (
+    Game, GamePlayer, VoteSession, VoteOption, VoteBallot, AskedQuestion, PendingAnswer, QuestionPack,
+)
+
+MAGIC = b"BMGS"
+FORMAT_VERSION = 1
+CHUNK = 2000
+READ_SIZE = 64 * 1024
+COMPRESS_LEVEL = 6
+
+# поля Game, которые переносятся как есть (длительности — в секундах)
+GAME_FIELDS = (
+    "name", "is_active", "is_voting", "entrepreneur_chance", "voting_total_paused_seconds",
+    "state_balance", "bank_balance", "total_paused_seconds",
+)
+GAME_TIMES = ("start_time", "last_election_time", "voting_started_at", "voting_paused_at", "paused_at")
+GAME_DURATIONS = ("election_interval", "election_duration")
+
+
+class SaveFileError(ValueError):
+    pass
+
+
+# --- запись ---
+
+def _records(game: Game):
+    header = {f: getattr(game, f) for f in GAME_FIELDS}
+    header.update({f: getattr(game, f) for f in GAME_TIMES})
+    header.update({f: getattr(game, f).total_seconds() for f in GAME_DURATIONS})
+    header["question_pack_id"] = game.question_pack_id
+    header["upgrade_prices"] = game.upgrade_prices
+    yield {"game": header, "creator": game.creator.username, "exported_at": timezone.now()}
+
+    counts = dict.fromkeys("psobqa", 0)
+    for row in (GamePlayer.objects.filter(game=game).order_by("id")
+                .values_list("id", "user__username", "role", "special_role", "money", "influence",
+                             "is_active", "is_observer")
+                .iterator(chunk_size=CHUNK)):
+        counts["p"] += 1
+        yield ["p", *row]
+
+    sessions = VoteSession.objects.filter(game=game, is_active=True)
+    for row in sessions.values_list("id", "kind", "question", "started_at", "ends_at", "is_active", "meta"):
+        counts["s"] += 1
+        yield ["s", *row]
+    for row in (VoteOption.objects.filter(session__in=sessions)
+                .values_list("session_id", "object_id", "label", "weight").iterator(chunk_size=CHUNK)):
+        counts["o"] += 1
+        yield ["o", *row]
+    for row in (VoteBallot.objects.filter(session__in=sessions)
+                .values_list("session_id", "voter__username", "option__object_id").iterator(chunk_size=CHUNK)):
+        counts["b"] += 1
+        yield ["b", *row]
+
+    for row in (AskedQuestion.objects.filter(game=game, answered=False, expired=False)
+                .values_list("question_id", "asked_by_id", "target_id", "created_at").iterator(chunk_size=CHUNK)):
+        counts["q"] += 1
+        yield ["q", *row]
+    for row in (PendingAnswer.objects.filter(game=game, status="pending")
+                .values_list("player_id", "question_id", "answer_text", "created_at").iterator(chunk_size=CHUNK)):
+        counts["a"] += 1
+        yield ["a", *row]
+
+    yield ["end", counts]
+
+
+def iter_dump(game: Game):
+    """Файл сохранения кусками bytes — для потоковой отдачи в ответ или запись в файл."""
+    yield MAGIC + bytes([FORMAT_VERSION])
+    packer = msgpack.Packer(datetime=True)
+    compressor = zlib.compressobj(COMPRESS_LEVEL)
+    buf = bytearray()
+    for record in _records(game):
+        buf += packer.pack(record)
+        if len(buf) >= READ_SIZE:
+            out = compressor.compress(bytes(buf))
+            buf.clear()
+            if out:
+                yield out
+    yield compressor.compress(bytes(buf)) + compressor.flush()
+
+
+def dump_game(game: Game, fp) -> int:
+    """Записать игру в файловый объект fp; возвращает размер в байтах."""
+    size = 0
+    for chunk in iter_dump(game):
+        fp.write(chunk)
+        size += len(chunk)
+    return size
+
+
+# --- чтение ---
+
+# длина записей каждого вида (вместе с тегом) и порядок, в котором они идут в файле
+ARITY = {"p": 9, "s": 8, "o": 5, "b": 4, "q": 5, "a": 5, "end": 2}
+ORDER = "psobqa"
+# распакованный поток ограничен отдельно от размера файла: zlib сжимает нули в ~1000 раз
+MAX_UNPACKED_BYTES = 256 * 1024 * 1024
+MAX_RECORD_BYTES = 4 * 1024 * 1024
+
+
+def _iter_records(fp, max_bytes: int):
+    head = fp.read(len(MAGIC) + 1)
+    if head[:len(MAGIC)] != MAGIC:
+        raise SaveFileError("Это не файл сохранения игры")
+    if head[len(MAGIC):] != bytes([FORMAT_VERSION]):
+        raise SaveFileError(f"Неподдерживаемая версия файла: {head[len(MAGIC):].hex()}")
+
+    decompressor = zlib.decompressobj()
+    unpacker = msgpack.Unpacker(timestamp=3, strict_map_key=False, max_buffer_size=MAX_RECORD_BYTES)
+    total = 0
+
+    def feed(data: bytes):
+        nonlocal total
+        total += len(data)
+        if total > max_bytes:
+            raise SaveFileError("Файл сохранения слишком большой")
+        unpacker.feed(data)
+
+    try:
+        while chunk := fp.read(READ_SIZE):
+            # max_length: распаковываем не больше READ_SIZE за раз, остаток — в unconsumed_tail
+            feed(decompressor.decompress(chunk, READ_SIZE))
+            yield from unpacker
+            while decompressor.unconsumed_tail:
+                feed(decompressor.decompress(decompressor.unconsumed_tail, READ_SIZE))
+                yield from unpacker
+        feed(decompressor.flush())
+        yield from unpacker
+    except (zlib.error, msgpack.UnpackException, ValueError) as e:
+        if isinstance(e, SaveFileError):
+            raise
+        raise SaveFileError("Файл сохранения повреждён") from e
+
+
+def _iter_rows(records):
+    """Записи после заголовка: (вид, поля) с проверкой формы и порядка; последняя — ("end", counts)."""
+    position = 0
+    for record in records:
+        if not isinstance(record, list) or not record or ARITY.get(record[0]) != len(record):
+            raise SaveFileError("Файл сохранения повреждён")
+        kind = record[0]
+        if kind == "end":
+            if not isinstance(record[1], dict) or next(records, None) is not None:
+                raise SaveFileError("Файл сохранения повреждён")
+            yield kind, record[1]
+            return
+        if ORDER.index(kind) < position:
+            raise SaveFileError("Файл сохранения повреждён")
+        position = ORDER.index(kind)
+        yield kind, record[1:]
+    raise SaveFileError("Файл сохранения обрезан")
+
+
+def _resolve_users(usernames: set, create_users: bool) -> dict:
+    User = get_user_model()
+    users = {u.username: u for u in User.objects.filter(username__in=usernames)}
+    missing = usernames - users.keys()
+    if missing and not create_users:
+        raise SaveFileError("Нет пользователей: " + ", ".join(sorted(missing)[:20]))
+    if missing:
+        new = []
+        for username in sorted(missing):
+            user = User(username=username)
+            user.set_unusable_password()
+            new.append(user)
+        User.objects.bulk_create(new)
+        users.update({u.username: u for u in User.objects.filter(username__in=missing)})
+    return users
+
+
+def load_game(fp, creator=None, create_users: bool = False, max_bytes: int = MAX_UNPACKED_BYTES) -> Game:
+    """
+    Восстановить игру из файла как новую игру. creator — новый создатель (по умолчанию
+    пользователь из файла). Все отметки времени сдвигаются на время, прошедшее с сохранения,
+    — таймеры игры и выборов продолжаются с того же места. Файл читается потоком: в памяти
+    не больше CHUNK записей и таблицы перешивки id.
+    """
+    records = _iter_records(fp, max_bytes)
+    try:
+        with transaction.atomic():
+            return _restore(records, creator, create_users)
+    except SaveFileError:
+        raise
+    except (IntegrityError, DataError) as e:
+        raise SaveFileError("Файл сохранения повреждён: повторяющиеся записи") from e
+    except (KeyError, TypeError, ValueError, IndexError, AttributeError, OverflowError) as e:
+        raise SaveFileError("Файл сохранения повреждён") from e
+
+
+class _Restore:
+    """Создание строк новой игры пачками по мере чтения файла."""
+
+    def __init__(self, game: Game, shift, create_users: bool):
+        self.game = game
+        self.shift = shift
+        self.create_users = create_users
+        self.ct = ContentType.objects.get_for_model(GamePlayer)
+        self.pid, self.sid, self.oid = {}, {}, {}
+        self.seated = set()
+        self.counts = dict.fromkeys(ORDER, 0)
+
+    def at(self, value):
+        return value + self.shift if value is not None else None
+
+    def save(self, kind: str, rows: list):
+        self.counts[kind] += len(rows)
+        getattr(self, f"save_{kind}")(rows)
+
+    def save_p(self, rows):
+        usernames = [r[1] for r in rows]
+        if len(set(usernames)) != len(usernames) or self.seated.intersection(usernames):
+            raise SaveFileError("Файл сохранения повреждён: игрок записан дважды")
+        self.seated.update(usernames)
+        users = _resolve_users(set(usernames), self.create_users)
+        players = GamePlayer.objects.bulk_create([
+            GamePlayer(game=self.game, user=users[username], role=role, special_role=special, money=money,
+                       influence=influence, is_active=active, is_observer=observer)
+            for _, username, role, special, money, influence, active, observer in rows
+        ])
+        self.pid.update((old[0], p.pk) for old, p in zip(rows, players))
+
+    def save_s(self, rows):
+        sessions = VoteSession.objects.bulk_create([
+            VoteSession(game=self.game, kind=kind, question=question, started_at=self.at(started),
+                        ends_at=self.at(ends), is_active=active, meta=meta)
+            for _, kind, question, started, ends, active, meta in rows
+        ])
+        self.sid.update((old[0], s.pk) for old, s in zip(rows, sessions))
+
+    def save_o(self, rows):
+        options = VoteOption.objects.bulk_create([
+            VoteOption(session_id=self.sid[session], content_type=self.ct, object_id=self.pid[player],
+                       label=label, weight=weight)
+            for session, player, label, weight in rows
+        ])
+        self.oid.update(((o.session_id, o.object_id), o.pk) for o in options)
+
+    def save_b(self, rows):
+        users = _resolve_users({r[1] for r in rows}, self.create_users)
+        VoteBallot.objects.bulk_create([
+            VoteBallot(session_id=self.sid[session], voter=users[voter],
+                       option_id=self.oid[(self.sid[session], self.pid[player])])
+            for session, voter, player in rows
+        ])
+
+    def save_q(self, rows):
+        asked = AskedQuestion.objects.bulk_create([
+            AskedQuestion(game=self.game, question_id=qid, asked_by_id=self.pid[by], target_id=self.pid[target])
+            for qid, by, target, _ in rows
+        ])
+        self._shift_created(AskedQuestion, asked, rows)
+
+    def save_a(self, rows):
+        pending = PendingAnswer.objects.bulk_create([
+            PendingAnswer(game=self.game, player_id=self.pid[player], question_id=qid, answer_text=text)
+            for player, qid, text, _ in rows
+        ])
+        self._shift_created(PendingAnswer, pending, rows)
+
+    def _shift_created(self, model, objs, rows):
+        # created_at — auto_now_add, bulk_create его перезаписывает; возвращаем сдвинутые отметки
+        for obj, row in zip(objs, rows):
+            obj.created_at = self.at(row[-1])
+        model.objects.bulk_update(objs, ["created_at"])
+
+
+def _restore(records, creator, create_users: bool) -> Game:
+    header = next(records, None)
+    if not isinstance(header, dict) or not isinstance(header.get("game"), dict):
+        raise SaveFileError("Файл сохранения повреждён")
+    shift = timezone.now() - header["exported_at"]
+
+    if creator is None:
+        creator = _resolve_users({header["creator"]}, create_users)[header["creator"]]
+
+    data = header["game"]
+    game = Game(creator=creator)
+    for f in GAME_FIELDS:
+        setattr(game, f, data[f])
+    for f in GAME_TIMES:
+        setattr(game, f, data[f] + shift if data[f] is not None else None)
+    for f in GAME_DURATIONS:
+        setattr(game, f, timedelta(seconds=data[f]))
+    if data.get("upgrade_prices"):
+        game.upgrade_prices = data["upgrade_prices"]
+    pack_id = data.get("question_pack_id")
+    if pack_id and QuestionPack.objects.filter(id=pack_id).exists():
+        game.question_pack_id = pack_id
+    game.save()
+
+    restore = _Restore(game, shift, create_users)
+    batch_kind, batch = None, []
+    for kind, row in _iter_rows(records):
+        if batch and (kind != batch_kind or len(batch) >= CHUNK):
+            restore.save(batch_kind, batch)
+            batch = []
+        if kind == "end":
+            if any(row.get(k) != n for k, n in restore.counts.items()):
+                raise SaveFileError("Файл сохранения обрезан")
+            break
+        batch_kind = kind
+        batch.append(row)
+
+    events.record_baseline(game.id)
+    state_cache.bump(game.id)
+    return game
@@ -0,0 +1,143 @@
+# games/state_cache.py
+# Кэш горячего состояния игры (пауза, состав, Политик/Банкир) поверх django.core.cache.
+# Все ключи игры содержат её версию: bump(game_id) сбрасывает их разом, ничего не удаляя.
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+VERSION_TTL = 24 * 60 * 60   # сек; версия живёт дольше любых данных под ней
+REBUILD_LOCK_TTL = 5         # сек; страховка, если пересборщик упал
+REBUILD_WAIT = 0.5           # сек; сколько ждём чужую пересборку, потом строим сами
+REBUILD_POLL = 0.02
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class StateKey:
+    """Тип значения в кэше: имя, время жизни и как его построить из БД."""
+    name: str
+    ttl: int
+    build: Callable[[Any], Any]
+
+
+def _version_key(game_id) -> str:
+    return f"games:state:{game_id}:ver"
+
+
+def _version(game_id) -> int:
+    key = _version_key(game_id)
+    version = cache.get(key)
+    if version is None:
+        # версия могла протухнуть — начинаем с метки времени, чтобы не попасть на старые данные
+        cache.add(key, int(time.time() * 1000), VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def _bump_now(game_id):
+    key = _version_key(game_id)
+    try:
+        cache.incr(key)
+    except ValueError:  # ключа нет
+        cache.set(key, int(time.time() * 1000), VERSION_TTL)
+    except Exception:
+        logger.warning("[STATE_CACHE] bump failed game=%s", game_id, exc_info=True)
+
+
+def bump(game_id):
+    """Состояние игры изменилось: после коммита все её ключи становятся недействительными."""
+    transaction.on_commit(lambda: _bump_now(game_id))
+
+
+def get(key: StateKey, game_id):
+    """
+    Значение из кэша или построенное заново. Пересборку делает один процесс (single-flight
+    через cache.add), остальные недолго ждут его результат. Кэш недоступен — идём в БД.
+    """
+    try:
+        full_key = f"games:state:{game_id}:{_version(game_id)}:{key.name}"
+        value = cache.get(full_key, _MISSING)
+    except Exception:
+        logger.warning("[STATE_CACHE] cache unavailable, building %s directly", key.name, exc_info=True)
+        return key.build(game_id)
+    if value is not _MISSING:
+        return value
+
+    lock_key = full_key + ":lock"
+    if cache.add(lock_key, 1, REBUILD_LOCK_TTL):
+        try:
+            value = key.build(game_id)
+            cache.set(full_key, value, key.ttl)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL)
+        value = cache.get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return key.build(game_id)
+
+
+# --- горячие ключи ---
+
+def _build_paused(game_id) -> bool:
+    from .models import Game
+    return Game.objects.filter(id=game_id, paused_at__isnull=False).exists()
+
+
+def _build_roster(game_id) -> list[dict]:
+    from .models import GamePlayer
+    return [
+        {
+            "id": p["id"],
+            "user_id": p["user_id"],
+            "username": p["user__username"],
+            "role": p["role"],
+            "special_role": p["special_role"],
+            "is_observer": p["is_observer"],
+        }
+        for p in (GamePlayer.objects
+                  .filter(game_id=game_id, is_active=True)
+                  .order_by("id")
+                  .values("id", "user_id", "user__username", "role", "special_role", "is_observer"))
+    ]
+
+
+def _build_officials(game_id) -> dict:
+    from .models import GamePlayer
+    officials = {"politician": None, "banker": None}
+    rows = (GamePlayer.objects
+            .filter(game_id=game_id, special_role__in=[1, 2])
+            .values_list("special_role", "id", "user_id"))
+    for special_role, player_id, user_id in rows:
+        officials["politician" if special_role == 2 else "banker"] = {"player_id": player_id, "user_id": user_id}
+    return officials
+
+
+PAUSED = StateKey("paused", 60, _build_paused)
+ROSTER = StateKey("roster", 30, _build_roster)
+OFFICIALS = StateKey("officials", 60, _build_officials)
+
+
+def paused(game_id) -> bool:
+    return get(PAUSED, game_id)
+
+
+def roster(game_id) -> list[dict]:
+    """Активные игроки: id, user_id, username, role, special_role, is_observer (без балансов)."""
+    return get(ROSTER, game_id)
+
+
+def officials(game_id) -> dict:
+    """{"politician": {"player_id", "user_id"} | None, "banker": ... | None}"""
+    return get(OFFICIALS, game_id)
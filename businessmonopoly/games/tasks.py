@@ -1,13 +1,24 @@
 # games/tasks.py
+import time
+from collections import defaultdict
+from datetime import timedelta
+
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction, models
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
-from .models import Game, VoteSession
-from .realtime import send_game_update
+from . import leaderboard, metrics
+from .models import (
+    Game, GamePlayer, VoteSession, VoteOption, VoteBallot, AskedQuestion, PendingAnswer,
+    QuestionDeck, GameEvent, GameSnapshot,
+)
+from .realtime import send_game_update, send_observer_update, send_questions_expired, trailing_key
+from .review import invalidate_pending_count
 
 logger = get_task_logger(__name__)
 
@@ -21,15 +32,19 @@ def _notify(group_type: str, game_id: int):
 
 @shared_task(name="games.tasks.check_and_finish_elections")
 def check_and_finish_elections():
+    tick_started = time.perf_counter()
     now = timezone.now()
     touched = 0
 
     # 1) Старт выборов там, где пора по интервалу
     to_start = Game.objects.filter(
+        deleted_at__isnull=True,
         is_voting=False,
         last_election_time__lte=now - models.F("election_interval"),
     )
     for g in to_start:
+        metrics.observe("bm_election_lag_seconds",
+                        (now - g.last_election_time - g.election_interval).total_seconds(), phase="start")
         with transaction.atomic():
             game = Game.objects.select_for_update().get(pk=g.pk)
             if game.is_voting:
@@ -44,11 +59,13 @@ def check_and_finish_elections():
         touched += 1
 
         # 2) Завершение истёкших
-        active = Game.objects.filter(is_voting=True)
+        active = Game.objects.filter(is_voting=True, deleted_at__isnull=True)
         for g in active:
             # быстрый предфильтр (может быть устаревшим)
             if g.election_remaining_seconds() > 0:
                 continue
+            metrics.observe("bm_election_lag_seconds",
+                            g.election_elapsed_seconds() - g.election_duration.total_seconds(), phase="finish")
 
             did_timeout_close = False  # << флаг, реально ли закрыли как таймаут
 
@@ -88,6 +105,32 @@ def check_and_finish_elections():
 
         logger.debug("[ELECTION] tick checked=%d touched=%d", Game.objects.count(), touched)
 
+    metrics.observe("bm_election_tick_seconds", time.perf_counter() - tick_started)
+
+
+@shared_task(name="games.tasks.send_throttled_game_update")
+def send_throttled_game_update(game_id):
+    """Догоняющий снапшот для realtime.send_game_update_throttled."""
+    cache.delete(trailing_key("bcast", game_id))
+    if Game.objects.filter(id=game_id, deleted_at__isnull=True).exists():
+        send_game_update(game_id)
+
+
+@shared_task(name="games.tasks.send_throttled_observer_update")
+def send_throttled_observer_update(game_id):
+    """Догоняющий снапшот наблюдателям для realtime.send_observer_update_throttled."""
+    cache.delete(trailing_key("observers", game_id))
+    if Game.objects.filter(id=game_id, deleted_at__isnull=True).exists():
+        send_observer_update(game_id)
+
+
+@shared_task(name="games.tasks.publish_throttled_leaderboard")
+def publish_throttled_leaderboard(game_id):
+    """Догоняющая рассылка рейтинга для leaderboard.publish_throttled."""
+    cache.delete(trailing_key("leaderboard", game_id))
+    if Game.objects.filter(id=game_id, deleted_at__isnull=True).exists():
+        leaderboard.publish_if_changed(game_id)
+
 
 @shared_task(name="games.tasks.maybe_close_early")
 def maybe_close_early(game_id):
@@ -107,3 +150,147 @@ def maybe_close_early(game_id):
 
     # Все проголосовали — пусть стандартная логика подбора победителя/ничьей отработает единообразно
     game.end_election()
+
+
+EXPIRE_CHUNK = 500
+
+
+@shared_task(name="games.tasks.expire_stale_questions")
+def expire_stale_questions():
+    """
+    Закрываем вопросы и ответы на ревью старше QUESTION_TTL_SECONDS пачками по EXPIRE_CHUNK.
+    Игрокам — одно сообщение на игру со всеми их истёкшими вопросами.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.QUESTION_TTL_SECONDS)
+
+    asked_by_game = defaultdict(lambda: defaultdict(list))  # game_id -> user_id -> [ask_token]
+    pending_by_game = defaultdict(lambda: defaultdict(int))  # game_id -> user_id -> кол-во ответов
+
+    while True:
+        rows = list(AskedQuestion.objects
+                    .filter(answered=False, created_at__lt=cutoff)
+                    .order_by("pk")
+                    .values("pk", "game_id", "target__user_id", "token")[:EXPIRE_CHUNK])
+        if not rows:
+            break
+        AskedQuestion.objects.filter(pk__in=[r["pk"] for r in rows], answered=False) \
+            .update(answered=True, expired=True)
+        for r in rows:
+            asked_by_game[r["game_id"]][r["target__user_id"]].append(str(r["token"]))
+        if len(rows) < EXPIRE_CHUNK:
+            break
+
+    while True:
+        rows = list(PendingAnswer.objects
+                    .filter(status="pending", created_at__lt=cutoff)
+                    .order_by("pk")
+                    .values("pk", "game_id", "player__user_id")[:EXPIRE_CHUNK])
+        if not rows:
+            break
+        PendingAnswer.objects.filter(pk__in=[r["pk"] for r in rows], status="pending") \
+            .update(status="expired", decided_at=now)
+        for r in rows:
+            pending_by_game[r["game_id"]][r["player__user_id"]] += 1
+        if len(rows) < EXPIRE_CHUNK:
+            break
+
+    for game_id in set(asked_by_game) | set(pending_by_game):
+        if game_id in pending_by_game:
+            invalidate_pending_count(game_id)
+        try:
+            send_questions_expired(game_id, asked_by_game.get(game_id, {}), pending_by_game.get(game_id, {}))
+        except Exception:
+            logger.exception("[QUESTIONS] expiry notify failed game=%s", game_id)
+
+    asked_total = sum(len(t) for users in asked_by_game.values() for t in users.values())
+    pending_total = sum(n for users in pending_by_game.values() for n in users.values())
+    if asked_total or pending_total:
+        logger.info("[QUESTIONS] expired asked=%d pending=%d", asked_total, pending_total)
+    return asked_total, pending_total
+
+
+@shared_task(name="games.tasks.snapshot_game_states")
+def snapshot_game_states():
+    """Снапшоты журнала событий для игр, у которых есть события новее последнего снапшота."""
+    from django.db.models import Max, OuterRef, Subquery
+    from .events import take_snapshot
+    from .models import GameEvent, GameSnapshot
+
+    last_snapshot = (GameSnapshot.objects
+                     .filter(game_id=OuterRef("game_id"))
+                     .order_by("-last_event_id")
+                     .values("last_event_id")[:1])
+    game_ids = list(
+        GameEvent.objects
+        .values("game_id")
+        .annotate(last_event=Max("id"), last_snapshot=Subquery(last_snapshot))
+        .filter(models.Q(last_snapshot__isnull=True) | models.Q(last_event__gt=models.F("last_snapshot")))
+        .values_list("game_id", flat=True)
+    )
+    taken = 0
+    for game_id in game_ids:
+        try:
+            if take_snapshot(game_id):
+                taken += 1
+        except Exception:
+            logger.exception("[EVENTS] snapshot failed game=%s", game_id)
+    if taken:
+        logger.info("[EVENTS] snapshots taken: %d", taken)
+    return taken
+
+
+PURGE_CHUNK = 1000
+PURGE_GRACE = timedelta(minutes=10)  # сколько ждём таску удаления, прежде чем подобрать игру периодикой
+
+
+def _delete_in_chunks(qs, chunk: int = PURGE_CHUNK) -> int:
+    """Удалять строки пачками по chunk: каждая пачка — отдельная короткая транзакция."""
+    total = 0
+    while True:
+        ids = list(qs.values_list("pk", flat=True)[:chunk])
+        if not ids:
+            return total
+        qs.model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+
+
+@shared_task(name="games.tasks.refresh_game_stats")
+def refresh_game_stats():
+    """Пересчитать сводки GameStats для дашборда по играм с новыми событиями."""
+    from .dashboard import refresh_game_stats as refresh
+    refreshed = refresh()
+    if refreshed:
+        logger.info("[DASHBOARD] stats refreshed: %d", refreshed)
+
+
+@shared_task(name="games.tasks.purge_deleted_game")
+def purge_deleted_game(game_id):
+    """Удалить строки игры, помеченной удалённой (Game.mark_deleted), от листьев к корню."""
+    if not Game.objects.filter(pk=game_id, deleted_at__isnull=False).exists():
+        return 0
+
+    total = 0
+    for qs in (
+        VoteBallot.objects.filter(session__game_id=game_id),
+        VoteOption.objects.filter(session__game_id=game_id),
+        VoteSession.objects.filter(game_id=game_id),
+        PendingAnswer.objects.filter(game_id=game_id),
+        AskedQuestion.objects.filter(game_id=game_id),
+        GameEvent.objects.filter(game_id=game_id),
+        GameSnapshot.objects.filter(game_id=game_id),
+        QuestionDeck.objects.filter(game_id=game_id),
+        GamePlayer.objects.filter(game_id=game_id),
+    ):
+        total += _delete_in_chunks(qs)
+    Game.objects.filter(pk=game_id).delete()
+    logger.info("[DELETE] purged game=%s rows=%d", game_id, total)
+    return total
+
+
+@shared_task(name="games.tasks.purge_deleted_games")
+def purge_deleted_games():
+    """Подстраховка: удалённые игры, до которых не дошла purge_deleted_game (потерянная таска, рестарт)."""
+    stale = Game.objects.filter(deleted_at__lte=timezone.now() - PURGE_GRACE).values_list("pk", flat=True)
+    for game_id in list(stale):
+        purge_deleted_game(game_id)
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from main.models import User
+from . import actions, engine, events, metrics, savefile, state_cache, tasks
+from .consumers import GameConsumer
+from .context import GameContext
+from .enrollment import enroll_players
+from .models import AskedQuestion, Game, GameEvent, GamePlayer, PendingAnswer, VoteSession
+from .routing import origin_allowed
+from .votes import VoteService
+
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def ws_scope(user, game_id) -> dict:
+    return {
+        "type": "websocket",
+        "path": f"/ws/game/{game_id}/",
+        "headers": [],
+        "query_string": b"",
+        "subprotocols": [],
+        "client": ("127.0.0.1", 0),
+        "user": user,
+        "session": None,
+        "url_route": {"args": (), "kwargs": {"game_id": str(game_id)}},
+    }
+
+
+# интервалы 0 — рассылки сразу, без догоняющих Celery-задач (брокера в тестах нет)
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, OBSERVER_UPDATE_INTERVAL=0, LEADERBOARD_UPDATE_INTERVAL=0)
+@mock.patch("games.realtime._group_send")
+class WsCommandTests(TransactionTestCase):
+    # шаги команды выполняются в потоках database_sync_to_async — нужны закоммиченные данные
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="p")
+        self.bob = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=self.alice, is_active=True)
+        self.sender = GamePlayer.objects.create(game=self.game, user=self.alice, money=300)
+        self.receiver = GamePlayer.objects.create(game=self.game, user=self.bob, money=100)
+
+    async def command(self, action: str, payload: dict, user=None) -> dict:
+        comm = ApplicationCommunicator(GameConsumer.as_asgi(), ws_scope(user or self.alice, self.game.id))
+        await comm.send_input({"type": "websocket.connect"})
+        self.assertEqual((await comm.receive_output(5))["type"], "websocket.accept")
+        await comm.send_input({"type": "websocket.receive", "text": json.dumps(
+            {"type": "cmd", "id": 1, "action": action, "payload": payload}
+        )})
+        try:
+            while True:
+                message = json.loads((await comm.receive_output(5))["text"])
+                if message.get("id") == 1:
+                    return message
+        finally:
+            await comm.send_input({"type": "websocket.disconnect", "code": 1000})
+            await comm.wait(5)
+
+    async def test_transfer_ack(self, _group_send):
+        reply = await self.command("transfer", {"receiver": f"p{self.receiver.id}", "amount": 40})
+
+        self.assertEqual(reply["type"], "ack", reply)
+        self.assertEqual(reply["data"]["status"], "ok")
+        await self.assertBalances(260, 140)
+
+    async def test_transfer_insufficient_funds(self, _group_send):
+        reply = await self.command("transfer", {"receiver": f"p{self.receiver.id}", "amount": 1000})
+
+        self.assertEqual((reply["type"], reply["status"]), ("error", 400))
+        await self.assertBalances(300, 100)
+
+    async def test_slow_command_does_not_block_other_sockets(self, _group_send):
+        release = threading.Event()
+        prepare = actions.prepare_transfer
+
+        def slow_for_alice(ctx, data):
+            if ctx.user.pk == self.alice.pk:
+                release.wait(5)
+            return prepare(ctx, data)
+
+        with mock.patch("games.actions.prepare_transfer", slow_for_alice):
+            slow = asyncio.ensure_future(self.command("transfer", {"receiver": f"p{self.receiver.id}", "amount": 40}))
+            reply = await self.command("transfer", {"receiver": f"p{self.sender.id}", "amount": 10}, user=self.bob)
+            self.assertEqual(reply["type"], "ack", reply)
+            self.assertFalse(slow.done())
+            release.set()
+            self.assertEqual((await slow)["type"], "ack")
+        await self.assertBalances(270, 130)
+
+    @override_settings(GAME_ENGINE="memory")
+    async def test_transfer_ack_memory_engine(self, _group_send):
+        reply = await self.command("transfer", {"receiver": f"p{self.receiver.id}", "amount": 40})
+
+        self.assertEqual(reply["type"], "ack", reply)
+        await engine.asubmit(self.game.id, "flush")
+        await self.assertBalances(260, 140)
+
+    async def assertBalances(self, sender_money, receiver_money):
+        @database_sync_to_async
+        def balances():
+            return [GamePlayer.objects.get(pk=p.pk).money for p in (self.sender, self.receiver)]
+
+        self.assertEqual(await balances(), [sender_money, receiver_money])
+
+
+@override_settings(ALLOWED_HOSTS=["localhost", ".trycloudflare.com"],
+                   CSRF_TRUSTED_ORIGINS=["https://ours.trycloudflare.com"])
+class SocketOriginTests(TransactionTestCase):
+    def scope(self, origin, host, scheme="ws"):
+        return {"scheme": scheme, "headers": [(b"origin", origin.encode()), (b"host", host.encode())]}
+
+    def test_same_origin_and_trusted_origins_only(self):
+        self.assertTrue(origin_allowed(self.scope("http://localhost:8000", "localhost:8000")))
+        self.assertTrue(origin_allowed(self.scope("https://ours.trycloudflare.com", "ours.trycloudflare.com")))
+        # чужой туннель проходит ALLOWED_HOSTS, но не CSRF_TRUSTED_ORIGINS
+        self.assertFalse(origin_allowed(self.scope("https://evil.trycloudflare.com", "ours.trycloudflare.com")))
+        self.assertFalse(origin_allowed(self.scope("https://localhost:8000", "localhost:8000")))
+        self.assertFalse(origin_allowed({"scheme": "ws", "headers": [(b"host", b"localhost")]}))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, GAME_ENGINE="memory", ENGINE_FLUSH_INTERVAL=0.05)
+@mock.patch("games.engine.leaderboard.publish_throttled")
+class EngineOwnerTests(TransactionTestCase):
+    def setUp(self):
+        alice = User.objects.create_user(username="alice", password="p")
+        bob = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=alice, is_active=True)
+        self.sender = GamePlayer.objects.create(game=self.game, user=alice, money=300)
+        self.receiver = GamePlayer.objects.create(game=self.game, user=bob, money=0)
+
+    def run_on(self, node, action, timeout=5.0, **payload):
+        cf = asyncio.run_coroutine_threadsafe(node.submit(self.game.id, action, payload, timeout), engine._get_loop())
+        return cf.result(timeout + 5)
+
+    def transfer(self, node, amount, timeout=5.0):
+        return self.run_on(node, "transfer", timeout, sender_id=self.sender.id, special_role=0, amount=amount,
+                           receiver_kind="player", target_id=self.receiver.id)
+
+    def test_second_process_routes_to_owner(self, _publish):
+        a, b = engine.EngineNode(), engine.EngineNode()  # два процесса: свои движки, общая БД и channel layer
+        self.assertTrue(self.transfer(a, 250)[0])
+        ok, _msg = self.transfer(b, 250)  # своего движка b не поднимает — команда ушла владельцу a
+
+        self.assertFalse(ok)
+        self.assertNotIn(str(self.game.id), b.engines)
+        self.run_on(a, "flush")
+        self.assertEqual(GamePlayer.objects.get(pk=self.sender.pk).money, 50)
+
+    def test_timed_out_command_is_not_applied(self, _publish):
+        node = engine.EngineNode()
+        self.run_on(node, "snapshot")
+        gate = threading.Event()
+        snapshot = engine.GameEngine.cmd_snapshot
+
+        async def slow_snapshot(eng):
+            await asyncio.get_running_loop().run_in_executor(None, gate.wait, 5)
+            return await snapshot(eng)
+
+        with mock.patch.object(engine.GameEngine, "cmd_snapshot", slow_snapshot):
+            busy = asyncio.run_coroutine_threadsafe(
+                node.submit(self.game.id, "snapshot", {}, 5.0), engine._get_loop()
+            )
+            with self.assertRaises(TimeoutError):
+                self.transfer(node, 100, timeout=0.2)
+            gate.set()
+            busy.result(5)
+        self.run_on(node, "flush")
+        self.assertEqual(GamePlayer.objects.get(pk=self.sender.pk).money, 300)
+
+
+@mock.patch.object(metrics, "_client", side_effect=ConnectionError("Redis недоступен"))
+class MetricsFlushTests(SimpleTestCase):
+    def test_failed_flush_keeps_deltas_and_logs_once(self, _client):
+        field = 'bm_ws_connections{game="g"}'
+        with mock.patch.object(metrics, "_pending", {}), mock.patch.object(metrics, "_failing", False), \
+                mock.patch.object(metrics, "_backoff_until", 0.0), \
+                self.assertLogs("games.metrics", "WARNING") as logs:
+            metrics.inc("bm_ws_connections", 1, game="g")
+            metrics.flush()
+            metrics._backoff_until = 0.0
+            metrics.inc("bm_ws_connections", 1, game="g")
+            metrics.inc("bm_ws_connections", -1, game="g")
+            metrics.flush()
+
+            self.assertEqual(metrics._pending, {field: 1.0})
+        self.assertEqual(len(logs.output), 1)
+
+
+class SaveFileTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="p")
+        self.bob = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=self.alice, is_active=True)
+        GamePlayer.objects.create(game=self.game, user=self.alice, money=300)
+        GamePlayer.objects.create(game=self.game, user=self.bob, money=100, influence=2)
+
+    def crafted(self, *rows) -> io.BytesIO:
+        """Файл из заголовка настоящей игры и заданных записей."""
+        unpacker = msgpack.Unpacker(timestamp=3, strict_map_key=False)
+        unpacker.feed(zlib.decompress(b"".join(savefile.iter_dump(self.game))[5:]))
+        header = next(unpacker)
+        packer = msgpack.Packer(datetime=True)
+        body = packer.pack(header) + b"".join(packer.pack(r) for r in rows)
+        return io.BytesIO(savefile.MAGIC + bytes([savefile.FORMAT_VERSION]) + zlib.compress(body))
+
+    def test_round_trip(self):
+        fp = io.BytesIO(b"".join(savefile.iter_dump(self.game)))
+        copy = savefile.load_game(fp)
+
+        self.assertEqual(
+            sorted(GamePlayer.objects.filter(game=copy).values_list("user__username", "money", "influence")),
+            [("alice", 300, 0), ("bob", 100, 2)],
+        )
+
+    def test_malformed_records(self):
+        player = ["p", 1, "alice", 1, 0, 10, 0, True, False]
+        cases = {
+            "не список": self.crafted("oops", ["end", {}]),
+            "пустая запись": self.crafted([], ["end", {}]),
+            "неверная длина": self.crafted(player[:4], ["end", {"p": 1}]),
+            "игрок дважды": self.crafted(player, player, ["end", {"p": 2}]),
+            "после end": self.crafted(["end", {}], player),
+            "без end": self.crafted(player),
+            "порядок": self.crafted(["q", 1, 1, 1, None], player, ["end", {"p": 1, "q": 1}]),
+        }
+        for name, fp in cases.items():
+            with self.subTest(name), self.assertRaises(savefile.SaveFileError):
+                savefile.load_game(fp)
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_unpacked_size_is_bounded(self):
+        fp = self.crafted(["p", 1, "x" * (2 * 1024 * 1024), 1, 0, 10, 0, True, False], ["end", {"p": 1}])
+        with self.assertRaisesMessage(savefile.SaveFileError, "слишком большой"):
+            savefile.load_game(fp, max_bytes=1024 * 1024)
+
+    @mock.patch("games.views.invalidate_game_list")
+    def test_http_import_requires_staff(self, _invalidate):
+        self.client.force_login(self.bob)
+        upload = SimpleUploadedFile("g.bmgs", b"".join(savefile.iter_dump(self.game)))
+        self.assertEqual(self.client.post("/games/import/", {"file": upload}, secure=True).status_code, 403)
+
+        self.bob.is_staff = True
+        self.bob.save()
+        upload.seek(0)
+        response = self.client.post("/games/import/", {"file": upload}, secure=True,
+                                    HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Game.objects.count(), 2)
+
+
+@mock.patch("games.actions.send_personal_message")
+class ManualAnswerTests(TransactionTestCase):
+    def setUp(self):
+        self.politician_user = User.objects.create_user(username="pol", password="p")
+        self.player_user = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=self.politician_user, is_active=True)
+        self.politician = GamePlayer.objects.create(game=self.game, user=self.politician_user, special_role=2)
+        self.player = GamePlayer.objects.create(game=self.game, user=self.player_user)
+        self.asked = AskedQuestion.objects.create(
+            game=self.game, question_id=1, asked_by=self.politician, target=self.player,
+        )
+        self.client.force_login(self.player_user)
+
+    def answer(self):
+        return self.client.post(
+            f"/games/{self.game.id}/answer-question/",
+            json.dumps({"question_id": 1, "ask_token": str(self.asked.token), "answer_text": "42"}),
+            content_type="application/json", secure=True,
+        )
+
+    @mock.patch("games.actions.get_game_catalog")
+    def test_manual_answer_is_not_expired_later(self, catalog, _message):
+        catalog.return_value.get.return_value = {
+            "auto": False, "choices": [], "reward": {"money": 10, "influence": 0},
+        }
+        self.assertEqual(self.answer().status_code, 200)
+        self.assertEqual(self.answer().status_code, 400)  # повторно ответить нельзя
+
+        AskedQuestion.objects.filter(pk=self.asked.pk).update(created_at=timezone.now() - timedelta(days=1))
+        with mock.patch("games.tasks.send_questions_expired") as expired:
+            tasks.expire_stale_questions()
+
+        self.asked.refresh_from_db()
+        self.assertFalse(self.asked.expired)
+        expired.assert_not_called()
+        self.assertEqual(PendingAnswer.objects.get(game=self.game).status, "pending")
+
+
+@mock.patch("games.actions.send_game_update")
+@mock.patch("games.views.send_game_update_throttled")
+class EventReplayTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name, password="p") for name in ("alice", "bob", "pol")]
+        self.game = Game.objects.create(name="g", creator=self.users[0], is_active=True)
+
+    def post(self, user, url, data):
+        self.client.force_login(user)
+        return self.client.post(f"/games/{self.game.id}/{url}/", data, secure=True)
+
+    def test_replay_matches_tables_after_transfers(self, *_mocks):
+        for user in self.users:
+            self.post(user, "join", {})
+        alice, bob, pol = GamePlayer.objects.filter(game=self.game).order_by("user__username")
+        # назначение Политика по итогам выборов — так же, как это пишет Game.end_election
+        GamePlayer.objects.filter(pk=pol.pk).update(special_role=2)
+        events.record(self.game.id, "special", p=pol.id, s=2)
+        alice.refresh_from_db()
+
+        for user, receiver, amount in ((self.users[0], f"p{bob.id}", 7), (self.users[1], "bank", 3),
+                                       (self.users[2], f"p{alice.id}", 50), (self.users[2], "gov", 5)):
+            response = self.post(user, "transfer", {"receiver": receiver, "amount": amount})
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.post(self.users[0], "transfer", {"receiver": f"p{bob.id}", "amount": 10 ** 6})
+                         .status_code, 400)
+
+        self.assertEqual(GameEvent.objects.filter(game=self.game, kind="transfer").count(), 4)
+        state, _ = events.rebuild(self.game.id)
+        live = events.live_state(self.game.id)
+        self.assertEqual(state, live)
+        self.assertEqual(live["players"][str(alice.id)]["m"], alice.money - 7 + 50)
+
+        out = io.StringIO()
+        call_command("rebuild_game_state", str(self.game.id), "--compare", stdout=out)
+        self.assertIn("Совпадает", out.getvalue())
+
+    @mock.patch("games.realtime._group_send")
+    @mock.patch("games.tasks.maybe_close_early.delay")
+    def test_replay_covers_votes(self, *_mocks):
+        for user in self.users:
+            self.post(user, "join", {})
+        alice, bob, pol = GamePlayer.objects.filter(game=self.game).order_by("user__username")
+
+        self.game.start_election()
+        VoteService.cast_vote(self.game, self.users[0], bob.id)
+        VoteService.cast_vote(self.game, self.users[0], pol.id)  # смена голоса
+        VoteService.cast_vote(self.game, self.users[1], pol.id)
+        session = VoteSession.objects.get(game=self.game, is_active=True)
+
+        state, _ = events.rebuild(self.game.id)
+        self.assertEqual(state["votes"], {str(session.id): {str(self.users[0].id): pol.id,
+                                                             str(self.users[1].id): pol.id}})
+        self.assertEqual(state, events.live_state(self.game.id))
+
+        VoteService.finish_force(self.game)
+        state, _ = events.rebuild(self.game.id)
+        self.assertEqual(state["votes"], {})
+        self.assertEqual(state, events.live_state(self.game.id))
+
+        # процесс, не знающий о начатом журнале, второй baseline не пишет
+        events._started.clear()
+        events.record(self.game.id, "paused")
+        self.assertEqual(GameEvent.objects.filter(game=self.game, kind="baseline").count(), 1)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+@mock.patch("games.enrollment.send_viewer_tiers")
+class StateCacheTests(TransactionTestCase):
+    # bump срабатывает по on_commit — нужны настоящие коммиты
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username="alice", password="p")
+        self.bob = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=self.alice, is_active=True)
+        self.player = GamePlayer.objects.create(game=self.game, user=self.alice)
+
+    def test_pause_and_roster_changes_invalidate_cache(self, _viewer_tiers):
+        ctx = GameContext(self.alice, self.game.id)
+        self.assertFalse(ctx.paused)
+        self.assertEqual([p["username"] for p in state_cache.roster(self.game.id)], ["alice"])
+
+        self.game.pause()
+        enroll_players(self.game, [self.bob])
+        self.assertTrue(GameContext(self.alice, self.game.id).paused)
+        self.assertEqual([p["username"] for p in state_cache.roster(self.game.id)], ["alice", "bob"])
+
+        GamePlayer.objects.filter(pk=self.player.pk).update(role=2)  # в обход save — кэш не сброшен
+        self.assertEqual(state_cache.roster(self.game.id)[0]["role"], 1)
+
+        self.game.resume()
+        self.assertFalse(GameContext(self.alice, self.game.id).paused)
+        self.assertEqual(state_cache.roster(self.game.id)[0]["role"], 2)
+
+
+@mock.patch("games.views.send_game_update_throttled")
+@mock.patch("games.realtime._group_send")
+class ViewerTierTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="p")
+        self.bob = User.objects.create_user(username="bob", password="p")
+        self.game = Game.objects.create(name="g", creator=self.alice, is_active=True)
+
+    def assertTierSent(self, group_send, user_ids):
+        # одно сообщение в группу игры на всех, а не по сообщению на пользователя
+        group_send.assert_called_once_with(
+            f"game_{self.game.id}", {"type": "viewer_tier", "user_ids": user_ids, "is_observer": False}
+        )
+
+    def test_join_moves_spectator_to_players(self, group_send, _update):
+        self.client.force_login(self.bob)
+        self.client.get(f"/games/{self.game.id}/join/", secure=True)
+
+        self.assertTierSent(group_send, [self.bob.id])
+
+    def test_enroll_moves_players_but_not_returning_observers(self, group_send, _update):
+        carol = User.objects.create_user(username="carol", password="p")
+        dave = User.objects.create_user(username="dave", password="p")
+        GamePlayer.objects.create(game=self.game, user=carol, is_active=False, is_observer=True)
+
+        enroll_players(self.game, [self.bob, carol, dave])
+
+        self.assertTierSent(group_send, [self.bob.id, dave.id])
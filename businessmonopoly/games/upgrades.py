@@ -0,0 +1,65 @@
+# games/upgrades.py
+# Улучшение роли по таблице цен игры (Game.upgrade_prices).
+#
+# Списание и смена роли — один условный UPDATE: строка меняется, только если роль всё ещё
+# прежняя и средств хватает. Гонки с переводами/наградами не ломают баланс, блокировки не нужны.
+from django.db import transaction
+from django.db.models import F
+
+from . import events, state_cache
+from .models import GamePlayer
+
+PAY_MONEY = "money"
+PAY_INFLUENCE = "influence"
+PAY_METHODS = (PAY_MONEY, PAY_INFLUENCE)
+MAX_ROLE = 3
+
+
+def choose_payment(price: dict, pay: str | None, money: int, influence: int) -> str | None:
+    """Способ оплаты: явный pay, а без него (старые клиенты) — деньгами, если хватает, иначе влиянием."""
+    if pay in PAY_METHODS:
+        return pay
+    if money >= price["money"]:
+        return PAY_MONEY
+    if influence >= price["influence"]:
+        return PAY_INFLUENCE
+    return None
+
+
+def upgrade_role(game, player: GamePlayer, pay: str | None = None) -> tuple[bool, str, int]:
+    """
+    Улучшить роль игрока на одну ступень. Возвращает (ok, сообщение, роль после).
+    player — прочитанная без блокировки строка; на её role опирается условие UPDATE.
+    """
+    if player.special_role != 0:
+        return False, "Вы не можете улучшать специальную роль", player.role
+    price = game.upgrade_price(player.role)
+    if price is None or player.role >= MAX_ROLE:
+        return False, "Нельзя улучшить эту роль.", player.role
+    if pay is not None and pay not in PAY_METHODS:
+        return False, "Неизвестный способ оплаты.", player.role
+
+    method = choose_payment(price, pay, player.money, player.influence)
+    if method is None:
+        return False, "Недостаточно средств для улучшения.", player.role
+    cost = price[method]
+    new_role = player.role + 1
+
+    with transaction.atomic():
+        updated = (GamePlayer.objects
+                   .filter(pk=player.pk, role=player.role, special_role=0, **{f"{method}__gte": cost})
+                   .update(role=new_role, **{method: F(method) - cost}))
+        if updated:
+            events.record(game.id, "upgrade", p=player.id, r=new_role,
+                          m=cost if method == PAY_MONEY else 0, i=cost if method == PAY_INFLUENCE else 0)
+    if not updated:
+        # между чтением и UPDATE роль или баланс успели поменяться
+        player.refresh_from_db(fields=["role", "special_role", "money", "influence"])
+        if player.role == new_role - 1 and player.special_role == 0:
+            return False, "Недостаточно средств для улучшения.", player.role
+        return False, "Роль уже изменилась, обновите страницу.", player.role
+
+    player.role = new_role
+    setattr(player, method, getattr(player, method) - cost)
+    state_cache.bump(game.id)
+    return True, "Роль успешно улучшена!", new_role
@@ -1,30 +1,41 @@
-import random
+import hmac
 import json
+import uuid
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.conf import settings
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
+from django.db.models import Q
+from django.contrib.auth import get_user_model
 from django.urls import reverse
 from functools import wraps
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from .votes import VoteService
+from . import actions, engine, events, metrics
 from .forms import GameCreateForm, GameSettingsForm
-from .models import Game, GamePlayer, PendingAnswer, AskedQuestion
-from .realtime import send_game_update, send_personal_message, broadcast_personal_to_game
-from .questions import load_questions
+from .models import Game, GamePlayer
+from .realtime import send_game_update, send_game_update_throttled, send_viewer_tiers, send_personal_message, broadcast_personal_to_game
+from .review import pending_count, review_page
+from .dashboard import dashboard
+from .leaderboard import board as leaderboard_board, rank as leaderboard_rank, METRICS as LEADERBOARD_METRICS
+from .savefile import iter_dump, load_game, SaveFileError
+from .lobby import list_games, invalidate_game_list, DEFAULT_PAGE_SIZE
+from .context import get_game_context
+from .enrollment import roll_initial_role, enroll_players, INITIAL_MONEY, INITIAL_INFLUENCE, MAX_ENROLL
+from .tasks import purge_deleted_game
 
 
 @require_POST
 @login_required
 def save_game(request, game_id):
-    game = get_object_or_404(Game, id=game_id, creator=request.user)
+    game = get_object_or_404(Game, id=game_id, creator=request.user, deleted_at__isnull=True)
     game.is_active = True
     game.save()
+    invalidate_game_list()
 
     send_game_update(game.id)
     return JsonResponse({'status': 'ok'})
@@ -39,37 +50,40 @@ def _update_pause_state(game):
 
 
 def assign_initial_role_and_resources(game_player):
-    if random.random() < game_player.game.entrepreneur_chance:
-        game_player.role = 3  # Предприниматель
-    else:
-        game_player.role = 1  # Безработный
-    game_player.money = 300
-    game_player.influence = 0
+    game_player.role = roll_initial_role(game_player.game)  # Предприниматель или Безработный
+    game_player.money = INITIAL_MONEY
+    game_player.influence = INITIAL_INFLUENCE
     game_player.save()
 
 
 def pause_protected(view_func):
     @wraps(view_func)
     def _wrapped_view(request, game_id, *args, **kwargs):
-        game = get_object_or_404(Game, id=game_id)
-        if game.is_paused():
-            send_personal_message(
-                request.user.id,
-                "Игра на паузе. Действия временно недоступны.",
-                "warning"
-            )
-
+        if actions.notify_paused(get_game_context(request, game_id)):
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return HttpResponse(status=204)
-            return redirect('game_detail', game_id=game.id)
+            return redirect('game_detail', game_id=game_id)
         return view_func(request, game_id, *args, **kwargs)
     return _wrapped_view
 
 
+def _run_action(action, request, game_id, data=None):
+    """Выполнить действие из games/actions.py; data=None — тело запроса как JSON."""
+    try:
+        if data is None:
+            data = actions.parse_json(request.body)
+        result = action(get_game_context(request, game_id), data)
+    except actions.ActionError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    if result is None:
+        return HttpResponse(status=204)
+    return JsonResponse(result)
+
+
 @login_required
 @require_POST
 def toggle_pause(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
     if request.user != game.creator:
         return JsonResponse({'error': 'Forbidden'}, status=403)
 
@@ -78,7 +92,7 @@ def toggle_pause(request, game_id):
     else:
         game.pause()
 
-    send_game_update(game.id)
+    # клиентам уходит только событие таймера (Game.publish_timer), полный снапшот не нужен
     return JsonResponse({'status': 'ok'})
 
 
@@ -86,65 +100,13 @@ def toggle_pause(request, game_id):
 @login_required
 @pause_protected
 def upgrade_role(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    player = get_object_or_404(GamePlayer, game=game, user=request.user)
-
-    if player.special_role != 0:
-        return JsonResponse({'error': 'Вы не можете улучшать специальную роль'}, status=400)
-
-    if player.role == 1: #TODO Сделать выбор или то или то
-        if player.money >= 500:
-            player.money -= 500
-        elif player.influence >= 3:
-            player.influence -= 3
-        else:
-            send_personal_message(
-                request.user.id,
-                "Недостаточно средств для улучшения.",
-                "error"
-            )
-            return HttpResponse(status=204)
-        player.role = 2
-    elif player.role == 2:
-        if player.money >= 1000:
-            player.money -= 1000
-        elif player.influence >= 6:
-            player.influence -= 6
-        else:
-            send_personal_message(
-                request.user.id,
-                "Недостаточно средств для улучшения.",
-                "error"
-            )
-            return HttpResponse(status=204)
-        player.role = 3
-    else:
-        send_personal_message(
-            request.user.id,
-            "Нельзя улучшить эту роль.",
-            "error"
-        )
-        return HttpResponse(status=204)
-
-    player.save()
-    send_game_update(game.id)
-    send_personal_message(
-        player.user.id,
-        "Роль успешно улучшена!",
-        "success",
-        extra_data={
-            "role_id": player.role,
-            "role": player.get_role_display(),
-            "special_role": player.special_role,
-        }
-    )
-    return JsonResponse({'status': 'ok'})
+    return _run_action(actions.upgrade_role, request, game_id, request.POST)
 
 
 @login_required
 @require_POST
 def update_game_settings(request, game_id):
-    game = get_object_or_404(Game, id=game_id, creator=request.user)
+    game = get_object_or_404(Game, id=game_id, creator=request.user, deleted_at__isnull=True)
     form = GameSettingsForm(request.POST, instance=game)
 
     if form.is_valid():
@@ -173,84 +135,19 @@ def update_game_settings(request, game_id):
 @require_POST
 @pause_protected
 def transfer_money(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    sender = get_object_or_404(GamePlayer, game=game, user=request.user, is_active=True)
-
-    if sender.is_observer:
-        return JsonResponse({"error": "Наблюдатель не может переводить деньги"}, status=400)
-
-    receiver_raw = request.POST.get("receiver")
-    amount_raw = request.POST.get("amount")
-    source = request.POST.get("source")  # "personal"/"bank" для банкира, может быть None
-
-    try:
-        amount = int(amount_raw)
-    except (TypeError, ValueError):
-        return JsonResponse({"error": "Некорректная сумма"}, status=400)
-
-    if amount <= 0:
-        return JsonResponse({"error": "Сумма должна быть положительной"}, status=400)
-
-    if not receiver_raw:
-        return JsonResponse({"error": "Не указан получатель"}, status=400)
-
-    # --- разбираем получателя ---
-    receiver_kind = None  # "player" | "bank" | "gov"
-    target_player = None
-
-    if receiver_raw == "bank":
-        receiver_kind = "bank"
-    elif receiver_raw == "gov":
-        receiver_kind = "gov"
-    elif receiver_raw.startswith("p"):
-        receiver_kind = "player"
-        try:
-            target_id = int(receiver_raw[1:])
-        except ValueError:
-            return JsonResponse({"error": "Некорректный получатель"}, status=400)
-        target_player = get_object_or_404(
-            GamePlayer,
-            id=target_id,
-            game=game,
-            is_active=True,
-            is_observer=False,
-        )
-    else:
-        return JsonResponse({"error": "Некорректный получатель"}, status=400)
-
-    # Нельзя переводить себе самому (для player)
-    if receiver_kind == "player" and target_player.id == sender.id:
-        return JsonResponse({"error": "Нельзя перевести деньги самому себе"}, status=400)
-
-    # дальше — внутренняя логика переводов
-    from .money import transfer_money as core_transfer
-
-    ok, msg = core_transfer(
-        game=game,
-        sender=sender,
-        receiver=target_player,
-        amount=amount,
-        receiver_kind=receiver_kind,
-        source=source,
-    )
-
-    if not ok:
-        return JsonResponse({"error": msg}, status=400)
-
-    # Обновим состояние игры для всех
-    send_game_update(game.id)
-
-    return JsonResponse({"status": "ok", "message": msg})
+    return _run_action(actions.transfer, request, game_id, request.POST)
 
 
 
 @login_required
 def toggle_mode(request, game_id):
-    game = get_object_or_404(Game, id=game_id, creator=request.user)
+    game = get_object_or_404(Game, id=game_id, creator=request.user, deleted_at__isnull=True)
     player = get_object_or_404(GamePlayer, game=game, user=request.user)
     player.is_observer = not player.is_observer
     player.is_active = True
     player.save()
+    events.record(game.id, "observer", p=player.id, o=player.is_observer)
+    send_viewer_tiers([request.user.id], game.id, player.is_observer)
     send_game_update(game.id)
     #_update_pause_state(game)
     return JsonResponse({"status": "ok", "is_observer": player.is_observer})
@@ -260,56 +157,16 @@ def toggle_mode(request, game_id):
 @require_POST
 @pause_protected
 def vote_for_official(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    player = get_object_or_404(GamePlayer, game=game, user=request.user)
-
-    try:
-        payload = json.loads(request.body.decode("utf-8"))
-        candidate_id = int(payload.get("candidate_id"))
-    except Exception:
-        return JsonResponse({"error": "Неверные данные"}, status=400)
-
-    try:
-        VoteService.cast_vote(game, request.user, candidate_id)
-    except ValueError as e:
-        return JsonResponse({"error": str(e)}, status=400)
-    except Exception:
-        return JsonResponse({"error": "Не удалось сохранить голос"}, status=500)
-
-    send_game_update(game.id)
-    return JsonResponse({"status": "ok"})
+    return _run_action(actions.vote, request, game_id)
 
 @login_required
 @require_POST
 def choose_banker(request, game_id: int):
-    game = get_object_or_404(Game, pk=game_id)
-
-    # только текущий Политик
-    if not game.is_politician(request.user):
-        return HttpResponseForbidden("Только Политик может назначать Банкира")
-
-    try:
-        payload = json.loads(request.body or "{}")
-        banker_gp_id = int(payload.get("banker_id"))
-    except Exception:
-        return JsonResponse({"error": "Некорректный payload"}, status=400)
-
-    banker_gp = get_object_or_404(
-        GamePlayer,
-        pk=banker_gp_id, game=game,
-        is_active=True, is_observer=False,
-    )
-
-    # нельзя назначить игрока со спец-ролью (уже Политик/Банкир)
-    if banker_gp.special_role in (1, 2):
-        return JsonResponse({"error": "Игрок уже имеет спец-роль"}, status=400)
-
-    game.set_banker(banker_gp)
-    return JsonResponse({"status": "ok", "banker_id": banker_gp.id})
+    return _run_action(actions.choose_banker, request, game_id)
 
 @login_required
 def delete_game(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
 
     if request.user != game.creator:
         if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -320,6 +177,10 @@ def delete_game(request, game_id):
     game_name = game.name
     redirect_url = request.build_absolute_uri(reverse('game_list'))
 
+    # сразу скрываем игру; строки игроков, голосований, вопросов удаляются в фоне пачками
+    game.mark_deleted()
+    invalidate_game_list()
+
     broadcast_personal_to_game(
         game_id,
         f"Игра «{game_name}» была удалена",
@@ -333,7 +194,11 @@ def delete_game(request, game_id):
         {"type": "game_deleted", "name": game_name, "redirect": redirect_url}
     )
 
-    game.delete()
+    try:
+        purge_deleted_game.delay(str(game.id))
+    except Exception:
+        # брокер недоступен — игру подберёт периодическая purge_deleted_games
+        pass
 
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({'status': 'deleted'})
@@ -359,6 +224,8 @@ def create_game(request):
             game.creator = request.user
             game.is_active = True
             game.save()
+            events.record(game.id, "created", bank=game.bank_balance, state=game.state_balance)
+            invalidate_game_list()
             if request.headers.get("x-requested-with") == "XMLHttpRequest":
                 return JsonResponse({'redirect': f'/games/{game.id}/join/'})
             return redirect('join_game', game_id=game.id)
@@ -370,18 +237,23 @@ def create_game(request):
 
 @login_required
 def join_game(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
 
     game_player, created = GamePlayer.objects.get_or_create(game=game, user=request.user)
 
     if created:
         assign_initial_role_and_resources(game_player)
+        events.record(game.id, "joined", p=game_player.id, u=game_player.user_id, r=game_player.role,
+                      m=game_player.money, i=game_player.influence, o=game_player.is_observer)
     else:
         game_player.is_active = True
         game_player.save()
+        events.record(game.id, "active", p=game_player.id, a=True)
 
     #_update_pause_state(game)
-    send_game_update(game.id)
+    send_game_update_throttled(game.id)
+    # открытый сокет зрителя этой игры — в группу игроков (или наблюдателей, если он наблюдатель)
+    send_viewer_tiers([request.user.id], game.id, game_player.is_observer)
 
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({'status': 'joined'})
@@ -394,25 +266,103 @@ def join_game(request, game_id):
 @require_POST
 @login_required
 def leave_game(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
     try:
         player = GamePlayer.objects.get(game=game, user=request.user)
         player.is_active = False
         player.save()
+        events.record(game.id, "active", p=player.id, a=False)
     except GamePlayer.DoesNotExist:
         pass
 
     #_update_pause_state(game)
-    send_game_update(game.id)
+    send_game_update_throttled(game.id)
 
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({'status': 'left'})
     return redirect('game_list')
 
 
+@login_required
+def export_game(request, game_id):
+    """Скачать сохранение игры (games/savefile.py). Только создатель."""
+    game = get_object_or_404(Game, id=game_id, creator=request.user, deleted_at__isnull=True)
+    if engine.snapshot(game.id):
+        engine.submit(game.id, "flush")  # балансы из памяти движка — сначала в БД
+    response = StreamingHttpResponse(iter_dump(game), content_type="application/octet-stream")
+    response["Content-Disposition"] = f'attachment; filename="game-{game.id}.bmgs"'
+    return response
+
+
+MAX_SAVE_FILE_BYTES = 20 * 1024 * 1024
+
+
+@require_POST
+@login_required
+def import_game(request):
+    """
+    Восстановить игру из файла сохранения (поле file) как новую игру текущего пользователя.
+    Только для staff: файл рассаживает в игру произвольных пользователей и голосует от их имени.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Недостаточно прав"}, status=403)
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"error": "Файл не передан"}, status=400)
+    if upload.size > MAX_SAVE_FILE_BYTES:
+        return JsonResponse({"error": "Слишком большой файл"}, status=413)
+    try:
+        game = load_game(upload, creator=request.user)
+    except SaveFileError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    invalidate_game_list()
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse({'redirect': f'/games/{game.id}/'})
+    return redirect('game_detail', game_id=game.id)
+
+
+@require_POST
+@login_required
+def enroll_game_players(request, game_id):
+    """
+    Массовая запись игроков создателем игры (турниры, заранее подготовленные игры).
+    payload: {"usernames": [...]} и/или {"user_ids": [...]}; один снапшот на всех.
+    """
+    game = get_object_or_404(Game, id=game_id, creator=request.user, deleted_at__isnull=True)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        usernames = {str(u) for u in payload.get("usernames") or []}
+        user_ids = {int(u) for u in payload.get("user_ids") or []}
+    except Exception:
+        return JsonResponse({"error": "Неверные данные"}, status=400)
+
+    if not usernames and not user_ids:
+        return JsonResponse({"error": "Не указаны игроки."}, status=400)
+    if len(usernames) + len(user_ids) > MAX_ENROLL:
+        return JsonResponse({"error": f"Не больше {MAX_ENROLL} игроков за раз."}, status=400)
+
+    User = get_user_model()
+    users = list(User.objects.filter(Q(username__in=usernames) | Q(id__in=user_ids)))
+    missing = sorted(usernames - {u.username for u in users})
+    missing_ids = sorted(user_ids - {u.id for u in users})
+
+    created, reactivated = enroll_players(game, users)
+    if created or reactivated:
+        send_game_update(game.id)
+
+    return JsonResponse({
+        "status": "ok",
+        "created": len(created),
+        "reactivated": reactivated,
+        "missing": missing,
+        "missing_ids": missing_ids,
+    })
+
+
 @login_required
 def game_detail(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
     players = GamePlayer.objects.filter(game=game, is_active=True).select_related('user')
     player = GamePlayer.objects.filter(game=game, user=request.user).first()
 
@@ -422,20 +372,60 @@ def game_detail(request, game_id):
         'game': game,
         'players': players,
         'player': player,
-        'elapsed_seconds': game.elapsed_seconds(),
+        'timer_state': game.timer_state(),
         'is_paused': game.is_paused(),
         'settings_form': settings_form,
     })
 
 
+@login_required
+def game_leaderboard(request, game_id):
+    """Топ по деньгам и влиянию и место текущего игрока. ?limit=N — размер топа."""
+    game = get_object_or_404(Game, id=game_id, deleted_at__isnull=True)
+    try:
+        limit = min(max(int(request.GET.get('limit', settings.LEADERBOARD_TOP_N)), 1), 100)
+    except ValueError:
+        return JsonResponse({"error": "Некорректные параметры запроса"}, status=400)
+
+    player = GamePlayer.objects.filter(game=game, user=request.user, is_active=True, is_observer=False).first()
+    return JsonResponse({
+        "top": leaderboard_board(game.id, limit),
+        "me": {m: leaderboard_rank(player, m) for m in LEADERBOARD_METRICS} if player else None,
+    })
+
+
 @login_required
 def game_list(request):
-    games = Game.objects.filter(is_active=True).values('id', 'name', 'creator__username', 'created_at')
+    after = request.GET.get('after') or None
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+        games, next_cursor = list_games(after=after, query=query, limit=limit)
+    except ValueError:
+        return JsonResponse({"error": "Некорректные параметры запроса"}, status=400)
 
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        return JsonResponse({'games': list(games)})
+        return JsonResponse({'games': games, 'next': next_cursor})
+
+    return render(request, 'games/game_list.html', {
+        'games': games,
+        'next_cursor': next_cursor,
+        'query': query,
+    })
+
 
-    return render(request, 'games/game_list.html', {'games': games})
+@login_required
+def tournament_dashboard(request):
+    """Сводка по нескольким играм из GameStats; ?games=<id>,<id> — только эти игры."""
+    try:
+        game_ids = [uuid.UUID(g.strip()) for g in request.GET.get('games', '').split(',') if g.strip()]
+    except ValueError:
+        return JsonResponse({"error": "Некорректные параметры запроса"}, status=400)
+
+    data = dashboard(game_ids)
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse(data)
+    return render(request, 'games/dashboard.html', data)
 
 
 @login_required
@@ -454,7 +444,7 @@ def home(request):
         elif 'join_game' in request.POST:
             game_id = request.POST.get('game_id')
             try:
-                game = Game.objects.get(id=game_id)
+                game = Game.objects.get(id=game_id, deleted_at__isnull=True)
                 if request.headers.get("x-requested-with") == "XMLHttpRequest":
                     return JsonResponse({'redirect': f'/games/{game.id}/'})
                 return redirect('game_detail', game_id=game.id)
@@ -471,396 +461,62 @@ def home(request):
 @require_POST
 @pause_protected
 def ask_question(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    asker_gp = get_object_or_404(GamePlayer, game=game, user=request.user)
-
-    if asker_gp.special_role != 2:
-        return JsonResponse({"error": "Только Политик может задавать вопросы."}, status=403)
-
-    try:
-        payload = json.loads(request.body.decode("utf-8"))
-        target_id = int(payload.get("target_player_id"))
-        # новый параметр (опционально)
-        qid = payload.get("question_id")
-        if qid is not None:
-            qid = int(qid)
-    except Exception:
-        return JsonResponse({"error": "Неверные данные"}, status=400)
-
-    target_gp = get_object_or_404(
-        GamePlayer, id=target_id, game=game, is_active=True, is_observer=False
-    )
-    if target_gp.user_id == request.user.id:
-        return JsonResponse({"error": "Нельзя задавать вопрос самому себе."}, status=400)
-
-    questions = load_questions("ru")
-    if not questions:
-        return JsonResponse({"error": "Нет доступных вопросов."}, status=500)
-
-    # выбрать вопрос: заданный номер или случайный
-    q = None
-    if qid is not None:
-        q = next((x for x in questions if int(x.get("id")) == qid), None)
-        if not q:
-            return JsonResponse({"error": f"Вопрос #{qid} не найден."}, status=404)
-    else:
-        import random
-        q = random.choice(questions)
-        qid = int(q.get("id"))
-
-    # создаём запись-линк
-    from .models import AskedQuestion
-    asked = AskedQuestion.objects.create(
-        game=game, question_id=qid, asked_by=asker_gp, target=target_gp
-    )
-
-    # отправляем персональный WS получателю
-    extra = {
-        "kind": "question",
-        "question_id": qid,
-        "text": q.get("text"),
-        "choices": q.get("choices") or q.get("options") or [],
-        "from_politician": asker_gp.user.username,
-        "ask_token": str(asked.token),
-        "game_id": str(game.id),
-    }
-    send_personal_message(
-        target_gp.user_id,
-        f"Вопрос от Политика {asker_gp.user.username}:",
-        level="info",
-        extra_data=extra,
-    )
-
-    return JsonResponse({"status": "ok"})
+    return _run_action(actions.ask, request, game_id)
 
 
 @login_required
 @require_POST
 @pause_protected
 def answer_question(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
-    gp = get_object_or_404(GamePlayer, game=game, user=request.user, is_active=True)
-
-    try:
-        payload = json.loads(request.body.decode("utf-8"))
-        qid = int(payload.get("question_id"))
-        idx = payload.get("choice_index")  # может быть None
-        ask_token = payload.get("ask_token")  # <== есть в твоём коде
-        free_text = (payload.get("answer_text") or "").strip()  # НОВОЕ: для ручных/свободных
-    except Exception:
-        return JsonResponse({"error": "Неверные данные"}, status=400)
-
-    # найдём карточку вопроса
-    asked: AskedQuestion | None = None
-    if ask_token:
-        asked = AskedQuestion.objects.filter(game=game, token=ask_token).first()
-    if not asked:
-        asked = (AskedQuestion.objects
-                 .filter(game=game, target=gp, question_id=qid, answered=False)
-                 .order_by('-created_at')
-                 .first())
-
-    if not asked:
-        return JsonResponse({"error": "Вопрос не найден или уже закрыт."}, status=404)
-    if asked.target_id != gp.id:
-        return JsonResponse({"error": "Вы не адресат этого вопроса."}, status=403)
-    if asked.answered:
-        return JsonResponse({"error": "Ответ уже принят."}, status=400)
-
-    # загружаем вопрос
-    questions = load_questions("ru")
-    q = next((item for item in questions if int(item.get("id")) == qid), None)
-    if not q:
-        return JsonResponse({"error": "Вопрос не найден."}, status=404)
-
-    choices = q.get("choices") or q.get("options") or []
-    reward = (q.get("reward") or {})
-    reward_money = int(reward.get("money") or 0)
-    reward_infl  = int(reward.get("influence") or 0)
-
-    # --- ветка 1: ручной вопрос (correct is None) ---
-    if q.get("correct", None) is None:
-        # берём текст ответа: либо выбранный вариант (если варианты вдруг есть),
-        # либо свободный текст
-        if choices and idx is not None:
-            try:
-                idx = int(idx)
-                if not (0 <= idx < len(choices)):
-                    return JsonResponse({"error": "Некорректный вариант."}, status=400)
-                answer_text = str(choices[idx])
-            except Exception:
-                return JsonResponse({"error": "Некорректный вариант."}, status=400)
-        else:
-            # свободный ответ обязателен
-            if not free_text:
-                return JsonResponse({"error": "Ответ пустой."}, status=400)
-            answer_text = free_text
-
-        # создаём ожидающий ручного решения ответ
-        PendingAnswer.objects.create(
-            game=game,
-            player=gp,
-            question_id=qid,
-            answer_text=answer_text,
-            status="pending",
-        )
-
-        # НЕ закрываем asked сразу — пусть висит до решения
-        # (если хочешь — можешь пометить asked.answer_choice = None, но не answered=True)
-
-        # игроку — квитанция
-        send_personal_message(
-            gp.user_id,
-            "Ответ отправлен. Ожидайте решения Политика.",
-            level="info",
-            extra_data={
-                "kind": "question_result",
-                "question_id": qid,
-                "your_choice": None,
-                "correct": None,
-            },
-        )
-
-        # политикам — напоминание о ревью
-        for pol in GamePlayer.objects.filter(game=game, special_role=2, is_active=True):
-            send_personal_message(
-                pol.user_id,
-                f"Новый ответ по вопросу №{qid} от {gp.user.username}.",
-                level="info",
-                extra_data={
-                    "kind": "question_review",
-                    "question_id": qid,
-                    "player_username": gp.user.username,
-                    "answer_text": answer_text,
-                    "ask_token": str(asked.token),
-                }
-            )
-
-        return JsonResponse({"status": "ok", "pending": True})
-
-    # --- ветка 2: авто-вопрос (есть correct) ---
-    if not choices:
-        return JsonResponse({"error": "У вопроса нет вариантов."}, status=400)
-    try:
-        idx = int(idx)
-        if not (0 <= idx < len(choices)):
-            return JsonResponse({"error": "Некорректный вариант."}, status=400)
-    except Exception:
-        return JsonResponse({"error": "Некорректный вариант."}, status=400)
-
-    # correct может быть индексом или значением; поддержим оба
-    correct_raw = q.get("correct")
-    if isinstance(correct_raw, int):
-        is_correct = (idx == correct_raw)
-        correct_for_report = correct_raw
-    else:
-        # строка/значение — сравниваем по тексту
-        is_correct = (str(choices[idx]) == str(correct_raw))
-        # для отчёта отдадим само значение
-        correct_for_report = correct_raw
-
-    # закрываем карточку (для авто-вопроса)
-    asked.answered = True
-    asked.answer_choice = idx
-    asked.is_correct = is_correct
-    asked.save(update_fields=["answered", "answer_choice", "is_correct"])
-
-    # игроку — локальный фидбэк
-    if is_correct:
-        grant_reward(gp, money=reward_money, influence=reward_infl, reason=f"Правильный ответ #{qid}")
-        send_game_update(game.id)
-        send_personal_message(
-            gp.user_id,
-            "Верно! 🎉",
-            level="success",
-            extra_data={"kind": "question_result", "question_id": qid, "your_choice": idx, "correct": correct_for_report},
-        )
-    else:
-        send_personal_message(
-            gp.user_id,
-            "Неверно.",
-            level="warning",
-            extra_data={"kind": "question_result", "question_id": qid, "your_choice": idx, "correct": correct_for_report},
-        )
-
-    # Отчёт Политику, который задавал этот конкретный вопрос
-    polis_user_id = asked.asked_by.user_id
-    send_personal_message(
-        polis_user_id,
-        f"{gp.user.username} ответил на ваш вопрос №{qid}: {'верно' if is_correct else 'неверно'}.",
-        level="success" if is_correct else "warning",
-        extra_data={
-            "kind": "question_report",
-            "player": gp.user.username,
-            "question_id": qid,
-            "choice": idx,
-            "correct": correct_for_report,
-            "ask_token": str(asked.token),
-        },
-    )
-
-    return JsonResponse({"status": "ok", "correct": bool(is_correct)})
-
-
-def grant_reward(target_gp: GamePlayer, money: int = 0, influence: int = 0, reason: str = ""):
-    if not money and not influence:
-        return
-    with transaction.atomic():
-        gp = GamePlayer.objects.select_for_update().get(pk=target_gp.pk)
-        gp.money += int(money)
-        gp.influence += int(influence)
-        gp.save(update_fields=["money", "influence"])
-    send_game_update(gp.game_id)
-    msg = f"Награда: +{money} 💰, +{influence} ⭐"
-    if reason:
-        msg = f"{reason}. {msg}"
-    send_personal_message(gp.user_id, msg, "success")
+    return _run_action(actions.answer, request, game_id)
 
 
 @login_required
 @require_POST
 @pause_protected
 def grade_pending_answer(request, game_id):
-    from django.utils import timezone
-    from .models import Game, GamePlayer, AskedQuestion, PendingAnswer
+    return _run_action(actions.grade_answer, request, game_id)
 
-    game = get_object_or_404(Game, id=game_id)
-    reviewer_gp = get_object_or_404(GamePlayer, game=game, user=request.user)
 
-    # Разрешим только Политику
+@login_required
+def pending_answers(request, game_id):
+    """Очередь ответов на ревью для Политика: ?after=<id>&limit=<n>."""
+    ctx = get_game_context(request, game_id)
+    game = ctx.game
+    reviewer_gp = ctx.player()
     if reviewer_gp.special_role != 2:
         return JsonResponse({"error": "Только Политик может принимать решения."}, status=403)
 
     try:
-        payload = json.loads(request.body.decode("utf-8"))
-    except Exception:
-        return JsonResponse({"error": "Неверный JSON"}, status=400)
-
-    approved   = payload.get("approved")
-    ask_token  = payload.get("ask_token")
-    qid_raw    = payload.get("question_id")
-    pid_raw    = payload.get("player_id")  # опционально
-
-    # нормализуем approved -> bool
-    if isinstance(approved, str):
-        approved = approved.lower() in ("1", "true", "yes", "y")
-    approved = bool(approved)
-
-    # question_id (опц.)
-    qid = None
-    if qid_raw is not None:
-        try:
-            qid = int(qid_raw)
-        except (TypeError, ValueError):
-            return JsonResponse({"error": "Некорректный question_id"}, status=400)
-
-    # 1) Основной путь — ищем по ask_token
-    asked = None
-    if ask_token:
-        asked = AskedQuestion.objects.filter(game=game, token=ask_token).first()
-        if not asked:
-            return JsonResponse({"error": "Карточка вопроса не найдена по токену."}, status=404)
-        # извлекаем адресата
-        target_gp = asked.target
-        if qid is None:
-            qid = asked.question_id
-    else:
-        # 2) Фолбэк — по player_id + question_id (если прислали)
-        if pid_raw is None or qid is None:
-            return JsonResponse({"error": "Нужен ask_token или (player_id и question_id)."}, status=400)
-        try:
-            player_id = int(pid_raw)
-        except (TypeError, ValueError):
-            return JsonResponse({"error": "Некорректный player_id"}, status=400)
-
-        target_gp = get_object_or_404(GamePlayer, id=player_id, game=game, is_active=True)
-        asked = (AskedQuestion.objects
-                 .filter(game=game, target=target_gp, question_id=qid)
-                 .order_by('-created_at').first())
-        if not asked:
-            return JsonResponse({"error": "Карточка вопроса не найдена."}, status=404)
-
-    # Находим «ожидающий» ответ, если это ручной вопрос (correct == null)
-    pending = (PendingAnswer.objects
-               .filter(game=game, player=target_gp, question_id=qid, status="pending")
-               .order_by('-created_at')
-               .first())
-    if not pending:
-        # Может быть уже обработан, или вопрос авто-проверяемый
-        return JsonResponse({"error": "Нет ожидающего решения ответа."}, status=404)
-
-    # Применяем решение
-    pending.status = "approved" if approved else "rejected"
-    pending.decided_at = timezone.now()
-    pending.decided_by = request.user
-    pending.save(update_fields=["status", "decided_at", "decided_by"])
-
-    # Выдаём награду только при approved
-    if approved:
-        # Возьмём награду из questions.json (если есть), иначе дефолт
-        from .questions import load_questions
-        qs = load_questions("ru")
-        spec = next((x for x in qs if int(x.get("id", -1)) == qid), None) or {}
-        reward = spec.get("reward") or {}
-        money = int(reward.get("money") or 0)
-        infl  = int(reward.get("influence") or 0)
-
-        if money or infl:
-            # фиксируем баланс под транзакцию на всякий случай
-            with transaction.atomic():
-                tgt_locked = GamePlayer.objects.select_for_update().get(pk=target_gp.pk)
-                tgt_locked.money += money
-                tgt_locked.influence += infl
-                tgt_locked.save(update_fields=["money", "influence"])
-            # пушим игроку уведомление
-            parts = []
-            if money: parts.append(f"+{money} ₽")
-            if infl:  parts.append(f"+{infl} ⭐")
-            send_personal_message(
-                target_gp.user_id,
-                f"Ваш ответ принят. Награда: {' и '.join(parts)}",
-                level="success",
-            )
-        else:
-            # награда не задана — просто уведомим
-            send_personal_message(
-                target_gp.user_id,
-                "Ваш ответ принят.",
-                level="success",
-            )
-    else:
-        send_personal_message(
-            target_gp.user_id,
-            "Ваш ответ отклонён.",
-            level="warning",
-        )
-
-    # Автору вопроса (Политику) — подтверждение
-    send_personal_message(
-        asked.asked_by.user_id,
-        f"Решение по ответу игрока {target_gp.user.username} на вопрос №{qid}: "
-        + ("одобрено" if approved else "отклонено"),
-        level=("success" if approved else "warning"),
-        extra_data={
-            "kind": "question_review_result",
-            "question_id": qid,
-            "player": target_gp.user.username,
-            "approved": approved,
-            "ask_token": str(asked.token),
-        },
-    )
+        after = int(request.GET.get("after") or 0)
+        limit = int(request.GET.get("limit") or 20)
+    except ValueError:
+        return JsonResponse({"error": "Некорректные параметры пагинации"}, status=400)
+
+    items, next_cursor = review_page(game, after=after, limit=limit)
+    return JsonResponse({
+        "items": items,
+        "next": next_cursor,
+        "pending_count": pending_count(game.id),
+    })
 
-    # Обновим общий стейт на клиенте (балансы и т.п.)
-    send_game_update(game.id)
 
-    return JsonResponse({"status": "ok", "approved": approved})
+@login_required
+@require_POST
+@pause_protected
+def grade_pending_answers_bulk(request, game_id):
+    """
+    Массовое решение по ответам одной транзакцией.
+    payload: {"decisions": [{"id": 1, "approved": true}, ...]} или {"ids": [...], "approved": bool}
+    """
+    return _run_action(actions.grade_answers, request, game_id)
 
 
 
 @login_required
 @require_POST
 def start_election_early(request, game_id: int):
-    game = get_object_or_404(Game, pk=game_id)
+    game = get_object_or_404(Game, pk=game_id, deleted_at__isnull=True)
 
     # ТОЛЬКО создатель игры или суперюзер
     if not (request.user.is_superuser or game.creator_id == request.user.id):
@@ -890,3 +546,18 @@ def start_election_early(request, game_id: int):
     return JsonResponse({"status": "ok"})
 
 
+def metrics_view(request):
+    """
+    Prometheus-метрики: для staff или с заголовком Authorization: Bearer <METRICS_TOKEN>.
+    По адресу не пускаем — за туннелем (cloudflared) все запросы приходят с 127.0.0.1.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    by_token = bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+    if not (by_token or (request.user.is_authenticated and request.user.is_staff)):
+        return HttpResponseForbidden("Forbidden")
+    try:
+        body = metrics.render()
+    except Exception:
+        return HttpResponse("metrics store unavailable\n", status=503, content_type="text/plain")
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
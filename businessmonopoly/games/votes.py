@@ -3,6 +3,7 @@ from django.db import transaction, models
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 
+from . import events
 from .models import VoteSession, VoteOption, VoteBallot, GamePlayer
 
 class VoteService:
@@ -38,6 +39,7 @@ class VoteService:
             VoteOption(session=session, label=gp.user.username, content_type=ct, object_id=gp.pk)
             for gp in candidates_qs
         ])
+        events.record(game.id, "session", id=session.id, a=True)
 
         return session
 
@@ -73,6 +75,10 @@ class VoteService:
         VoteBallot.objects.update_or_create(
             session=session, voter=voter_user, defaults={"option": option}
         )
+        events.record(game.id, "ballot", s=session.id, v=voter_user.id, c=option.object_id)
+
+        from . import metrics
+        metrics.inc("bm_votes_total")
 
         from .tasks import maybe_close_early
         maybe_close_early.delay(str(game.id))
@@ -122,9 +128,7 @@ class VoteService:
             return None
 
         # закрываем
-        session.is_active = False
-        session.ends_at = timezone.now()
-        session.save(update_fields=['is_active', 'ends_at'])
+        session.close()
 
         # подсчёт
         tally = (VoteBallot.objects
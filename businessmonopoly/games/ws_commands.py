@@ -0,0 +1,111 @@
+# games/ws_commands.py
+# Действия игрока через уже открытый WebSocket вместо отдельного HTTP POST.
+#
+# Клиент: {"type": "cmd", "id": "<любой id запроса>", "action": "transfer", "payload": {...}}
+# Ответ:  {"type": "ack",   "id": ..., "status": 200, "data": {...}}
+#         {"type": "error", "id": ..., "status": 4xx/5xx, "error": "текст"}
+#
+# Логика — те же функции games/actions.py, что у HTTP-view. Синхронные шаги (ORM) идут в пул
+# потоков (thread_sensitive=False), а не в общий поток database_sync_to_async: медленная команда
+# одного сокета не задерживает остальные. Команды движка игры ждём через engine.asubmit, без потока.
+# CSRF-токена у сокета нет — вместо него Origin при подключении сверяется так же, как
+# CSRF-проверка Django (games/routing.py).
+import json
+import time
+
+from channels.db import database_sync_to_async
+from django.db import connection
+from django.http import Http404
+
+from . import actions, engine, instrumentation
+from .context import GameContext
+
+MAX_PAYLOAD_BYTES = 64 * 1024
+
+
+class CommandError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+async def _transfer(run, ctx, payload):
+    t = await run(actions.prepare_transfer, ctx, payload)
+    if engine.enabled():
+        try:
+            ok, msg = await engine.asubmit(ctx.game.id, "transfer", **t.engine_payload())
+        except TimeoutError:
+            raise actions.ActionError(actions.ENGINE_TIMEOUT, status=503)
+    else:
+        ok, msg = await run(actions.apply_transfer, ctx, t)
+    return await run(actions.finish_transfer, ctx, ok, msg)
+
+
+async def _upgrade_role(run, ctx, payload):
+    player, pay = await run(actions.prepare_upgrade, ctx, payload)
+    if engine.enabled():
+        try:
+            ok, msg, role = await engine.asubmit(
+                ctx.game.id, "upgrade_role", **actions.upgrade_engine_payload(ctx, player, pay)
+            )
+        except TimeoutError:
+            raise actions.ActionError(actions.ENGINE_TIMEOUT, status=503)
+    else:
+        ok, msg, role = await run(actions.apply_upgrade, ctx, player, pay)
+    return await run(actions.finish_upgrade, ctx, player, ok, msg, role)
+
+
+def _sync(action):
+    async def handler(run, ctx, payload):
+        return await run(action, ctx, payload)
+    return handler
+
+
+ACTIONS = {
+    "transfer": _transfer,
+    "upgrade_role": _upgrade_role,
+    "vote": _sync(actions.vote),
+    "ask": _sync(actions.ask),
+    "answer": _sync(actions.answer),
+    "choose_banker": _sync(actions.choose_banker),
+    "grade_answer": _sync(actions.grade_answer),
+    "grade_answers": _sync(actions.grade_answers),
+}
+# на паузе не выполняются (у HTTP-view — декоратор pause_protected)
+PAUSE_PROTECTED = frozenset(ACTIONS) - {"choose_banker"}
+
+
+async def dispatch(user, game_id, action: str, payload) -> tuple[int, dict | None]:
+    """Выполнить команду. Возвращает (status, данные ответа); ошибки — CommandError."""
+    handler = ACTIONS.get(action)
+    if handler is None:
+        raise CommandError(f"Неизвестное действие: {action}")
+    if not isinstance(payload, dict):
+        raise CommandError("payload должен быть объектом")
+    if len(json.dumps(payload).encode()) > MAX_PAYLOAD_BYTES:
+        raise CommandError("Слишком большой запрос", status=413)
+
+    stats = instrumentation.QueryStats()
+
+    async def run(fn, *args):
+        def call():
+            with connection.execute_wrapper(stats):
+                return fn(*args)
+        return await database_sync_to_async(call, thread_sensitive=False)()
+
+    ctx = GameContext(user, game_id)
+    start = time.perf_counter()
+    try:
+        if action in PAUSE_PROTECTED and await run(actions.notify_paused, ctx):
+            result = None
+        else:
+            result = await handler(run, ctx, payload)
+    except actions.ActionError as e:
+        raise CommandError(str(e), status=e.status)
+    except Http404:
+        raise CommandError("Не найдено", status=404)
+    finally:
+        instrumentation.record(f"ws:{action}", stats.count, stats.db_time, time.perf_counter() - start)
+    if result is None:
+        return 204, None  # отказ без тела, как HTTP 204 у view
+    return 200, result
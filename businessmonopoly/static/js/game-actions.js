@@ -1,4 +1,5 @@
 // game-actions.js
+import { postAction } from "/static/js/ws-actions.js";
 
 export function submitTransfer(gameId, csrfToken) {
   const form = document.getElementById("transfer-form");
@@ -10,20 +11,10 @@ export function submitTransfer(gameId, csrfToken) {
     const amount = form.amount.value;
     const source = form.source ? form.source.value : ""; // '' для не-банкира
 
-    const params = new URLSearchParams();
-    params.append("receiver", receiver);
-    params.append("amount", amount);
-    if (source) params.append("source", source);
-
-    fetch(`/games/${gameId}/transfer/`, {
-      method: "POST",
-      headers: {
-        "X-CSRFToken": csrfToken,
-        "X-Requested-With": "XMLHttpRequest",
-        "Content-Type": "application/x-www-form-urlencoded",
-      },
-      body: params.toString(),
-    })
+    const payload = { receiver, amount };
+    if (source) payload.source = source;
+
+    postAction("transfer", `/games/${gameId}/transfer/`, csrfToken, payload, { form: true })
       .then((res) => res.json())
       .then((data) => {
         if (data.status === "ok") {
@@ -137,16 +128,25 @@ export function upgradeRole(gameId, csrfToken) {
     const upgradeBtn = document.getElementById("upgrade-role-button");
     if (upgradeBtn) {
         upgradeBtn.addEventListener("click", () => {
-            const confirmUpgrade = confirm("Вы точно хотите улучшить свою роль?");
-            if (!confirmUpgrade) return;
-
-            fetch(`/games/${gameId}/upgrade_role/`, {
-                method: "POST",
-                headers: {
-                    "X-CSRFToken": csrfToken,
-                    "X-Requested-With": "XMLHttpRequest"
+            // цена из таблицы игры; сервер всё равно проверит её сам
+            const price = (window.upgradePrices || {})[String(window.playerRoleId)];
+            let payload = {};
+            if (price) {
+                const payMoney = confirm(
+                    `Улучшить роль за ${price.money} 💰?\nОтмена — выбрать оплату влиянием (${price.influence} ⭐).`
+                );
+                if (payMoney) {
+                    payload = { pay: "money" };
+                } else if (confirm(`Улучшить роль за ${price.influence} ⭐?`)) {
+                    payload = { pay: "influence" };
+                } else {
+                    return;
                 }
-            });
+            } else if (!confirm("Вы точно хотите улучшить свою роль?")) {
+                return;
+            }
+
+            postAction("upgrade_role", `/games/${gameId}/upgrade_role/`, csrfToken, payload, { form: true });
         });
     }
 }
@@ -262,15 +262,7 @@ export function initElectionUI(currentUsername) {
                 submitBtn.textContent = "Отправка...";
 
                 try {
-                    const res = await fetch(url, {
-                        method: "POST",
-                        headers: {
-                            "X-CSRFToken": window.csrfToken,
-                            "X-Requested-With": "XMLHttpRequest",
-                            "Content-Type": "application/json",
-                        },
-                        body: JSON.stringify({ candidate_id: selectedCandidateId }),
-                    });
+                    const res = await postAction("vote", url, window.csrfToken, { candidate_id: selectedCandidateId });
 
                     let payload = null;
                     try { payload = await res.json(); } catch (_) {}
@@ -317,20 +309,13 @@ export function initPoliticianQuestions(gameId, csrfToken) {
 
   btnSend.addEventListener("click", async () => {
     try {
-      const targetId = parseInt(selTarget.value, 10);
       const qidRaw   = (inputId.value || "").trim();
-      const body = { target_player_id: targetId };
+      const body = selTarget.value === "all"
+        ? { all_players: true }
+        : { target_player_id: parseInt(selTarget.value, 10) };
       if (qidRaw) body.question_id = parseInt(qidRaw, 10);
 
-      const resp = await fetch(`/games/${gameId}/ask-question/`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": csrfToken,
-          "X-Requested-With": "XMLHttpRequest",
-        },
-        body: JSON.stringify(body),
-      });
+      const resp = await postAction("ask", `/games/${gameId}/ask-question/`, csrfToken, body);
 
       if (resp.status === 204) { close(); return; }
       let data = {}; try { data = await resp.json(); } catch {}
@@ -447,15 +432,7 @@ export function initBankerSelectionUI(gameId, csrfToken) {
     submit.disabled = true;
     submit.textContent = "Отправка...";
     try {
-      const res = await fetch(`/games/${gameId}/choose_banker/`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": csrfToken,
-          "X-Requested-With": "XMLHttpRequest",
-        },
-        body: JSON.stringify({ banker_id: selectedBankerId }),
-      });
+      const res = await postAction("choose_banker", `/games/${gameId}/choose_banker/`, csrfToken, { banker_id: selectedBankerId });
       let data = {};
       try { data = await res.json(); } catch {}
       if (!res.ok) {
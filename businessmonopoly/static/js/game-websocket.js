@@ -1,13 +1,33 @@
 // static/js/game-websocket.js
 import { applyPauseToButtons, showQuestionModal } from "/static/js/ui-utils.js";
+import { attachSocket, handleReply } from "/static/js/ws-actions.js";
+import { loadLeaderboard, onLeaderboardUpdate } from "/static/js/leaderboard.js";
+
+// пауза: индикатор и блокировка кнопок
+function applyPausedUI(paused) {
+  window.paused = !!paused;
+  const pauseIndicator = document.getElementById("pause-indicator");
+  if (pauseIndicator) pauseIndicator.innerHTML = window.paused ? "<em>(пауза)</em>" : "";
+  applyPauseToButtons(window.paused);
+}
+
+function applyVotingUI(isVoting) {
+  const electionBlock = document.getElementById("election-block");
+  if (electionBlock) electionBlock.style.display = isVoting ? "flex" : "none";
+}
 
 export function initWebSocket(gameId, currentUsername) {
   const protocol = window.location.protocol === "https:" ? "wss://" : "ws://";
   const socket = new WebSocket(protocol + window.location.host + "/ws/game/" + gameId + "/");
+  attachSocket(socket);
+  loadLeaderboard(gameId);
 
   socket.onmessage = (e) => {
     const data = JSON.parse(e.data);
 
+    // ------- 0) Ответ на действие, отправленное через сокет --------
+    if (handleReply(data)) return;
+
     // ------- 1) Персональное --------
     if (data.type === "personal") {
       const msg = data.message;
@@ -38,6 +58,14 @@ export function initWebSocket(gameId, currentUsername) {
         return;
       }
 
+      // b2) истёкшие вопросы — закрыть модалку, если она про один из них
+      if (kind === "question_expired") {
+        const tokens = Array.isArray(msg.data?.ask_tokens) ? msg.data.ask_tokens : [];
+        const modal = document.getElementById("__question_modal__");
+        if (modal && tokens.includes(modal.dataset.askToken)) modal.remove();
+        // дальше — обычный тост
+      }
+
       // c) отзыв по вопросу для политика
       if (kind === "question_review") {
         if (typeof window.showReviewModal === "function") {
@@ -77,7 +105,7 @@ export function initWebSocket(gameId, currentUsername) {
     if (data.type === "update") {
       const update = data.data;
 
-      // деньги/влияние/роль/таймер…
+      // деньги/влияние/роль…
       if (update.money !== undefined && !window.isObserver) {
         document.getElementById("player-money").textContent = `${update.money}`;
       }
@@ -87,9 +115,8 @@ export function initWebSocket(gameId, currentUsername) {
       if (update.role !== undefined && !window.isObserver) {
         document.getElementById("player-role").textContent = update.role;
       }
-      if (typeof update.elapsed_seconds === "number" && window.timer?.setElapsed) {
-        window.timer.setElapsed(update.elapsed_seconds);
-      }
+      if (update.timer && window.timer) window.timer.apply(update.timer);
+      if (update.upgrade_prices) window.upgradePrices = update.upgrade_prices;
 
       if (update.bank_balance !== undefined) {
         const bankEl = document.getElementById("bank-balance");
@@ -166,15 +193,7 @@ export function initWebSocket(gameId, currentUsername) {
       }
 
       // панель выборов
-      const electionBlock = document.getElementById("election-block");
-      if (electionBlock) {
-        const hasRemaining = (typeof update.election_remaining === "number" && update.election_remaining > 0);
-        electionBlock.style.display = (update.is_voting || hasRemaining) ? "flex" : "none";
-      }
-      const timerEl = document.getElementById("election-timer");
-      if (timerEl && typeof update.election_remaining !== "undefined") {
-        timerEl.textContent = formatSeconds(update.election_remaining);
-      }
+      applyVotingUI(update.is_voting);
 
       // баннер «идёт голосование»
       const messageContainer = document.getElementById("message-container");
@@ -201,16 +220,11 @@ export function initWebSocket(gameId, currentUsername) {
       }
 
       // пауза
-      if (typeof update.paused !== "undefined") {
-        window.paused = !!update.paused;
-        const pauseIndicator = document.getElementById("pause-indicator");
-        if (pauseIndicator) pauseIndicator.innerHTML = window.paused ? "<em>(пауза)</em>" : "";
-        if (window.timer) window.timer.setPaused(window.paused);
-        applyPauseToButtons(window.paused);
-      }
+      if (typeof update.paused !== "undefined") applyPausedUI(update.paused);
 
       // кнопки по ролям
       const upgradeBtn = document.getElementById("upgrade-role-button");
+      if (self) window.playerRoleId = Number(self.role_id ?? 0);
       if (upgradeBtn) {
         const canUpgrade = self && !window.isObserver && Number(self?.special_role ?? 0) === 0 && Number(self?.role_id ?? 0) < 3;
         upgradeBtn.style.display = canUpgrade ? "inline-block" : "none";
@@ -224,7 +238,21 @@ export function initWebSocket(gameId, currentUsername) {
       return;
     }
 
-    // ------- 3) Удаление игры --------
+    // ------- 3) Таймеры: пауза, старт и конец выборов (без полного снапшота) --------
+    if (data.type === "timer") {
+      if (window.timer) window.timer.apply(data.data);
+      applyPausedUI(data.data.paused_at != null);
+      applyVotingUI(data.data.election_deadline != null);
+      return;
+    }
+
+    // ------- 4) Рейтинг (изменения топа, с троттлингом на сервере) --------
+    if (data.type === "leaderboard") {
+      onLeaderboardUpdate(gameId, data.data);
+      return;
+    }
+
+    // ------- 5) Удаление игры --------
     if (data.type === "game_deleted") {
       const gameName = data.name || "Название игры";
       sessionStorage.setItem("flash_message", JSON.stringify({ text: `Игра «${gameName}» была удалена`, level: "warning" }));
@@ -0,0 +1,46 @@
+// static/js/leaderboard.js
+// Рейтинг игры: топ приходит по сокету при изменениях (не чаще раза в несколько секунд),
+// своё место — с /leaderboard/.
+
+const LISTS = { money: "leaderboard-money", influence: "leaderboard-influence" };
+const SUFFIX = { money: " 💰", influence: " ⭐" };
+
+export function renderLeaderboard(top) {
+  for (const [metric, id] of Object.entries(LISTS)) {
+    const list = document.getElementById(id);
+    if (!list || !Array.isArray(top?.[metric])) continue;
+    list.innerHTML = "";
+    top[metric].forEach(p => {
+      const li = document.createElement("li");
+      li.textContent = `${p.username} — ${p.value}${SUFFIX[metric]}`;
+      list.appendChild(li);
+    });
+  }
+}
+
+function renderMyRank(me) {
+  const el = document.getElementById("leaderboard-me");
+  if (!el) return;
+  el.textContent = me ? `Ваше место: по деньгам ${me.money}, по влиянию ${me.influence}` : "";
+}
+
+export async function loadLeaderboard(gameId) {
+  try {
+    const resp = await fetch(`/games/${gameId}/leaderboard/`, { headers: { "X-Requested-With": "XMLHttpRequest" } });
+    if (!resp.ok) return;
+    const data = await resp.json();
+    renderLeaderboard(data.top);
+    renderMyRank(data.me);
+  } catch (e) {
+    console.warn("Рейтинг не загружен", e);
+  }
+}
+
+// Топ изменился: рисуем его сразу; при смене состава своё место дозапрашиваем с разбросом,
+// чтобы не бить сервер всей игрой разом
+export function onLeaderboardUpdate(gameId, top) {
+  renderLeaderboard(top);
+  if (top?.members_changed) {
+    setTimeout(() => loadLeaderboard(gameId), Math.random() * 3000);
+  }
+}
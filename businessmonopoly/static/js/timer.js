@@ -1,15 +1,13 @@
 // timer.js
-export function initGameTimer(startSeconds, isPaused) {
+// Таймеры по абсолютным отметкам от сервера (Game.timer_state): время игры и обратный отсчёт
+// выборов считаются локально и не зависят от того, как часто приходят снапшоты.
+export function initGameTimer(state) {
     const timerElement = document.getElementById('game-timer');
+    const electionElement = document.getElementById('election-timer');
 
-    // базовое накопленное время (сек), которое уже прошло
-    let baseElapsed = Number(startSeconds) || 0;
-
-    // флаг паузы
-    let paused = (isPaused === 'true' || isPaused === true);
-
-    // момент последнего "стартанули" (монотонные милисекунды)
-    let startPerf = performance.now();
+    let current = null;
+    // серверное время минус локальное (мс): поправка на часы клиента
+    let offset = 0;
 
     function secondsToHMS(d) {
         const h = Math.floor(d / 3600);
@@ -18,51 +16,49 @@ export function initGameTimer(startSeconds, isPaused) {
         return [h, m, s].map(v => v.toString().padStart(2, '0')).join(':');
     }
 
-    function currentElapsed() {
-        if (paused) return baseElapsed;
-        const delta = (performance.now() - startPerf) / 1000;
-        return baseElapsed + delta;
+    function secondsToMS(d) {
+        const m = Math.floor(d / 60);
+        const s = Math.floor(d % 60);
+        return `${m.toString().padStart(2, '0')}:${s.toString().padStart(2, '0')}`;
     }
 
-    function render() {
-        const sec = Math.max(0, Math.floor(currentElapsed()));
-        if (timerElement) timerElement.innerText = secondsToHMS(sec);
+    function serverNow() {
+        return Date.now() + offset;
     }
 
-    // тикаем чаще, чтобы не копился дрейф; UI обновится плавнее
-    const intervalId = setInterval(render, 250);
-    render();
-
-    // публичные методы для внешнего управления
-    function pause() {
-        if (!paused) {
-            baseElapsed = currentElapsed(); // зафиксировали накопленное
-            paused = true;
-        }
+    function elapsedSeconds() {
+        if (!current) return 0;
+        return Math.max(0, ((current.paused_at ?? serverNow()) - current.game_anchor) / 1000);
     }
 
-    function resume() {
-        if (paused) {
-            paused = false;
-            startPerf = performance.now(); // новая точка отсчёта
-        }
+    function electionRemaining() {
+        if (!current?.election_deadline) return 0;
+        const at = current.election_paused_at ?? serverNow();
+        return Math.max(0, (current.election_deadline - at) / 1000);
     }
 
-    function setPaused(value) { value ? pause() : resume(); }
+    function render() {
+        if (timerElement) timerElement.innerText = secondsToHMS(Math.floor(elapsedSeconds()));
+        if (electionElement) electionElement.innerText = secondsToMS(Math.ceil(electionRemaining()));
+    }
 
-    // ресинхронизация от бэка: аккуратно устанавливаем точное значение
-    function setElapsed(seconds) {
-        baseElapsed = Number(seconds) || 0;
-        // не сбрасываем paused; просто обновляем базу и, если идёт — обновляем точку старта
-        startPerf = performance.now();
+    // новое состояние от сервера (событие timer или поле timer снапшота); устаревшие пропускаем
+    function apply(next) {
+        if (!next || (current && next.server_time < current.server_time)) return;
+        offset = next.server_time - Date.now();
+        current = next;
         render();
     }
 
+    apply(state);
+    // тикаем чаще секунды, чтобы смена цифр не запаздывала
+    const intervalId = setInterval(render, 250);
+
     return {
-        pause,
-        resume,
-        setPaused,
-        setElapsed,
+        apply,
+        isPaused: () => current?.paused_at != null,
+        isVoting: () => current?.election_deadline != null,
+        electionRemaining,
         // чтобы можно было вручную остановить при уходе со страницы (не обязательно)
         _dispose: () => clearInterval(intervalId),
     };
@@ -1,3 +1,5 @@
+import { postAction } from "/static/js/ws-actions.js";
+
 export function showMessage(message, level = "info") {
     const container = document.getElementById("message-container");
     if (!container) return;
@@ -50,6 +52,7 @@ export function showQuestionModal(q, opts = {}) {
 
   const wrap = document.createElement("div");
   wrap.id = "__question_modal__";
+  wrap.dataset.askToken = q?.ask_token || "";
   Object.assign(wrap.style, {
     position: "fixed", inset: 0, background: "rgba(0,0,0,.5)",
     display: "flex", alignItems: "center", justifyContent: "center", zIndex: 4000
@@ -119,11 +122,7 @@ export function showQuestionModal(q, opts = {}) {
       if (onSubmit) {
         await onSubmit(payload);
       } else {
-        const resp = await fetch(answerUrl, {
-          method: "POST",
-          headers: { "Content-Type": "application/json", "X-CSRFToken": csrf, "X-Requested-With": "XMLHttpRequest" },
-          body: JSON.stringify(payload),
-        });
+        const resp = await postAction("answer", answerUrl, csrf, payload);
         if (resp.status === 204) { close(); return; }
         if (!resp.ok) {
           let d = {}; try { d = await resp.json(); } catch {}
@@ -189,11 +188,7 @@ export function showReviewModal(data, opts = {}) {
     btn.disabled = true; btn.textContent = "Отправка…";
 
     try {
-      const resp = await fetch(gradeUrl, {
-        method: "POST",
-        headers: { "Content-Type": "application/json", "X-CSRFToken": csrf, "X-Requested-With": "XMLHttpRequest" },
-        body: JSON.stringify(payload),
-      });
+      const resp = await postAction("grade_answer", gradeUrl, csrf, payload);
       let d = {}; try { d = await resp.json(); } catch {}
       if (!resp.ok) throw new Error(d?.error || `Ошибка ${resp.status}`);
       showMessage("Решение сохранено.", "success");
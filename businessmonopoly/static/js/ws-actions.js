@@ -0,0 +1,68 @@
+// static/js/ws-actions.js
+// Действия игрока через открытый WebSocket (см. games/ws_commands.py), с откатом на HTTP POST.
+
+const pending = new Map();
+let socket = null;
+let seq = 0;
+
+const ACTION_TIMEOUT_MS = 10000;
+
+export function attachSocket(ws) {
+  socket = ws;
+  ws.addEventListener("close", () => {
+    for (const { reject, timer } of pending.values()) {
+      clearTimeout(timer);
+      reject(Object.assign(new Error("Соединение закрыто"), { sent: true }));
+    }
+    pending.clear();
+    if (socket === ws) socket = null;
+  });
+}
+
+// true — сообщение было ответом на команду и уже обработано
+export function handleReply(data) {
+  if ((data.type !== "ack" && data.type !== "error") || !pending.has(data.id)) return false;
+  const { resolve, timer } = pending.get(data.id);
+  clearTimeout(timer);
+  pending.delete(data.id);
+  const body = data.type === "ack" ? (data.data ?? {}) : { error: data.error };
+  resolve({ ok: data.type === "ack", status: data.status, json: async () => body });
+  return true;
+}
+
+// Ответ в виде, похожем на fetch Response: { ok, status, json() }
+export function sendAction(action, payload) {
+  return new Promise((resolve, reject) => {
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+      reject(Object.assign(new Error("Сокет не подключён"), { sent: false }));
+      return;
+    }
+    const id = `a${++seq}`;
+    const timer = setTimeout(() => {
+      pending.delete(id);
+      reject(Object.assign(new Error("Сервер не ответил вовремя"), { sent: true }));
+    }, ACTION_TIMEOUT_MS);
+    pending.set(id, { resolve, reject, timer });
+    socket.send(JSON.stringify({ type: "cmd", id, action, payload }));
+  });
+}
+
+// Через сокет, а если он не подключён — обычным POST на url (JSON или form-urlencoded).
+// Если команда уже ушла в сокет, повторно по HTTP не шлём — действие могло выполниться.
+export async function postAction(action, url, csrfToken, payload = {}, { form = false } = {}) {
+  try {
+    return await sendAction(action, payload);
+  } catch (e) {
+    if (e.sent) throw e;
+  }
+  const headers = { "X-CSRFToken": csrfToken, "X-Requested-With": "XMLHttpRequest" };
+  let body;
+  if (form) {
+    headers["Content-Type"] = "application/x-www-form-urlencoded";
+    body = new URLSearchParams(payload).toString();
+  } else {
+    headers["Content-Type"] = "application/json";
+    body = JSON.stringify(payload);
+  }
+  return fetch(url, { method: "POST", headers, body });
+}